@@ -13,10 +13,15 @@
 # limitations under the License.
 
 __all__ = [
+    'capability_handlers',
     'capability_keys',
     'capability_keystore',
     'endpoint_registry',
     'guardian_service',
+    'imports',
+    'job_queue',
     'secrets',
+    'shelve_store',
+    'snapshot',
     'utility',
 ]
@@ -0,0 +1,289 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+The capability handler map binds operation names to the handlers that
+process capabilities. Handlers are created from the module named in the
+GuardianService Operations configuration. Creating the handlers may be
+slow (importing and warming up models), so the service can accept
+requests before the handlers are ready. The map can be rebuilt from
+fresh configuration while the service runs; the new handlers are created
+(and warmed up by their constructors) before they replace the old ones,
+so requests already in progress finish on the handlers they started with;
+once those requests have finished (or HandlerDrainSeconds has passed) the
+old handlers that provide a close method are closed.
+"""
+
+import functools
+import importlib
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'CapabilityHandlers', 'HandlersNotReady', 'OperationBusy' ]
+
+# -----------------------------------------------------------------
+class HandlersNotReady(Exception) :
+    pass
+
+# -----------------------------------------------------------------
+class OperationBusy(Exception) :
+    """Raised by a capability handler that cannot take the request now,
+    the client should resubmit it after retry_after seconds
+    """
+    def __init__(self, msg, retry_after = 1) :
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class _HandlerGeneration(object) :
+    """A handler map with a count of the requests running on it"""
+
+    # -------------------------------------------------------
+    def __init__(self, handler_map) :
+        self.handler_map = handler_map
+        self.active = 0
+        self.retired = False
+        self._condition = threading.Condition()
+
+    # -------------------------------------------------------
+    def enter(self) :
+        """Count a request, returns False if the map has been replaced"""
+        with self._condition :
+            if self.retired :
+                return False
+            self.active += 1
+            return True
+
+    # -------------------------------------------------------
+    def exit(self) :
+        with self._condition :
+            self.active -= 1
+            if self.active == 0 :
+                self._condition.notify_all()
+
+    # -------------------------------------------------------
+    def retire(self, timeout) :
+        """Stop new requests and wait for the running ones to finish;
+        returns False if requests were still running after the timeout
+        """
+        with self._condition :
+            self.retired = True
+            return self._condition.wait_for(lambda : self.active == 0, timeout)
+
+    # -------------------------------------------------------
+    def close(self) :
+        for (op, handler) in self.handler_map.items() :
+            if not callable(getattr(handler, 'close', None)) :
+                continue
+            try :
+                handler.close()
+            except Exception as e :
+                logger.warning('failed to close handler for %s; %s', op, e)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class CapabilityHandlers(object) :
+
+    __shared_handlers__ = None
+    __shared_lock__ = threading.Lock()
+
+    # -------------------------------------------------------
+    @classmethod
+    def shared_handlers(cls, config) :
+        """Return the handlers shared by all of the WSGI applications in
+        the service, creating them on first use
+        """
+        with cls.__shared_lock__ :
+            if cls.__shared_handlers__ is None :
+                cls.__shared_handlers__ = cls(config)
+            return cls.__shared_handlers__
+
+    # -------------------------------------------------------
+    @staticmethod
+    def build_handler_map(config) :
+        try :
+            operation_module_name = config['GuardianService']['Operations']
+        except KeyError as ke :
+            logger.error('No operation map configured')
+            raise
+
+        operation_module = importlib.import_module(operation_module_name)
+
+        handler_map = {}
+        for (op, handler) in operation_module.capability_handler_map.items() :
+            handler_map[op] = handler(config)
+
+        return handler_map
+
+    # -------------------------------------------------------
+    def __init__(self, config, config_loader = None) :
+        """
+        :param config dict: service configuration
+        :param config_loader callable: function that returns fresh configuration for a reload
+        """
+        if 'Operations' not in config.get('GuardianService', {}) :
+            logger.error('No operation map configured')
+            raise KeyError('Operations')
+
+        self.config = config
+        self.config_loader = config_loader
+        self.generation = 0
+        self.load_seconds = None
+        self._reload_lock = threading.Lock()
+        self._generation = None
+
+    # -------------------------------------------------------
+    @property
+    def ready(self) :
+        """True once the handlers have been created and every handler that
+        provides a ready method (for example, one that warms up a model)
+        reports that it is ready
+        """
+        generation = self._generation
+        if generation is None :
+            return False
+
+        for (op, handler) in generation.handler_map.items() :
+            if not callable(getattr(handler, 'ready', None)) :
+                continue
+            try :
+                if not handler.ready() :
+                    return False
+            except Exception as e :
+                logger.warning('failed to check that %s is ready; %s', op, e)
+                return False
+
+        return True
+
+    # -------------------------------------------------------
+    def load(self) :
+        """Create the initial handlers from the configuration the object
+        was created with; returns False if the handlers could not be created
+        """
+        return self.reload(self.config)
+
+    # -------------------------------------------------------
+    def get_handler(self, method_name) :
+        """Return a callable that runs the handler for an operation; the
+        handler is taken from the current map when the callable is invoked,
+        so queued operations do not run on handlers that have been closed
+
+        :raises HandlersNotReady: if the handlers have not been created
+        :raises KeyError: if the operation is not defined
+        """
+        generation = self._generation
+        if generation is None :
+            raise HandlersNotReady('capability handlers are not ready')
+        # raises KeyError for an operation that is not defined
+        generation.handler_map[method_name]
+        return functools.partial(self.__invoke__, method_name)
+
+    # -------------------------------------------------------
+    def __invoke__(self, method_name, parameters) :
+        # a map that is retired has already been replaced by the next one
+        while True :
+            generation = self._generation
+            if generation.enter() :
+                break
+
+        try :
+            return generation.handler_map[method_name](parameters)
+        finally :
+            generation.exit()
+
+    # -------------------------------------------------------
+    def statistics(self) :
+        """Collect the statistics reported by handlers that provide a
+        statistics method, keyed by operation name
+        """
+        generation = self._generation
+        handler_map = generation.handler_map if generation else {}
+
+        result = dict()
+        for (op, handler) in handler_map.items() :
+            if not callable(getattr(handler, 'statistics', None)) :
+                continue
+            try :
+                result[op] = handler.statistics()
+            except Exception as e :
+                logger.warning('failed to collect statistics for %s; %s', op, e)
+
+        return result
+
+    # -------------------------------------------------------
+    def reload(self, config = None) :
+        """Rebuild the handler map and swap it in once every handler has
+        been created; returns False if a reload is already in progress
+
+        :param config dict: configuration for the handlers, the config_loader is used if None
+        """
+        if not self._reload_lock.acquire(blocking=False) :
+            logger.warning('reload already in progress')
+            return False
+
+        try :
+            if config is None :
+                config = self.config_loader() if self.config_loader else self.config
+
+            # resources that handlers share are keyed by the configuration
+            # object, a new object keeps them apart from the handlers that
+            # are closed once this map replaces them
+            config = dict(config)
+
+            logger.info('reload capability handlers')
+            start = time.perf_counter()
+            handler_map = self.build_handler_map(config)
+            load_seconds = time.perf_counter() - start
+
+            # replacing the reference is atomic, requests that are running
+            # on the old handlers finish on them
+            old_generation = self._generation
+            self._generation = _HandlerGeneration(handler_map)
+            self.config = config
+            self.generation += 1
+            self.load_seconds = load_seconds
+
+            logger.info('capability handlers reloaded, generation %d, in %.3f seconds',
+                        self.generation, load_seconds)
+
+            if old_generation is not None :
+                drain_seconds = config.get('GuardianService', {}).get('HandlerDrainSeconds', 60)
+                if not old_generation.retire(drain_seconds) :
+                    logger.warning('closing previous handlers with %d requests running', old_generation.active)
+                old_generation.close()
+
+            return True
+
+        except Exception as e :
+            logger.exception('failed to reload capability handlers; %s', e)
+            return False
+
+        finally :
+            self._reload_lock.release()
+
+    # -------------------------------------------------------
+    def reload_in_background(self, config = None) :
+        """Reload the handlers in a separate thread
+        """
+        if self._reload_lock.locked() :
+            return False
+
+        thread = threading.Thread(target=self.reload, args=(config,), daemon=True)
+        thread.start()
+        return True
@@ -12,19 +12,50 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import shelve
+import hashlib
+import os
 
 from pdo.contracts.guardian.common.capability_keys import CapabilityKeys
+from pdo.contracts.guardian.common.shelve_store import ShelveStore, shelve_files
 
 import logging
 logger = logging.getLogger(__name__)
 
-class CapabilityKeyStore(object) :
+__all__ = [
+    'CapabilityKeyStore',
+    'ShardedCapabilityKeyStore',
+    'reshard_capability_keystore',
+]
+
+# -----------------------------------------------------------------
+# the management and service capability keys are created when the
+# store is initialized; they are always held in the system shard of
+# a sharded keystore
+# -----------------------------------------------------------------
+__system_identities__ = ('management_capability_key', 'service_capability_key')
+
+# -----------------------------------------------------------------
+def shard_index(minted_identity, shards) :
+    """Compute the shard that holds the capability key for an identity
+
+    The hash must be stable across processes (so the builtin hash()
+    cannot be used) since it determines where the key is persisted.
+    """
+    digest = hashlib.sha256(minted_identity.encode('utf8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shards
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class CapabilityKeyStore(ShelveStore) :
 
     # -------------------------------------------------------
-    def __init__(self, filename = "keystore.db") :
+    def __init__(self, filename = "keystore.db", create_service_keys = True) :
         logger.info('create capability store in file %s', filename)
-        self._keystore = shelve.open(filename, flag='c', writeback=True)
+        super().__init__(filename)
+
+        if not create_service_keys :
+            return
+
         try :
             self.mgmt_capability_key = self.get_capability_key('management_capability_key')
         except KeyError as ke:
@@ -36,22 +67,259 @@ class CapabilityKeyStore(object) :
             self.svc_capability_key = self.create_capability_key('service_capability_key')
 
     # -------------------------------------------------------
-    def close(self) :
-        self._keystore.close()
-        self._keystore = None
+    def minted_identities(self) :
+        return self.keys()
+
+    # -------------------------------------------------------
+    def get_serialized_key(self, minted_identity) :
+        return self._get_entry_(minted_identity)
+
+    # -------------------------------------------------------
+    def set_serialized_key(self, minted_identity, serialized_key) :
+        (signing_key, decryption_key) = serialized_key
+        self._set_entry_(minted_identity, (signing_key, decryption_key))
 
     # -------------------------------------------------------
     def get_capability_key(self, minted_identity) :
-        (signing_key, decryption_key) = self._keystore[minted_identity]
+        (signing_key, decryption_key) = self.get_serialized_key(minted_identity)
         return CapabilityKeys.deserialize(signing_key, decryption_key)
 
     # -------------------------------------------------------
     def set_capability_key(self, minted_identity, capability_key) :
-        (signing_key, decryption_key) = capability_key.serialize()
-        self._keystore[minted_identity] = (signing_key, decryption_key)
+        self.set_serialized_key(minted_identity, capability_key.serialize())
         return capability_key
 
     # -------------------------------------------------------
     def create_capability_key(self, minted_identity) :
         capability_key = CapabilityKeys.create_new_keys()
         return self.set_capability_key(minted_identity, capability_key)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class ShardedCapabilityKeyStore(object) :
+    """Capability keystore partitioned across a number of shelve files
+
+    Minted identities are hashed across the data shards, each of which
+    has its own file and lock so writes to different shards do not
+    contend. The management and service capability keys are held in a
+    small, dedicated system shard that also records the shard count.
+    """
+
+    __shard_count_key__ = '__shard_count__'
+
+    # -------------------------------------------------------
+    @staticmethod
+    def system_shard_filename(filename) :
+        (root, ext) = os.path.splitext(filename)
+        return '{0}_system{1}'.format(root, ext)
+
+    # -------------------------------------------------------
+    @staticmethod
+    def data_shard_filename(filename, shards, index) :
+        (root, ext) = os.path.splitext(filename)
+        return '{0}_{1:03d}_{2:03d}{3}'.format(root, shards, index, ext)
+
+    # -------------------------------------------------------
+    @classmethod
+    def stored_shard_count(cls, filename) :
+        """Return the number of data shards recorded in the system shard,
+        or None if the sharded store has not been created
+        """
+        system_filename = cls.system_shard_filename(filename)
+        if not shelve_files(system_filename) :
+            return None
+
+        system_shard = CapabilityKeyStore(system_filename, create_service_keys=False)
+        try :
+            return system_shard._get_entry_(cls.__shard_count_key__)
+        except KeyError :
+            return None
+        finally :
+            system_shard.close()
+
+    # -------------------------------------------------------
+    def __init__(self, filename = "keystore.db", shards = 8) :
+        if shards < 1 :
+            raise ValueError('invalid shard count; {0}'.format(shards))
+
+        logger.info('create sharded capability store in file %s with %d shards', filename, shards)
+        if self.stored_shard_count(filename) is None and shelve_files(filename) :
+            raise ValueError('found unsharded keystore {0}; reshard the keystore first'.format(filename))
+
+        self._system_shard = CapabilityKeyStore(self.system_shard_filename(filename))
+        try :
+            stored_shards = self._system_shard._get_entry_(self.__shard_count_key__)
+        except KeyError :
+            self._system_shard._set_entry_(self.__shard_count_key__, shards)
+            stored_shards = shards
+        if stored_shards != shards :
+            self._system_shard.close()
+            raise ValueError('keystore has {0} shards, configured for {1}; reshard the keystore first'.format(
+                stored_shards, shards))
+
+        self.mgmt_capability_key = self._system_shard.mgmt_capability_key
+        self.svc_capability_key = self._system_shard.svc_capability_key
+
+        self.shards = shards
+        self._data_shards = []
+        for index in range(shards) :
+            shard_filename = self.data_shard_filename(filename, shards, index)
+            self._data_shards.append(CapabilityKeyStore(shard_filename, create_service_keys=False))
+
+    # -------------------------------------------------------
+    def _shard_(self, minted_identity) :
+        if minted_identity in __system_identities__ :
+            return self._system_shard
+        return self._data_shards[shard_index(minted_identity, self.shards)]
+
+    # -------------------------------------------------------
+    def _set_entry_(self, key, value) :
+        # used to restore snapshots, the shard holds its own lock for the write
+        self._shard_(key)._set_entry_(key, value)
+
+    # -------------------------------------------------------
+    def close(self) :
+        for shard in self._data_shards :
+            shard.close()
+        self._data_shards = []
+        self._system_shard.close()
+
+    # -------------------------------------------------------
+    def _all_shards_(self) :
+        return [ self._system_shard ] + self._data_shards
+
+    # -------------------------------------------------------
+    def minted_identities(self) :
+        identities = []
+        for shard in self._data_shards :
+            identities.extend(shard.minted_identities())
+        return identities
+
+    # -------------------------------------------------------
+    def snapshot_locks(self) :
+        locks = []
+        for shard in self._all_shards_() :
+            locks.extend(shard.snapshot_locks())
+        return locks
+
+    # -------------------------------------------------------
+    def begin_snapshot(self, incremental = False) :
+        # every shard must agree for the snapshot to be incremental
+        incremental = all([ shard.begin_snapshot(incremental) for shard in self._all_shards_() ])
+        if not incremental :
+            for shard in self._all_shards_() :
+                shard.end_snapshot(False)
+                shard.begin_snapshot(False)
+        return incremental
+
+    # -------------------------------------------------------
+    def snapshot_entries(self) :
+        for shard in self._all_shards_() :
+            yield from shard.snapshot_entries()
+
+    # -------------------------------------------------------
+    def end_snapshot(self, committed = True) :
+        for shard in self._all_shards_() :
+            shard.end_snapshot(committed)
+
+    # -------------------------------------------------------
+    def get_serialized_key(self, minted_identity) :
+        return self._shard_(minted_identity).get_serialized_key(minted_identity)
+
+    # -------------------------------------------------------
+    def set_serialized_key(self, minted_identity, serialized_key) :
+        self._shard_(minted_identity).set_serialized_key(minted_identity, serialized_key)
+
+    # -------------------------------------------------------
+    def get_capability_key(self, minted_identity) :
+        return self._shard_(minted_identity).get_capability_key(minted_identity)
+
+    # -------------------------------------------------------
+    def set_capability_key(self, minted_identity, capability_key) :
+        return self._shard_(minted_identity).set_capability_key(minted_identity, capability_key)
+
+    # -------------------------------------------------------
+    def create_capability_key(self, minted_identity) :
+        return self._shard_(minted_identity).create_capability_key(minted_identity)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def reshard_capability_keystore(filename, shards, remove_old_shards = True) :
+    """Redistribute the keys in a keystore across a new number of shards
+
+    This is an offline operation, the guardian service must not have the
+    keystore open. An unsharded keystore (the file named by filename) is
+    converted into a sharded store. The new data shards are written
+    alongside the existing ones (shard file names include the shard count)
+    and the shard count in the system shard is only updated once every
+    key has been copied, so an interrupted reshard leaves the original
+    store intact.
+
+    :param filename str: the base name of the keystore
+    :param shards int: the new number of data shards
+    :param remove_old_shards bool: remove the old shard files when done
+    :returns int: the number of keys that were copied
+    """
+    if shards < 1 :
+        raise ValueError('invalid shard count; {0}'.format(shards))
+
+    old_shards = ShardedCapabilityKeyStore.stored_shard_count(filename)
+    if old_shards == shards :
+        logger.info('keystore already has %d shards', shards)
+        return 0
+
+    # open the source of the keys
+    if old_shards is None :
+        old_files = shelve_files(filename)
+        if not old_files :
+            raise FileNotFoundError('no keystore found at {0}'.format(filename))
+        source_stores = [ CapabilityKeyStore(filename, create_service_keys=False) ]
+    else :
+        source_stores = []
+        old_files = []
+        for index in range(old_shards) :
+            shard_filename = ShardedCapabilityKeyStore.data_shard_filename(filename, old_shards, index)
+            source_stores.append(CapabilityKeyStore(shard_filename, create_service_keys=False))
+            old_files.extend(shelve_files(shard_filename))
+
+    # create the new data shards
+    target_shards = []
+    for index in range(shards) :
+        shard_filename = ShardedCapabilityKeyStore.data_shard_filename(filename, shards, index)
+        target_shards.append(CapabilityKeyStore(shard_filename, create_service_keys=False))
+
+    system_filename = ShardedCapabilityKeyStore.system_shard_filename(filename)
+    system_shard = CapabilityKeyStore(system_filename, create_service_keys=False)
+
+    count = 0
+    try :
+        for source in source_stores :
+            for minted_identity in source.minted_identities() :
+                serialized_key = source.get_serialized_key(minted_identity)
+                if minted_identity in __system_identities__ :
+                    # an unsharded store carries the service keys with the data
+                    system_shard.set_serialized_key(minted_identity, serialized_key)
+                    continue
+
+                target_shards[shard_index(minted_identity, shards)].set_serialized_key(minted_identity, serialized_key)
+                count += 1
+    finally :
+        for source in source_stores :
+            source.close()
+        for shard in target_shards :
+            shard.close()
+
+    # commit the new layout only after all of the new shards are flushed
+    try :
+        system_shard._set_entry_(ShardedCapabilityKeyStore.__shard_count_key__, shards)
+    finally :
+        system_shard.close()
+
+    logger.info('copied %d keys from %s shards to %d shards', count, old_shards or 'unsharded', shards)
+
+    if remove_old_shards :
+        for old_file in old_files :
+            logger.debug('remove %s', old_file)
+            os.remove(old_file)
+
+    return count
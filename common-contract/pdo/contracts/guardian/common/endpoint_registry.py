@@ -12,33 +12,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import shelve
-
 from pdo.common.keys import EnclaveKeys
+from pdo.contracts.guardian.common.shelve_store import ShelveStore
 
 import logging
 logger = logging.getLogger(__name__)
 
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
-class EndpointRegistry(object) :
+class EndpointRegistry(ShelveStore) :
 
     # -------------------------------------------------------
     def __init__(self, filename = "endpoint.db") :
         logger.info('create endpoint registry in file %s', filename)
-        self._registry = shelve.open(filename, flag='c', writeback=True)
-
-    # -------------------------------------------------------
-    def close(self) :
-        self._registry.close()
-        self._registry = None
+        super().__init__(filename)
 
     # -------------------------------------------------------
     def get_endpoint(self, contract_id) :
-        (verifying_key, encryption_key) = self._registry[contract_id]
+        (verifying_key, encryption_key) = self._get_entry_(contract_id)
         return EnclaveKeys(verifying_key, encryption_key)
 
     # -------------------------------------------------------
     def set_endpoint(self, contract_id, verifying_key, encryption_key) :
-        self._registry[contract_id] = (verifying_key, encryption_key)
+        self._set_entry_(contract_id, (verifying_key, encryption_key))
         return EnclaveKeys(verifying_key, encryption_key)
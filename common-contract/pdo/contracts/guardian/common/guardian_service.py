@@ -47,6 +47,7 @@ class GuardianServiceClient(GenericServiceClient) :
 
         service_info = self.get_guardian_metadata()
         self.enclave_keys = keys.EnclaveKeys(service_info['verifying_key'], service_info['encryption_key'])
+        self.ready = service_info.get('ready', True)
 
         self.storage_service_url = service_info['storage_service_url']
         self.storage_service_client = StorageServiceClient(self.storage_service_url)
@@ -76,13 +77,16 @@ class GuardianServiceClient(GenericServiceClient) :
         self.check_blocks = storage_service.check_blocks
 
     # -----------------------------------------------------------------
-    def __post_request__(self, path, request) :
+    def __post_request__(self, path, request, timeout = None) :
+
+        if timeout is None :
+            timeout = self.default_timeout
 
         try :
             url = urljoin(self.ServiceURL, path)
             while True :
-                response = self.session.post(url, json=request, timeout=self.default_timeout, stream=False)
-                if response.status_code == 429 :
+                response = self.session.post(url, json=request, timeout=timeout, stream=False)
+                if response.status_code in (429, 503) :
                     logger.info('prepare to resubmit the request')
                     sleeptime = min(1.0, float(response.headers.get('retry-after', 1.0)))
                     time.sleep(sleeptime)
@@ -102,7 +106,7 @@ class GuardianServiceClient(GenericServiceClient) :
             url = urljoin(self.ServiceURL, path)
             while True :
                 response = self.session.get(url, timeout=self.default_timeout)
-                if response.status_code == 429 :
+                if response.status_code in (429, 503) :
                     logger.info('prepare to resubmit the request')
                     sleeptime = min(1.0, float(response.headers.get('retry-after', 1.0)))
                     time.sleep(sleeptime)
@@ -134,3 +138,54 @@ class GuardianServiceClient(GenericServiceClient) :
     # -----------------------------------------------------------------
     def process_capability(self, **params) :
         return self.__post_request__('process_capability', params)
+
+    # -----------------------------------------------------------------
+    def submit_capability(self, **params) :
+        """Queue a capability operation, returns a dictionary with the job_id
+        """
+        return self.__post_request__('submit_capability', params)
+
+    # -----------------------------------------------------------------
+    def get_job_result(self, job_id, wait = 0) :
+        """Get the status of a queued operation, the service holds the request
+        for up to wait seconds while the operation completes
+        """
+        params = { 'job_id' : job_id, 'wait' : wait }
+        return self.__post_request__('get_job_result', params, timeout=self.default_timeout + wait)
+
+    # -----------------------------------------------------------------
+    def wait_for_job_result(self, job_id, timeout = None, wait = 10.0) :
+        """Long poll for the result of a queued operation
+
+        :param timeout float: maximum seconds to wait, None to wait indefinitely
+        :param wait float: seconds the service holds each poll
+        :returns dict: the result of the operation
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True :
+            poll_wait = wait if deadline is None else max(0, min(wait, deadline - time.time()))
+            poll_start = time.time()
+            job_result = self.get_job_result(job_id, poll_wait)
+            if job_result['status'] == 'complete' :
+                return job_result['result']
+            if job_result['status'] == 'failed' :
+                raise MessageException('job {0} failed; {1}'.format(job_id, job_result.get('error')))
+            if deadline is not None and time.time() >= deadline :
+                raise MessageException('timed out waiting for job {0}'.format(job_id))
+
+            # the service returns at once when too many requests are waiting
+            poll_time = time.time() - poll_start
+            if poll_time < poll_wait :
+                time.sleep(min(0.5, poll_wait - poll_time))
+
+    # -----------------------------------------------------------------
+    def reload(self, **params) :
+        return self.__post_request__('reload', params)
+
+    # -----------------------------------------------------------------
+    def snapshot(self, timeout = 600.0, **params) :
+        return self.__post_request__('snapshot', params, timeout=timeout)
+
+    # -----------------------------------------------------------------
+    def statistics(self, **params) :
+        return self.__post_request__('statistics', params)
@@ -0,0 +1,129 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Helpers for controlling the cost of imports during service startup:
+lazy_import defers loading a module until one of its attributes is used
+and ImportProfiler records how long each module takes to import.
+"""
+
+import builtins
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'lazy_import', 'ImportProfiler' ]
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def lazy_import(module_name) :
+    """Return a module object that is loaded on first attribute access
+
+    :param module_name str: absolute name of the module
+    :raises ModuleNotFoundError: if the module cannot be found
+    """
+    if module_name in sys.modules :
+        return sys.modules[module_name]
+
+    spec = importlib.util.find_spec(module_name)
+    if spec is None :
+        raise ModuleNotFoundError('no module named {0}'.format(module_name), name=module_name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    return module
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class ImportProfiler(object) :
+    """Measure the time spent importing each module
+
+    The profiler wraps the builtin __import__ and importlib.import_module
+    (which does not go through __import__ and is used to load the
+    configured operations and backends) and records, for each module
+    imported for the first time, the inclusive time (including the
+    modules it imports) and the self time.
+    """
+
+    # -------------------------------------------------------
+    def __init__(self) :
+        self.timings = dict()
+        self._original_import = None
+        self._original_import_module = None
+        self._local = threading.local()
+
+    # -------------------------------------------------------
+    def install(self) :
+        if self._original_import is None :
+            self._original_import = builtins.__import__
+            self._original_import_module = importlib.import_module
+            builtins.__import__ = self._import_
+            importlib.import_module = self._import_module_
+
+    # -------------------------------------------------------
+    def uninstall(self) :
+        if self._original_import is not None :
+            builtins.__import__ = self._original_import
+            importlib.import_module = self._original_import_module
+            self._original_import = None
+            self._original_import_module = None
+
+    # -------------------------------------------------------
+    def _import_(self, name, globals=None, locals=None, fromlist=(), level=0) :
+        if level != 0 or name in sys.modules :
+            return self._original_import(name, globals, locals, fromlist, level)
+        return self._timed_(name, self._original_import, name, globals, locals, fromlist, level)
+
+    # -------------------------------------------------------
+    def _import_module_(self, name, package=None) :
+        if name.startswith('.') or name in sys.modules :
+            return self._original_import_module(name, package)
+        return self._timed_(name, self._original_import_module, name, package)
+
+    # -------------------------------------------------------
+    def _timed_(self, name, import_function, *args) :
+        stack = getattr(self._local, 'stack', None)
+        if stack is None :
+            stack = self._local.stack = []
+
+        stack.append(0.0)
+        start = time.perf_counter()
+        try :
+            return import_function(*args)
+        finally :
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack :
+                stack[-1] += elapsed
+            if name not in self.timings :
+                self.timings[name] = (elapsed, elapsed - nested)
+
+    # -------------------------------------------------------
+    def report(self, limit = 25) :
+        """Log the modules with the largest inclusive import time
+        """
+        timings = sorted(self.timings.items(), key=lambda t : t[1][0], reverse=True)
+        total = sum([ t[1][1] for t in timings ])
+        logger.info('import profile: %d modules, %.1f ms total', len(timings), total * 1000.0)
+        for (name, (inclusive, exclusive)) in timings[:limit] :
+            logger.info('import %-48s inclusive %9.1f ms  self %9.1f ms', name, inclusive * 1000.0, exclusive * 1000.0)
@@ -0,0 +1,200 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+The job queue runs capability operations asynchronously so that the
+lifetime of a long running operation is not tied to a single HTTP
+request. Results are kept in a bounded store until they are retrieved
+or their time to live expires.
+"""
+
+import collections
+import concurrent.futures
+import secrets
+import threading
+import time
+
+from pdo.contracts.guardian.common.capability_handlers import OperationBusy
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'JobQueue', 'JobQueueFull' ]
+
+# -----------------------------------------------------------------
+class JobQueueFull(Exception) :
+    pass
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class Job(object) :
+
+    # -------------------------------------------------------
+    def __init__(self, job_id, method_name) :
+        self.job_id = job_id
+        self.method_name = method_name
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.retry_after = None
+        self.submitted = time.time()
+        self.completed = None
+        self.done = threading.Event()
+
+    # -------------------------------------------------------
+    def serialize(self) :
+        response = dict()
+        response['job_id'] = self.job_id
+        response['status'] = self.status
+        if self.status == 'complete' :
+            response['result'] = self.result
+        elif self.status == 'failed' :
+            response['error'] = self.error
+            if self.retry_after is not None :
+                response['retry_after'] = self.retry_after
+        return response
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class JobQueue(object) :
+
+    __shared_queue__ = None
+    __shared_lock__ = threading.Lock()
+
+    # -------------------------------------------------------
+    @classmethod
+    def shared_queue(cls, config) :
+        """Return the job queue shared by all of the WSGI applications in
+        the service, creating it on first use
+        """
+        with cls.__shared_lock__ :
+            if cls.__shared_queue__ is None :
+                service_config = config.get('GuardianService', {})
+                cls.__shared_queue__ = cls(
+                    worker_threads = service_config.get('JobThreads', 4),
+                    max_jobs = service_config.get('MaxJobs', 1024),
+                    result_ttl = service_config.get('JobResultTTL', 600),
+                    max_wait = service_config.get('MaxJobWait', 5),
+                    max_waiters = service_config.get('MaxJobWaiters', 2))
+            return cls.__shared_queue__
+
+    # -------------------------------------------------------
+    def __init__(self, worker_threads = 4, max_jobs = 1024, result_ttl = 600, max_wait = 5, max_waiters = 2) :
+        """
+        :param worker_threads int: number of threads that run operations
+        :param max_jobs int: maximum number of jobs, including completed jobs that have not expired
+        :param result_ttl float: seconds a completed result is retained
+        :param max_wait float: maximum seconds a request may wait for a result
+        :param max_waiters int: maximum number of requests waiting at once, each
+            holds a thread of the WSGI pool
+        """
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self.max_wait = max_wait
+        self._waiters = threading.BoundedSemaphore(max_waiters) if max_waiters > 0 else None
+
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=worker_threads, thread_name_prefix='guardian-job')
+
+    # -------------------------------------------------------
+    def _expire_(self) :
+        """Remove expired results; the caller must hold the lock
+        """
+        expiration = time.time() - self.result_ttl
+        for job in list(self._jobs.values()) :
+            if job.completed is not None and job.completed < expiration :
+                del self._jobs[job.job_id]
+
+    # -------------------------------------------------------
+    def _evict_completed_(self) :
+        """Make room by dropping the oldest completed result; the caller
+        must hold the lock
+        """
+        for job in self._jobs.values() :
+            if job.completed is not None :
+                del self._jobs[job.job_id]
+                return True
+        return False
+
+    # -------------------------------------------------------
+    def _run_(self, job, operation, parameters) :
+        job.status = 'running'
+        try :
+            result = operation(parameters)
+            if result is None :
+                job.error = 'operation failed'
+                job.status = 'failed'
+            else :
+                job.result = result
+                job.status = 'complete'
+        except OperationBusy as ob :
+            # the client may resubmit the operation after retry_after seconds
+            logger.warning('operation busy (job %s); %s', job.job_id, ob)
+            job.error = str(ob)
+            job.retry_after = ob.retry_after
+            job.status = 'failed'
+        except Exception as e :
+            logger.error('unknown exception performing operation (job %s); %s', job.job_id, e)
+            job.error = 'unknown exception while performing operation'
+            job.status = 'failed'
+
+        job.completed = time.time()
+        job.done.set()
+
+    # -------------------------------------------------------
+    def submit(self, method_name, operation, parameters) :
+        """Queue an operation
+
+        :param method_name str: name of the operation, for logging
+        :param operation callable: the capability handler
+        :param parameters dict: parameters for the handler
+        :returns str: identifier for the job
+        :raises JobQueueFull: if there is no room for the job
+        """
+        with self._lock :
+            self._expire_()
+            if len(self._jobs) >= self.max_jobs and not self._evict_completed_() :
+                raise JobQueueFull('too many outstanding jobs')
+
+            job = Job(secrets.token_hex(16), method_name)
+            self._jobs[job.job_id] = job
+
+        self._executor.submit(self._run_, job, operation, parameters)
+        logger.info('submitted job %s for operation %s', job.job_id, method_name)
+        return job.job_id
+
+    # -------------------------------------------------------
+    def get_result(self, job_id, wait = 0) :
+        """Return the status of a job, waiting up to wait seconds for
+        it to complete; completed results remain available until they expire.
+        When max_waiters requests are already waiting the status is returned
+        without waiting and the client polls again
+
+        :raises KeyError: if the job is unknown or has expired
+        """
+        with self._lock :
+            self._expire_()
+            job = self._jobs[job_id]
+
+        wait = min(max(wait, 0), self.max_wait)
+        if wait > 0 and self._waiters and self._waiters.acquire(blocking=False) :
+            try :
+                job.done.wait(wait)
+            finally :
+                self._waiters.release()
+
+        return job.serialize()
@@ -0,0 +1,150 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import dbm
+import os
+import shelve
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+# the files each dbm backend creates for a shelve file
+# -----------------------------------------------------------------
+__dbm_suffixes__ = {
+    'dbm.gnu' : ('',),
+    'dbm.ndbm' : ('.db', '.dir', '.pag'),
+    'dbm.dumb' : ('.dat', '.dir', '.bak'),
+    'dbm.sqlite3' : ('',),
+}
+
+# -----------------------------------------------------------------
+def shelve_files(filename) :
+    """Return the files that hold the shelve file filename, an empty list
+    if there is no shelve file; other files that start with the same name
+    are not included
+    """
+    backend = dbm.whichdb(filename)
+    if not backend :
+        return []
+
+    suffixes = __dbm_suffixes__.get(backend, ('',))
+    return [ filename + suffix for suffix in suffixes if os.path.exists(filename + suffix) ]
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class ShelveStore(object) :
+    """Thread safe wrapper for a shelve file with support for online snapshots
+
+    Snapshots use a copy-on-write scheme: begin_snapshot fixes the set of
+    keys that belong to the snapshot, updates that happen while the snapshot
+    is being read preserve the value the key had when the snapshot began.
+    Once the first snapshot is taken, the store tracks the keys that change
+    so the next snapshot can be incremental. Keys that begin with '__' are
+    reserved for store metadata and are not included in snapshots.
+    """
+
+    # -------------------------------------------------------
+    def __init__(self, filename) :
+        self._lock = threading.RLock()
+        self._store = shelve.open(filename, flag='c', writeback=True)
+
+        self._modified_keys = None      # keys changed since the last snapshot began
+        self._snapshot_contents = None  # keys included in the active snapshot
+        self._snapshot_keys = None      # keys in the active snapshot that have not been read
+        self._preserved = None          # values overwritten while the snapshot is active
+
+    # -------------------------------------------------------
+    def close(self) :
+        with self._lock :
+            self._store.close()
+            self._store = None
+
+    # -------------------------------------------------------
+    def keys(self) :
+        with self._lock :
+            return [ k for k in self._store.keys() if not k.startswith('__') ]
+
+    # -------------------------------------------------------
+    def _get_entry_(self, key) :
+        with self._lock :
+            return self._store[key]
+
+    # -------------------------------------------------------
+    def _set_entry_(self, key, value) :
+        with self._lock :
+            if not key.startswith('__') :
+                if self._snapshot_keys is not None and key in self._snapshot_keys and key not in self._preserved :
+                    self._preserved[key] = self._store[key]
+                if self._modified_keys is not None :
+                    self._modified_keys.add(key)
+
+            self._store[key] = value
+
+    # -------------------------------------------------------
+    def snapshot_locks(self) :
+        return [ self._lock ]
+
+    # -------------------------------------------------------
+    def begin_snapshot(self, incremental = False) :
+        """Fix the contents of a snapshot; the caller should hold the store
+        lock if the snapshot must be consistent with other stores
+
+        :param incremental bool: include only keys modified since the last snapshot
+        :returns bool: True if the snapshot is incremental
+        """
+        with self._lock :
+            if self._snapshot_keys is not None :
+                raise RuntimeError('snapshot already in progress')
+
+            incremental = incremental and self._modified_keys is not None
+            if incremental :
+                self._snapshot_contents = frozenset(self._modified_keys)
+            else :
+                self._snapshot_contents = frozenset(self.keys())
+
+            self._snapshot_keys = set(self._snapshot_contents)
+            self._modified_keys = set()
+            self._preserved = dict()
+            return incremental
+
+    # -------------------------------------------------------
+    def snapshot_entries(self) :
+        """Generate the (key, value) pairs in the active snapshot; the store
+        remains available for updates while the entries are read
+        """
+        for key in sorted(self._snapshot_contents) :
+            with self._lock :
+                if key in self._preserved :
+                    value = self._preserved.pop(key)
+                else :
+                    value = self._store[key]
+                self._snapshot_keys.discard(key)
+            yield (key, value)
+
+    # -------------------------------------------------------
+    def end_snapshot(self, committed = True) :
+        """Complete the active snapshot; if the snapshot was not committed
+        its keys are treated as modified so the next incremental snapshot
+        includes them
+        """
+        with self._lock :
+            if not committed :
+                self._modified_keys.update(self._snapshot_contents)
+
+            self._snapshot_contents = None
+            self._snapshot_keys = None
+            self._preserved = None
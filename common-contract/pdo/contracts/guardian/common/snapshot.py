@@ -0,0 +1,147 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Point in time snapshots of the guardian service stores. A snapshot is
+written as a JSON lines file: the first line describes the snapshot and
+each following line holds one entry from one of the stores. Incremental
+snapshots contain only the entries changed since the previous snapshot
+taken by the same service process.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'SnapshotManager', 'restore_snapshots' ]
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class SnapshotManager(object) :
+
+    # -------------------------------------------------------
+    def __init__(self, directory, stores) :
+        """
+        :param directory str: directory where snapshot files are written
+        :param stores dict: map of store name to store, stores implement the ShelveStore snapshot interface
+        """
+        self.directory = directory
+        self.stores = stores
+        self.last_snapshot = None
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------
+    def _begin_(self, incremental) :
+        # hold every store lock so the snapshot is consistent across the stores,
+        # the locks are only held while the contents of the snapshot are fixed
+        with contextlib.ExitStack() as stack :
+            for store in self.stores.values() :
+                for lock in store.snapshot_locks() :
+                    stack.enter_context(lock)
+
+            modes = [ store.begin_snapshot(incremental) for store in self.stores.values() ]
+            if incremental and not all(modes) :
+                for store in self.stores.values() :
+                    store.end_snapshot(False)
+                    store.begin_snapshot(False)
+                return False
+
+            return incremental
+
+    # -------------------------------------------------------
+    def snapshot(self, incremental = False) :
+        """Write a snapshot of the stores while the service continues to
+        handle requests
+
+        :param incremental bool: write only the entries changed since the last snapshot
+        :returns dict: description of the snapshot that was written
+        """
+        if not self._lock.acquire(blocking=False) :
+            raise RuntimeError('snapshot already in progress')
+
+        try :
+            # create the directory before the stores enter snapshot mode so
+            # that a bad path does not leave them in it
+            os.makedirs(self.directory, exist_ok=True)
+            incremental = self._begin_(incremental and self.last_snapshot is not None)
+
+            snapshot_info = dict()
+            snapshot_info['snapshot'] = '{0}_{1}'.format(time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+            snapshot_info['incremental'] = incremental
+            snapshot_info['base'] = self.last_snapshot if incremental else None
+            snapshot_info['timestamp'] = time.time()
+
+            filename = os.path.join(self.directory, 'snapshot_{0}.jsonl'.format(snapshot_info['snapshot']))
+
+            committed = False
+            entries = 0
+            try :
+                with open(filename + '.partial', 'w') as fp :
+                    fp.write(json.dumps(snapshot_info) + '\n')
+                    for (store_name, store) in self.stores.items() :
+                        for (key, value) in store.snapshot_entries() :
+                            entry = { 'store' : store_name, 'key' : key, 'value' : list(value) }
+                            fp.write(json.dumps(entry) + '\n')
+                            entries += 1
+
+                os.replace(filename + '.partial', filename)
+                committed = True
+            finally :
+                for store in self.stores.values() :
+                    store.end_snapshot(committed)
+
+            self.last_snapshot = snapshot_info['snapshot']
+            logger.info('wrote snapshot %s with %d entries', filename, entries)
+
+            snapshot_info['file'] = filename
+            snapshot_info['entries'] = entries
+            return snapshot_info
+
+        finally :
+            self._lock.release()
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def restore_snapshots(filenames, stores) :
+    """Apply a full snapshot followed by a sequence of incremental snapshots
+    to the stores; this is an offline operation
+
+    :param filenames list: snapshot files in the order they were taken
+    :param stores dict: map of store name to store
+    :returns int: number of entries restored
+    """
+    previous = None
+    entries = 0
+    for filename in filenames :
+        with open(filename, 'r') as fp :
+            snapshot_info = json.loads(fp.readline())
+            if snapshot_info['incremental'] and snapshot_info['base'] != previous :
+                raise ValueError('snapshot {0} does not follow {1}'.format(snapshot_info['snapshot'], previous))
+
+            for line in fp :
+                entry = json.loads(line)
+                stores[entry['store']]._set_entry_(entry['key'], tuple(entry['value']))
+                entries += 1
+
+        previous = snapshot_info['snapshot']
+        logger.info('restored snapshot %s', filename)
+
+    return entries
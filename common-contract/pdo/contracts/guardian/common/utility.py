@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import jsonschema
+from http import HTTPStatus
 import os
 import random
 import string
 
 from pdo.common.key_value import KeyValueStore
+from pdo.contracts.guardian.common.imports import lazy_import
+
+# jsonschema is slow to import and is not needed until the first request
+jsonschema = lazy_import('jsonschema')
 
 import logging
 logger = logging.getLogger(__name__)
@@ -30,6 +34,29 @@ def ValidateJSON(instance, schema):
         return False
     return True
 
+# -----------------------------------------------------------------
+def AdminRequestAllowed(environ, config) :
+    """Administrative operations are only accepted from the hosts listed
+    in the AdminHosts configuration, by default the local host
+    """
+    admin_hosts = config.get('GuardianService', {}).get('AdminHosts', ['127.0.0.1', '::1'])
+    return environ.get('REMOTE_ADDR') in admin_hosts
+
+# -----------------------------------------------------------------
+def UnavailableResponse(start_response, msg, retry_after = 1) :
+    """Generate a response for requests that arrive before the service
+    is ready to handle them
+    """
+    result = (msg + '\n').encode('utf8')
+    status = "{0} {1}".format(HTTPStatus.SERVICE_UNAVAILABLE.value, HTTPStatus.SERVICE_UNAVAILABLE.name)
+    headers = [
+               ('Content-Type', 'text/plain'),
+               ('Content-Length', str(len(result))),
+               ('Retry-After', str(retry_after)),
+               ]
+    start_response(status, headers)
+    return [result]
+
 # -----------------------------------------------------------------
 # Size of chunks to store per key; this is the maximum size of a
 # single key in the KeyValueStore
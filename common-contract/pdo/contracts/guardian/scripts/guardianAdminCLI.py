@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+"""
+Administrative commands for the data guardian service.
+"""
+
+import json
+import os
+import sys
+import argparse
+
+import pdo.common.config as pconfig
+import pdo.common.logger as plogger
+import pdo.common.utility as putils
+
+from pdo.contracts.guardian.common.capability_keystore import CapabilityKeyStore, ShardedCapabilityKeyStore
+from pdo.contracts.guardian.common.capability_keystore import reshard_capability_keystore
+from pdo.contracts.guardian.common.endpoint_registry import EndpointRegistry
+from pdo.contracts.guardian.common.snapshot import restore_snapshots
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def ReshardCommand(config, options) :
+    """Redistribute the capability keystore across a new number of
+    shards; the guardian service must be stopped while this runs
+    """
+
+    try :
+        keystore_filename = config['Data']['CapabilityKeyStore']
+    except KeyError as ke :
+        logger.error('missing required configuration; %s', str(ke))
+        sys.exit(-1)
+
+    keystore_filename = putils.build_file_name(keystore_filename, extension='db')
+
+    try :
+        count = reshard_capability_keystore(keystore_filename, options.shards, not options.keep)
+    except Exception as e :
+        logger.error('failed to reshard the capability keystore; %s', str(e))
+        sys.exit(-1)
+
+    logger.info('resharded %d capability keys into %d shards', count, options.shards)
+    logger.info('set CapabilityKeyStoreShards = %d in the [Data] configuration', options.shards)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def ServiceClient(config) :
+    """Create a client for the guardian service in the configuration
+    """
+
+    from pdo.contracts.guardian.common.guardian_service import GuardianServiceClient
+
+    try :
+        http_port = config['GuardianService']['HttpPort']
+        http_host = config['GuardianService']['Host']
+        service_url = 'http://{}:{}'.format(http_host, http_port)
+    except KeyError as ke :
+        logger.error('missing configuration for %s', str(ke))
+        sys.exit(-1)
+
+    try :
+        return GuardianServiceClient(service_url)
+    except Exception as e :
+        logger.error('failed to contact guardian service; {}'.format(str(e)))
+        sys.exit(-1)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def SnapshotCommand(config, options) :
+    """Ask a running guardian service to snapshot its keystore and
+    endpoint registry
+    """
+
+    service_client = ServiceClient(config)
+
+    try :
+        snapshot_info = service_client.snapshot(incremental=options.incremental)
+    except Exception as e :
+        logger.error('snapshot failed; %s', str(e))
+        sys.exit(-1)
+
+    logger.info('%s snapshot %s written to %s with %d entries',
+                'incremental' if snapshot_info['incremental'] else 'full',
+                snapshot_info['snapshot'], snapshot_info['file'], snapshot_info['entries'])
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def ReloadCommand(config, options) :
+    """Ask a running guardian service to rebuild its capability handlers
+    from the current configuration files
+    """
+
+    service_client = ServiceClient(config)
+
+    try :
+        reload_info = service_client.reload()
+    except Exception as e :
+        logger.error('reload failed; %s', str(e))
+        sys.exit(-1)
+
+    if not reload_info['reload_started'] :
+        logger.error('reload already in progress')
+        sys.exit(-1)
+
+    logger.info('reload started, current handler generation is %d', reload_info['generation'])
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def StatisticsCommand(config, options) :
+    """Print the statistics reported by the capability handlers of a
+    running guardian service
+    """
+
+    service_client = ServiceClient(config)
+
+    try :
+        statistics = service_client.statistics()
+    except Exception as e :
+        logger.error('statistics request failed; %s', str(e))
+        sys.exit(-1)
+
+    print(json.dumps(statistics, indent=2))
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def RestoreCommand(config, options) :
+    """Restore the keystore and endpoint registry from a full snapshot
+    and any incremental snapshots that follow it; the guardian service
+    must be stopped while this runs
+    """
+
+    try :
+        keystore_filename = config['Data']['CapabilityKeyStore']
+        endpoint_filename = config['Data']['EndpointRegistry']
+    except KeyError as ke :
+        logger.error('missing required configuration; %s', str(ke))
+        sys.exit(-1)
+
+    keystore_filename = putils.build_file_name(keystore_filename, extension='db')
+    keystore_shards = config['Data'].get('CapabilityKeyStoreShards', 0)
+    if keystore_shards > 0 :
+        capability_keystore = ShardedCapabilityKeyStore(keystore_filename, keystore_shards)
+    else :
+        capability_keystore = CapabilityKeyStore(keystore_filename)
+
+    endpoint_filename = putils.build_file_name(endpoint_filename, extension='db')
+    endpoint_registry = EndpointRegistry(endpoint_filename)
+
+    stores = { 'capability_keys' : capability_keystore, 'endpoints' : endpoint_registry }
+    try :
+        count = restore_snapshots(options.snapshot, stores)
+    except Exception as e :
+        logger.error('failed to restore snapshots; %s', str(e))
+        sys.exit(-1)
+    finally :
+        capability_keystore.close()
+        endpoint_registry.close()
+
+    logger.info('restored %d entries', count)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+
+__admin_commands__ = {
+    'reload' : ReloadCommand,
+    'reshard' : ReshardCommand,
+    'restore' : RestoreCommand,
+    'snapshot' : SnapshotCommand,
+    'statistics' : StatisticsCommand,
+}
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def Main() :
+    config_map = pconfig.build_configuration_map()
+
+    # parse out the configuration file first
+    conffiles = [ 'guardian_service.toml' ]
+    confpaths = [ ".", "./etc", config_map['etc'] ]
+
+    parser = argparse.ArgumentParser()
+
+    # allow for override of bindings in the config map
+    parser.add_argument('-b', '--bind', help='Define variables for configuration and script use', nargs=2, action='append')
+
+    parser.add_argument('--config', help='configuration file', nargs = '+')
+    parser.add_argument('--config-dir', help='directory to search for configuration files', nargs = '+')
+
+    parser.add_argument('--identity', help='Identity of the guardian service', default='guardian_service', type = str)
+    parser.add_argument('--data-dir', help='Path for storing generated files', type=str)
+
+    parser.add_argument('--logfile', help='Name of the log file, __screen__ for standard output', type=str)
+    parser.add_argument('--loglevel', help='Logging level', type=str)
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    reshard_parser = subparsers.add_parser('reshard', help='redistribute the capability keystore across shards')
+    reshard_parser.add_argument('--shards', help='Number of data shards', type=int, required=True)
+    reshard_parser.add_argument('--keep', help='Keep the old shard files', action='store_true')
+
+    subparsers.add_parser('reload', help='rebuild the capability handlers of a running guardian service')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='snapshot the stores of a running guardian service')
+    snapshot_parser.add_argument('--incremental', help='Include only changes since the last snapshot', action='store_true')
+
+    subparsers.add_parser('statistics', help='show the statistics of the capability handlers of a running guardian service')
+
+    restore_parser = subparsers.add_parser('restore', help='restore the stores from snapshots')
+    restore_parser.add_argument('--snapshot', help='Snapshot files, full snapshot first', nargs='+', required=True)
+
+    options = parser.parse_args()
+
+    # first process the options necessary to load the default configuration
+    if options.config :
+        conffiles = options.config
+
+    if options.config_dir :
+        confpaths = options.config_dir
+
+    config_map['identity'] = options.identity
+    if options.data_dir :
+        config_map['data'] = options.data_dir
+
+    # set up the configuration mapping from the parameters
+    if options.bind :
+        for (k, v) in options.bind : config_map[k] = v
+
+    # parse the configuration files
+    try :
+        config = pconfig.parse_configuration_files(conffiles, confpaths, config_map)
+    except pconfig.ConfigurationException as e :
+        logger.error(str(e))
+        sys.exit(-1)
+
+    # set up the logging configuration, admin commands log to the screen by default
+    config['Logging'] = {
+        'LogFile' : options.logfile or '__screen__',
+        'LogLevel' : (options.loglevel or 'INFO').upper(),
+    }
+
+    pconfig.initialize_shared_configuration(config)
+    plogger.setup_loggers(config['Logging'])
+
+    __admin_commands__[options.command](config, options)
+    sys.exit(0)
@@ -21,6 +21,7 @@ Data guardian service.
 import os
 import sys
 import argparse
+import functools
 
 import signal
 
@@ -28,24 +29,17 @@ import pdo.common.config as pconfig
 import pdo.common.logger as plogger
 import pdo.common.utility as putils
 
-from pdo.common.wsgi import AppWrapperMiddleware
-from pdo.contracts.guardian.wsgi import wsgi_operation_map
-from pdo.contracts.guardian.common.capability_keystore import CapabilityKeyStore
-from pdo.contracts.guardian.common.endpoint_registry import EndpointRegistry
+from pdo.contracts.guardian.common.imports import ImportProfiler
 
 import logging
 logger = logging.getLogger(__name__)
 
-
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
-from twisted.web import http
-from twisted.web.resource import Resource, NoResource
-from twisted.web.server import Site
-from twisted.python.threadpool import ThreadPool
-from twisted.internet import reactor, defer
-from twisted.internet.endpoints import TCP4ServerEndpoint
-from twisted.web.wsgi import WSGIResource
+
+# Twisted, the WSGI applications and the stores are imported when the
+# service starts (after the command line is processed) so that their
+# import time can be profiled with --import-profile
 
 ## ----------------------------------------------------------------
 def ErrorResponse(request, error_code, msg) :
@@ -73,9 +67,17 @@ def ErrorResponse(request, error_code, msg) :
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 def __shutdown__(*args) :
+    from twisted.internet import reactor
+
     logger.warn('shutdown request received')
     reactor.callLater(1, reactor.stop)
 
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def __reload__(capability_handlers, *args) :
+    logger.warn('reload request received')
+    capability_handlers.reload_in_background()
+
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 def TestService(config) :
@@ -107,12 +109,26 @@ def TestService(config) :
         logger.error('failed to contact guardian service; {}'.format(str(e)))
         sys.exit(-1)
 
-    logger.info('guardian service running; {}'.format(service_url))
+    if not service_client.ready :
+        logger.info('guardian service running, capability handlers not ready; {}'.format(service_url))
+    else :
+        logger.info('guardian service running; {}'.format(service_url))
     sys.exit(0)
 
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
-def StartService(config, capability_keystore, endpoint_registry) :
+def StartService(config, capability_keystore, endpoint_registry, config_loader = None, import_profiler = None) :
+    from twisted.web.resource import Resource
+    from twisted.web.server import Site
+    from twisted.python.threadpool import ThreadPool
+    from twisted.internet import reactor
+    from twisted.internet.endpoints import TCP4ServerEndpoint
+    from twisted.web.wsgi import WSGIResource
+
+    from pdo.common.wsgi import AppWrapperMiddleware
+    from pdo.contracts.guardian.wsgi import wsgi_operation_map
+    from pdo.contracts.guardian.common.capability_handlers import CapabilityHandlers
+
     try :
         http_port = config['GuardianService']['HttpPort']
         http_host = config['GuardianService']['Host']
@@ -135,6 +151,10 @@ def StartService(config, capability_keystore, endpoint_registry) :
         app = AppWrapperMiddleware(wsgi_app(config, capability_keystore, endpoint_registry))
         root.putChild(verb, WSGIResource(reactor, thread_pool, app))
 
+    # allow the capability handlers to be rebuilt from the configuration files
+    capability_handlers = CapabilityHandlers.shared_handlers(config)
+    capability_handlers.config_loader = config_loader
+
     site = Site(root, timeout=60)
     site.displayTracebacks = True
 
@@ -142,13 +162,32 @@ def StartService(config, capability_keystore, endpoint_registry) :
 
     signal.signal(signal.SIGQUIT, __shutdown__)
     signal.signal(signal.SIGTERM, __shutdown__)
+    signal.signal(signal.SIGHUP, functools.partial(__reload__, capability_handlers))
 
     endpoint = TCP4ServerEndpoint(reactor, http_port, backlog=32, interface=http_host)
     endpoint.listen(site)
 
+    # the port is bound before the capability handlers are created; until
+    # they are ready the info operation reports that the service is not
+    # ready and capability requests are rejected as unavailable
+    def load_handlers() :
+        if not capability_handlers.load() :
+            logger.error('failed to initialize the capability handlers')
+            reactor.callFromThread(reactor.stop)
+            return
+
+        logger.info('capability handlers ready')
+        if import_profiler :
+            import_profiler.uninstall()
+            import_profiler.report()
+
+    reactor.callInThread(load_handlers)
+
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 def RunService(capability_keystore, endpoint_registry) :
+    from twisted.internet import reactor, defer
+
     @defer.inlineCallbacks
     def shutdown_twisted():
         logger.info("Stopping Twisted")
@@ -169,7 +208,9 @@ def RunService(capability_keystore, endpoint_registry) :
 
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
-def LocalMain(config) :
+def LocalMain(config, config_loader = None, import_profiler = None) :
+    from pdo.contracts.guardian.common.capability_keystore import CapabilityKeyStore, ShardedCapabilityKeyStore
+    from pdo.contracts.guardian.common.endpoint_registry import EndpointRegistry
 
     # load and initialize the model and service keys
     try :
@@ -182,7 +223,11 @@ def LocalMain(config) :
             sys.exit(-1)
 
         keystore_filename = putils.build_file_name(keystore_filename, extension='db')
-        capability_keystore = CapabilityKeyStore(keystore_filename)
+        keystore_shards = config['Data'].get('CapabilityKeyStoreShards', 0)
+        if keystore_shards > 0 :
+            capability_keystore = ShardedCapabilityKeyStore(keystore_filename, keystore_shards)
+        else :
+            capability_keystore = CapabilityKeyStore(keystore_filename)
 
         try :
             endpoint_filename = config['Data']['EndpointRegistry']
@@ -199,7 +244,7 @@ def LocalMain(config) :
 
     # set up the handlers for the enclave service
     try :
-        StartService(config, capability_keystore, endpoint_registry)
+        StartService(config, capability_keystore, endpoint_registry, config_loader, import_profiler)
     except Exception as e:
         logger.exception('failed to start the enclave service; %s', e)
         sys.exit(-1)
@@ -239,9 +284,15 @@ def Main() :
     parser.add_argument('--block-store', help='Name of the file where blocks are stored', type=str)
 
     parser.add_argument('--test', help='Test for guardian service', action='store_true')
+    parser.add_argument('--import-profile', help='Log the time spent importing modules during startup', action='store_true')
 
     options = parser.parse_args()
 
+    import_profiler = None
+    if options.import_profile :
+        import_profiler = ImportProfiler()
+        import_profiler.install()
+
     # first process the options necessary to load the default configuration
     if options.config :
         conffiles = options.config
@@ -264,16 +315,42 @@ def Main() :
         logger.error(str(e))
         sys.exit(-1)
 
-    # set up the logging configuration
-    if config.get('Logging') is None :
-        config['Logging'] = {
-            'LogFile' : '__screen__',
-            'LogLevel' : 'INFO'
-        }
-    if options.logfile :
-        config['Logging']['LogFile'] = options.logfile
-    if options.loglevel :
-        config['Logging']['LogLevel'] = options.loglevel.upper()
+    # the defaults and command line overrides are applied to the
+    # configuration read at startup and to the configuration read on reload
+    def apply_overrides(config) :
+        # set up the logging configuration
+        if config.get('Logging') is None :
+            config['Logging'] = {
+                'LogFile' : '__screen__',
+                'LogLevel' : 'INFO'
+            }
+        if options.logfile :
+            config['Logging']['LogFile'] = options.logfile
+        if options.loglevel :
+            config['Logging']['LogLevel'] = options.loglevel.upper()
+
+        # set up the key search paths
+        if config.get('Key') is None :
+            config['Key'] = {
+                'SearchPath' : [ '.', './keys', config_map['keys'] ],
+                'FileName' : options.identity + ".pem"
+            }
+        if options.key_dir :
+            config['Key']['SearchPath'] = options.key_dir
+
+        # set up the enclave service configuration
+        if config.get('GuardianService') is None :
+            config['GuardianService'] = {
+                'HttpPort' : 7101,
+                'Host' : 'localhost',
+                'Identity' : options.identity,
+            }
+        if options.http :
+            config['GuardianService']['HttpPort'] = options.http
+
+        return config
+
+    apply_overrides(config)
 
     # make the configuration available to all of the PDO modules
     pconfig.initialize_shared_configuration(config)
@@ -282,30 +359,15 @@ def Main() :
     sys.stdout = plogger.stream_to_logger(logging.getLogger('STDOUT'), logging.DEBUG)
     sys.stderr = plogger.stream_to_logger(logging.getLogger('STDERR'), logging.WARN)
 
-    # set up the key search paths
-    if config.get('Key') is None :
-        config['Key'] = {
-            'SearchPath' : [ '.', './keys', config_map['keys'] ],
-            'FileName' : options.identity + ".pem"
-        }
-    if options.key_dir :
-        config['Key']['SearchPath'] = options.key_dir
-
-    # set up the enclave service configuration
-    if config.get('GuardianService') is None :
-        config['GuardianService'] = {
-            'HttpPort' : 7101,
-            'Host' : 'localhost',
-            'Identity' : options.identity,
-        }
-    if options.http :
-        config['GuardianService']['HttpPort'] = options.http
+    # the capability handlers are rebuilt from the configuration files on reload
+    def config_loader() :
+        return apply_overrides(pconfig.parse_configuration_files(conffiles, confpaths, config_map))
 
     # GO!
     if options.test :
         TestService(config)
     else :
-        LocalMain(config)
+        LocalMain(config, config_loader, import_profiler)
 
 ## -----------------------------------------------------------------
 ## Entry points
@@ -13,24 +13,39 @@
 # limitations under the License.
 
 from pdo.contracts.guardian.wsgi.add_endpoint import AddEndpointApp
+from pdo.contracts.guardian.wsgi.get_job_result import GetJobResultApp
 from pdo.contracts.guardian.wsgi.info import InfoApp
 from pdo.contracts.guardian.wsgi.process_capability import ProcessCapabilityApp
 from pdo.contracts.guardian.wsgi.provision_token_issuer import ProvisionTokenIssuerApp
 from pdo.contracts.guardian.wsgi.provision_token_object import ProvisionTokenObjectApp
+from pdo.contracts.guardian.wsgi.reload import ReloadApp
+from pdo.contracts.guardian.wsgi.snapshot import SnapshotApp
+from pdo.contracts.guardian.wsgi.statistics import StatisticsApp
+from pdo.contracts.guardian.wsgi.submit_capability import SubmitCapabilityApp
 
 
 __all__ = [
     'AddEndpointApp',
+    'GetJobResultApp',
     'InfoApp',
     'ProcessCapabilityApp',
     'ProvisionTokenIssuerApp',
-    'ProvisionTokenObjectApp'
+    'ProvisionTokenObjectApp',
+    'ReloadApp',
+    'SnapshotApp',
+    'StatisticsApp',
+    'SubmitCapabilityApp',
     ]
 
 wsgi_operation_map = {
     'add_endpoint' : AddEndpointApp,
+    'get_job_result' : GetJobResultApp,
     'info' : InfoApp,
     'process_capability' : ProcessCapabilityApp,
     'provision_token_issuer' : ProvisionTokenIssuerApp,
-    'provision_token_object' : ProvisionTokenObjectApp
+    'provision_token_object' : ProvisionTokenObjectApp,
+    'reload' : ReloadApp,
+    'snapshot' : SnapshotApp,
+    'statistics' : StatisticsApp,
+    'submit_capability' : SubmitCapabilityApp,
     }
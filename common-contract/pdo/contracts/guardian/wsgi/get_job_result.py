@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+"""
+This file defines the GetJobResultApp class, a WSGI interface class for
+retrieving the status and result of an operation queued through the
+submit_capability operation. The request may wait (long poll) for the
+operation to complete.
+"""
+
+from http import HTTPStatus
+import json
+
+from pdo.contracts.guardian.common.job_queue import JobQueue
+from pdo.contracts.guardian.common.utility import ValidateJSON
+from pdo.common.wsgi import ErrorResponse, UnpackJSONRequest
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class GetJobResultApp(object) :
+    __input_schema__ = {
+        "type" : "object",
+        "properties" : {
+            "job_id" : { "type" : "string" },
+            "wait" : { "type" : "number" },
+        },
+        "required" : [ "job_id" ],
+    }
+
+    # -----------------------------------------------------------------
+    def __init__(self, config, capability_store, endpoint_registry) :
+        self.job_queue = JobQueue.shared_queue(config)
+
+    # -----------------------------------------------------------------
+    def __call__(self, environ, start_response) :
+        try :
+            request = UnpackJSONRequest(environ)
+            if not ValidateJSON(request, self.__input_schema__) :
+                return ErrorResponse(start_response, "invalid JSON")
+
+            job_id = request['job_id']
+            wait = request.get('wait', 0)
+
+        except Exception as e :
+            logger.error("unknown exception unpacking request (GetJobResult); %s", str(e))
+            return ErrorResponse(start_response, "unknown exception while unpacking request")
+
+        try :
+            job_result = self.job_queue.get_result(job_id, wait)
+        except KeyError as ke :
+            return ErrorResponse(start_response, 'unknown job {0}'.format(job_id))
+
+        result = bytes(json.dumps(job_result), 'utf8')
+        status = "{0} {1}".format(HTTPStatus.OK.value, HTTPStatus.OK.name)
+        headers = [
+                   ('Content-Type', 'application/octet-stream'),
+                   ('Content-Transfer-Encoding', 'utf-8'),
+                   ('Content-Length', str(len(result)))
+                   ]
+        start_response(status, headers)
+        return [result]
@@ -23,6 +23,7 @@ import json
 
 from http import HTTPStatus
 from pdo.common.wsgi import ErrorResponse
+from pdo.contracts.guardian.common.capability_handlers import CapabilityHandlers
 
 import logging
 logger = logging.getLogger(__name__)
@@ -34,6 +35,7 @@ class InfoApp(object) :
         self.storage_url = config['StorageService']['URL']
         self.capability_store = capability_store
         self.endpoint_registry = endpoint_registry
+        self.capability_handlers = CapabilityHandlers.shared_handlers(config)
 
     def __call__(self, environ, start_response) :
         try :
@@ -41,6 +43,7 @@ class InfoApp(object) :
             response['verifying_key'] = self.capability_store.svc_capability_key.verifying_key
             response['encryption_key'] = self.capability_store.svc_capability_key.encryption_key
             response['storage_service_url'] = self.storage_url
+            response['ready'] = self.capability_handlers.ready
 
             result = json.dumps(response).encode()
         except Exception as e :
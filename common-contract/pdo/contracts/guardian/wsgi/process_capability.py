@@ -20,16 +20,23 @@ handling contract method invocation requests.
 """
 
 from http import HTTPStatus
-import importlib
 import json
 
-from pdo.contracts.guardian.common.utility import ValidateJSON
+from pdo.contracts.guardian.common.capability_handlers import CapabilityHandlers, HandlersNotReady, OperationBusy
+from pdo.contracts.guardian.common.utility import UnavailableResponse, ValidateJSON
 from pdo.contracts.guardian.common.secrets import recv_secret
 from pdo.common.wsgi import ErrorResponse, UnpackJSONRequest
 
 import logging
 logger = logging.getLogger(__name__)
 
+# -----------------------------------------------------------------
+class CapabilityRequestError(Exception) :
+    """Raised when a capability request cannot be unpacked, the message
+    is returned to the caller
+    """
+    pass
+
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 class ProcessCapabilityApp(object) :
@@ -62,55 +69,65 @@ class ProcessCapabilityApp(object) :
         self.config = config
         self.capability_store = capability_store
         self.endpoint_registry = endpoint_registry
-
-        try :
-            operation_module_name = config['GuardianService']['Operations']
-        except KeyError as ke :
-            logger.error('No operation map configured')
-            raise
-
-        operation_module = importlib.import_module(operation_module_name)
-
-        self.capability_handler_map = {}
-        for (op, handler) in operation_module.capability_handler_map.items() :
-            self.capability_handler_map[op] = handler(config)
+        self.capability_handlers = CapabilityHandlers.shared_handlers(config)
 
     # -----------------------------------------------------------------
-    def __call__(self, environ, start_response) :
+    def _unpack_operation_(self, environ) :
+        """Unpack and decrypt the operation in a capability request
+
+        :returns tuple: the method name and the parameters for the operation
+        :raises CapabilityRequestError: with a message suitable for the error response
+        """
         # unpack the request, this is WSGI magic
         try :
             request = UnpackJSONRequest(environ)
             if not ValidateJSON(request, self.__input_schema__) :
-                return ErrorResponse(start_response, "invalid JSON")
+                raise CapabilityRequestError("invalid JSON")
 
             capability_key = self.capability_store.get_capability_key(request['minted_identity'])
 
             operation_message = recv_secret(capability_key, request['operation'])
             if not ValidateJSON(operation_message, self.__operation_schema__) :
-                return ErrorResponse(start_response, "invalid JSON")
+                raise CapabilityRequestError("invalid JSON")
 
+        except CapabilityRequestError :
+            raise
         except KeyError as ke :
             logger.error(f'missing field in request: {ke}')
-            return ErrorResponse(start_response, f'missing field in request: {ke}')
+            raise CapabilityRequestError(f'missing field in request: {ke}')
         except Exception as e :
             logger.error(f'unknown exception unpacking request (ProcessCapability); {e}')
-            return ErrorResponse(start_response, "unknown exception while unpacking request")
+            raise CapabilityRequestError("unknown exception while unpacking request")
 
-        # dispatch the operation
         try :
             method_name = operation_message['method_name']
             parameters = operation_message['parameters']
         except KeyError as ke :
             logger.error(f'missing field {ke}')
-            return ErrorResponse(start_response, f'missing field {ke}')
+            raise CapabilityRequestError(f'missing field {ke}')
+
+        return (method_name, parameters)
+
+    # -----------------------------------------------------------------
+    def __call__(self, environ, start_response) :
+        try :
+            (method_name, parameters) = self._unpack_operation_(environ)
+        except CapabilityRequestError as cre :
+            return ErrorResponse(start_response, str(cre))
 
+        # dispatch the operation
         logger.info("process capability operation %s with parameters %s", method_name, parameters)
 
         try :
-            operation = self.capability_handler_map[method_name]
+            operation = self.capability_handlers.get_handler(method_name)
             operation_result = operation(parameters)
             if operation_result is None :
                 return ErrorResponse(start_response, "operation failed")
+        except HandlersNotReady as nr :
+            return UnavailableResponse(start_response, str(nr))
+        except OperationBusy as ob :
+            logger.warning('operation %s is busy; %s', method_name, ob)
+            return UnavailableResponse(start_response, str(ob), ob.retry_after)
         except KeyError as ke :
             logger.error(f'unknown operation {ke}')
             return ErrorResponse(start_response, f'unknown operation {ke}')
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+"""
+This file defines the ReloadApp class, a WSGI interface class for
+handling administrative requests to rebuild the capability handlers
+from fresh configuration.
+"""
+
+from http import HTTPStatus
+import json
+
+from pdo.contracts.guardian.common.capability_handlers import CapabilityHandlers
+from pdo.contracts.guardian.common.utility import AdminRequestAllowed
+from pdo.common.wsgi import ErrorResponse
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ReloadApp(object) :
+    def __init__(self, config, capability_store, endpoint_registry) :
+        self.config = config
+        self.capability_handlers = CapabilityHandlers.shared_handlers(config)
+
+    def __call__(self, environ, start_response) :
+        if not AdminRequestAllowed(environ, self.config) :
+            return ErrorResponse(start_response, 'not authorized')
+
+        try :
+            response = dict()
+            response['reload_started'] = self.capability_handlers.reload_in_background()
+            response['generation'] = self.capability_handlers.generation
+
+            result = json.dumps(response).encode()
+        except Exception as e :
+            logger.exception("reload")
+            return ErrorResponse(start_response, "exception; {0}".format(str(e)))
+
+        status = "{0} {1}".format(HTTPStatus.OK.value, HTTPStatus.OK.name)
+        headers = [
+                   ('Content-Type', 'application/json'),
+                   ('Content-Length', str(len(result)))
+                   ]
+        start_response(status, headers)
+        return [result]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+"""
+This file defines the SnapshotApp class, a WSGI interface class for
+handling administrative requests to snapshot the keystore and the
+endpoint registry while the service continues to handle requests.
+"""
+
+from http import HTTPStatus
+import json
+import os
+
+from pdo.contracts.guardian.common.snapshot import SnapshotManager
+from pdo.contracts.guardian.common.utility import AdminRequestAllowed, ValidateJSON
+from pdo.common.wsgi import ErrorResponse, UnpackJSONRequest
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class SnapshotApp(object) :
+    __input_schema__ = {
+        "type" : "object",
+        "properties" : {
+            "incremental" : { "type" : "boolean" },
+        }
+    }
+
+    # -----------------------------------------------------------------
+    def __init__(self, config, capability_store, endpoint_registry) :
+        self.config = config
+
+        data_config = config.get('Data', {})
+        snapshot_directory = data_config.get('SnapshotDirectory')
+        if snapshot_directory is None :
+            keystore_directory = os.path.dirname(data_config.get('CapabilityKeyStore', ''))
+            snapshot_directory = os.path.join(keystore_directory, 'snapshots')
+
+        stores = { 'capability_keys' : capability_store, 'endpoints' : endpoint_registry }
+        self.snapshot_manager = SnapshotManager(snapshot_directory, stores)
+
+    # -----------------------------------------------------------------
+    def __call__(self, environ, start_response) :
+        if not AdminRequestAllowed(environ, self.config) :
+            return ErrorResponse(start_response, 'not authorized')
+
+        try :
+            request = UnpackJSONRequest(environ)
+            if not ValidateJSON(request, self.__input_schema__) :
+                return ErrorResponse(start_response, "invalid JSON")
+
+            incremental = request.get('incremental', False)
+
+        except Exception as e :
+            logger.error("unknown exception unpacking request (Snapshot); %s", str(e))
+            return ErrorResponse(start_response, "unknown exception while unpacking request")
+
+        try :
+            snapshot_info = self.snapshot_manager.snapshot(incremental)
+        except Exception as e :
+            logger.exception("snapshot")
+            return ErrorResponse(start_response, "snapshot failed; {0}".format(str(e)))
+
+        result = json.dumps(snapshot_info).encode()
+        status = "{0} {1}".format(HTTPStatus.OK.value, HTTPStatus.OK.name)
+        headers = [
+                   ('Content-Type', 'application/json'),
+                   ('Content-Length', str(len(result)))
+                   ]
+        start_response(status, headers)
+        return [result]
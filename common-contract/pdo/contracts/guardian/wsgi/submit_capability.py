@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+
+"""
+This file defines the SubmitCapabilityApp class, a WSGI interface class
+for handling capability operations asynchronously. The operation is
+unpacked and queued, the response contains a job identifier that can
+be used to retrieve the result through the get_job_result operation.
+"""
+
+from http import HTTPStatus
+import json
+
+from pdo.contracts.guardian.common.capability_handlers import HandlersNotReady
+from pdo.contracts.guardian.common.job_queue import JobQueue, JobQueueFull
+from pdo.contracts.guardian.common.utility import UnavailableResponse
+from pdo.contracts.guardian.wsgi.process_capability import ProcessCapabilityApp, CapabilityRequestError
+from pdo.common.wsgi import ErrorResponse
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class SubmitCapabilityApp(ProcessCapabilityApp) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, config, capability_store, endpoint_registry) :
+        super().__init__(config, capability_store, endpoint_registry)
+        self.job_queue = JobQueue.shared_queue(config)
+
+    # -----------------------------------------------------------------
+    def __call__(self, environ, start_response) :
+        try :
+            (method_name, parameters) = self._unpack_operation_(environ)
+        except CapabilityRequestError as cre :
+            return ErrorResponse(start_response, str(cre))
+
+        logger.info("submit capability operation %s with parameters %s", method_name, parameters)
+
+        try :
+            operation = self.capability_handlers.get_handler(method_name)
+            job_id = self.job_queue.submit(method_name, operation, parameters)
+        except HandlersNotReady as nr :
+            return UnavailableResponse(start_response, str(nr))
+        except KeyError as ke :
+            logger.error(f'unknown operation {ke}')
+            return ErrorResponse(start_response, f'unknown operation {ke}')
+        except JobQueueFull as qf :
+            # the client resubmits requests that are rejected as too many
+            logger.warning('job queue full')
+            status = "{0} {1}".format(HTTPStatus.TOO_MANY_REQUESTS.value, HTTPStatus.TOO_MANY_REQUESTS.name)
+            start_response(status, [('Retry-After', '1'), ('Content-Length', '0')])
+            return [b'']
+        except Exception as e :
+            logger.error(f'unknown exception submitting operation (SubmitCapability); {e}')
+            return ErrorResponse(start_response, "unknown exception while submitting operation")
+
+        result = json.dumps({ 'job_id' : job_id }).encode()
+        status = "{0} {1}".format(HTTPStatus.OK.value, HTTPStatus.OK.name)
+        headers = [
+                   ('Content-Type', 'application/json'),
+                   ('Content-Length', str(len(result)))
+                   ]
+        start_response(status, headers)
+        return [result]
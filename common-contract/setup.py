@@ -105,6 +105,7 @@ setup(
     entry_points = {
         'console_scripts' : [
            'guardian_service=pdo.contracts.guardian.scripts.guardianCLI:Main',
+           'guardian_admin=pdo.contracts.guardian.scripts.guardianAdminCLI:Main',
         ]
     }
 )
@@ -0,0 +1,84 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for loading, reloading and the readiness of the capability handlers.
+Run with
+
+    python -m pytest test/test_capability_handlers.py
+"""
+
+import pytest
+
+from pdo.contracts.guardian.common.capability_handlers import CapabilityHandlers, HandlersNotReady
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class EchoHandler(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        self.is_ready = config.get('Echo', {}).get('Ready', True)
+        self.closed = False
+
+    # -----------------------------------------------------------------
+    def __call__(self, params) :
+        return { 'message' : params['message'] }
+
+    # -----------------------------------------------------------------
+    def ready(self) :
+        return self.is_ready
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        self.closed = True
+
+# -----------------------------------------------------------------
+@pytest.fixture
+def handlers(monkeypatch) :
+    monkeypatch.setattr(CapabilityHandlers, 'build_handler_map',
+                        staticmethod(lambda config : { 'echo' : EchoHandler(config) }))
+    return CapabilityHandlers({ 'GuardianService' : { 'Operations' : 'echo_operations', 'HandlerDrainSeconds' : 1 } })
+
+# -----------------------------------------------------------------
+def test_load(handlers) :
+    assert not handlers.ready
+    with pytest.raises(HandlersNotReady) :
+        handlers.get_handler('echo')
+
+    assert handlers.load()
+    assert handlers.ready
+    assert handlers.get_handler('echo')({ 'message' : 'hello' }) == { 'message' : 'hello' }
+
+    with pytest.raises(KeyError) :
+        handlers.get_handler('unknown')
+
+# -----------------------------------------------------------------
+def test_handler_not_ready(handlers) :
+    config = dict(handlers.config, Echo={ 'Ready' : False })
+    assert handlers.reload(config)
+    assert not handlers.ready
+
+# -----------------------------------------------------------------
+def test_reload_closes_old_handlers(handlers) :
+    handlers.load()
+    operation = handlers.get_handler('echo')
+    old_handler = handlers._generation.handler_map['echo']
+
+    assert handlers.reload()
+    assert handlers.generation == 2
+    assert old_handler.closed
+
+    # a callable taken before the reload runs on the new handlers
+    assert operation({ 'message' : 'again' }) == { 'message' : 'again' }
@@ -0,0 +1,145 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the shelve store and the sharded capability keystore. Run with
+
+    python -m pytest test/test_capability_keystore.py
+"""
+
+import os
+
+import pytest
+
+from pdo.contracts.guardian.common.capability_keystore import \
+    CapabilityKeyStore, ShardedCapabilityKeyStore, reshard_capability_keystore, shard_index
+from pdo.contracts.guardian.common.shelve_store import ShelveStore, shelve_files
+
+# serialized keys are opaque to the store, so the tests use strings
+__identities__ = [ 'identity_{0:02d}'.format(i) for i in range(20) ]
+
+# -----------------------------------------------------------------
+def serialized_key(minted_identity) :
+    return ('signing_' + minted_identity, 'decryption_' + minted_identity)
+
+# -----------------------------------------------------------------
+def create_unsharded_keystore(filename) :
+    keystore = CapabilityKeyStore(filename)
+    for minted_identity in __identities__ :
+        keystore.set_serialized_key(minted_identity, serialized_key(minted_identity))
+    service_keys = (keystore.get_serialized_key('management_capability_key'),
+                    keystore.get_serialized_key('service_capability_key'))
+    keystore.close()
+    return service_keys
+
+# -----------------------------------------------------------------
+def test_shelve_store(tmp_path) :
+    filename = str(tmp_path / 'store.db')
+    store = ShelveStore(filename)
+    store._set_entry_('key', ('a', 'b'))
+    store._set_entry_('__metadata', 1)
+
+    assert store._get_entry_('key') == ('a', 'b')
+    assert store.keys() == [ 'key' ]
+    with pytest.raises(KeyError) :
+        store._get_entry_('missing')
+    store.close()
+
+    # reopening the file keeps the entries
+    store = ShelveStore(filename)
+    assert store._get_entry_('key') == ('a', 'b')
+    store.close()
+
+# -----------------------------------------------------------------
+def test_shelve_files(tmp_path) :
+    filename = str(tmp_path / 'store.db')
+    assert shelve_files(filename) == []
+
+    ShelveStore(filename).close()
+    (tmp_path / 'store.db.backup').write_text('unrelated')
+
+    files = shelve_files(filename)
+    assert files
+    assert all(os.path.exists(f) for f in files)
+    assert str(tmp_path / 'store.db.backup') not in files
+
+# -----------------------------------------------------------------
+def test_sharded_keystore(tmp_path) :
+    filename = str(tmp_path / 'keystore.db')
+    keystore = ShardedCapabilityKeyStore(filename, 4)
+    for minted_identity in __identities__ :
+        keystore.set_serialized_key(minted_identity, serialized_key(minted_identity))
+
+    assert sorted(keystore.minted_identities()) == __identities__
+    for minted_identity in __identities__ :
+        shard = keystore._data_shards[shard_index(minted_identity, 4)]
+        assert shard.get_serialized_key(minted_identity) == serialized_key(minted_identity)
+    keystore.close()
+
+    # the shard count cannot change without a reshard
+    with pytest.raises(ValueError) :
+        ShardedCapabilityKeyStore(filename, 2)
+
+# -----------------------------------------------------------------
+def test_sharded_keystore_refuses_unsharded(tmp_path) :
+    filename = str(tmp_path / 'keystore.db')
+    create_unsharded_keystore(filename)
+
+    with pytest.raises(ValueError) :
+        ShardedCapabilityKeyStore(filename, 4)
+
+# -----------------------------------------------------------------
+def test_reshard(tmp_path) :
+    filename = str(tmp_path / 'keystore.db')
+    service_keys = create_unsharded_keystore(filename)
+    unsharded_files = shelve_files(filename)
+
+    # files that only share a prefix with the keystore are not removed
+    unrelated = [ tmp_path / 'keystore.db.backup', tmp_path / 'keystore.db_snapshot.jsonl' ]
+    for path in unrelated :
+        path.write_text('unrelated')
+
+    assert reshard_capability_keystore(filename, 3) == len(__identities__)
+    assert not any(os.path.exists(f) for f in unsharded_files)
+    assert all(path.exists() for path in unrelated)
+
+    old_shard_files = []
+    for index in range(3) :
+        old_shard_files.extend(shelve_files(ShardedCapabilityKeyStore.data_shard_filename(filename, 3, index)))
+
+    assert reshard_capability_keystore(filename, 5) == len(__identities__)
+    assert not any(os.path.exists(f) for f in old_shard_files)
+    assert all(path.exists() for path in unrelated)
+
+    keystore = ShardedCapabilityKeyStore(filename, 5)
+    try :
+        assert sorted(keystore.minted_identities()) == __identities__
+        for minted_identity in __identities__ :
+            assert keystore.get_serialized_key(minted_identity) == serialized_key(minted_identity)
+        assert keystore.get_serialized_key('management_capability_key') == service_keys[0]
+        assert keystore.get_serialized_key('service_capability_key') == service_keys[1]
+    finally :
+        keystore.close()
+
+    # resharding to the current count does nothing
+    assert reshard_capability_keystore(filename, 5) == 0
+
+# -----------------------------------------------------------------
+def test_reshard_keeps_old_shards(tmp_path) :
+    filename = str(tmp_path / 'keystore.db')
+    create_unsharded_keystore(filename)
+    unsharded_files = shelve_files(filename)
+
+    reshard_capability_keystore(filename, 2, remove_old_shards=False)
+    assert all(os.path.exists(f) for f in unsharded_files)
@@ -0,0 +1,69 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the import profiler. Run with
+
+    python -m pytest test/test_imports.py
+"""
+
+import builtins
+import importlib
+import sys
+
+import pytest
+
+from pdo.contracts.guardian.common.imports import ImportProfiler
+
+# -----------------------------------------------------------------
+@pytest.fixture
+def modules(tmp_path, monkeypatch) :
+    # a module that imports another one with the import statement
+    (tmp_path / 'profiled_inner.py').write_text('VALUE = 1\n')
+    (tmp_path / 'profiled_outer.py').write_text('import profiled_inner\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ('profiled_inner', 'profiled_outer') :
+        sys.modules.pop(name, None)
+
+# -----------------------------------------------------------------
+def test_profile_import_module(modules) :
+    original_import = builtins.__import__
+    original_import_module = importlib.import_module
+
+    profiler = ImportProfiler()
+    profiler.install()
+    try :
+        module = importlib.import_module('profiled_outer')
+    finally :
+        profiler.uninstall()
+
+    assert builtins.__import__ is original_import
+    assert importlib.import_module is original_import_module
+    assert module.profiled_inner.VALUE == 1
+
+    # the nested import is counted in the inclusive time of the outer module
+    assert 'profiled_outer' in profiler.timings
+    assert 'profiled_inner' in profiler.timings
+    (inclusive, exclusive) = profiler.timings['profiled_outer']
+    assert inclusive >= profiler.timings['profiled_inner'][0]
+    assert exclusive <= inclusive
+
+    # modules that are already loaded are not profiled again
+    profiler.install()
+    try :
+        importlib.import_module('profiled_outer')
+    finally :
+        profiler.uninstall()
+    assert profiler.timings['profiled_outer'] == (inclusive, exclusive)
@@ -0,0 +1,118 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the asynchronous job queue. Run with
+
+    python -m pytest test/test_job_queue.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from pdo.contracts.guardian.common.capability_handlers import OperationBusy
+from pdo.contracts.guardian.common.job_queue import JobQueue, JobQueueFull
+
+# -----------------------------------------------------------------
+def echo(parameters) :
+    return { 'message' : parameters['message'] }
+
+# -----------------------------------------------------------------
+def test_job_result() :
+    jobs = JobQueue(worker_threads=2, max_wait=5)
+    job_id = jobs.submit('echo', echo, { 'message' : 'hello' })
+
+    result = jobs.get_result(job_id, wait=5)
+    assert result == { 'job_id' : job_id, 'status' : 'complete', 'result' : { 'message' : 'hello' } }
+
+    # completed results can be retrieved again until they expire
+    assert jobs.get_result(job_id)['status'] == 'complete'
+
+    with pytest.raises(KeyError) :
+        jobs.get_result('unknown')
+
+# -----------------------------------------------------------------
+def test_failed_jobs() :
+    def busy(parameters) :
+        raise OperationBusy('model busy', retry_after=3)
+
+    def broken(parameters) :
+        raise RuntimeError('internal details')
+
+    jobs = JobQueue(worker_threads=2, max_wait=5)
+
+    result = jobs.get_result(jobs.submit('none', lambda p : None, {}), wait=5)
+    assert result['status'] == 'failed'
+    assert result['error'] == 'operation failed'
+
+    result = jobs.get_result(jobs.submit('busy', busy, {}), wait=5)
+    assert result['status'] == 'failed'
+    assert result['retry_after'] == 3
+
+    # the text of unexpected exceptions is not returned to the client
+    result = jobs.get_result(jobs.submit('broken', broken, {}), wait=5)
+    assert result['status'] == 'failed'
+    assert 'internal details' not in result['error']
+    assert 'retry_after' not in result
+
+# -----------------------------------------------------------------
+def test_queue_full() :
+    release = threading.Event()
+    def blocked(parameters) :
+        release.wait(5)
+        return {}
+
+    jobs = JobQueue(worker_threads=1, max_jobs=1, max_wait=5)
+    job_id = jobs.submit('blocked', blocked, {})
+    assert jobs.get_result(job_id)['status'] in ('pending', 'running')
+
+    # a running job cannot be evicted
+    with pytest.raises(JobQueueFull) :
+        jobs.submit('echo', echo, { 'message' : 'hello' })
+
+    release.set()
+    assert jobs.get_result(job_id, wait=5)['status'] == 'complete'
+
+    # the oldest completed result makes room for the new job
+    new_job_id = jobs.submit('echo', echo, { 'message' : 'hello' })
+    assert jobs.get_result(new_job_id, wait=5)['status'] == 'complete'
+    with pytest.raises(KeyError) :
+        jobs.get_result(job_id)
+
+# -----------------------------------------------------------------
+def test_result_expires() :
+    jobs = JobQueue(worker_threads=1, result_ttl=0.2, max_wait=5)
+    job_id = jobs.submit('echo', echo, { 'message' : 'hello' })
+    assert jobs.get_result(job_id, wait=5)['status'] == 'complete'
+
+    time.sleep(0.3)
+    with pytest.raises(KeyError) :
+        jobs.get_result(job_id)
+
+# -----------------------------------------------------------------
+def test_waiters_are_bounded() :
+    release = threading.Event()
+    def blocked(parameters) :
+        release.wait(5)
+        return {}
+
+    # without waiters the status is returned immediately and the client polls
+    jobs = JobQueue(worker_threads=1, max_wait=5, max_waiters=0)
+    job_id = jobs.submit('blocked', blocked, {})
+    try :
+        assert jobs.get_result(job_id, wait=5)['status'] in ('pending', 'running')
+    finally :
+        release.set()
@@ -0,0 +1,129 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for copy-on-write snapshots of the guardian stores and for restoring
+them into sharded and unsharded keystores. Run with
+
+    python -m pytest test/test_snapshot.py
+"""
+
+import pytest
+
+from pdo.contracts.guardian.common.capability_keystore import CapabilityKeyStore, ShardedCapabilityKeyStore
+from pdo.contracts.guardian.common.shelve_store import ShelveStore
+from pdo.contracts.guardian.common.snapshot import SnapshotManager, restore_snapshots
+
+# -----------------------------------------------------------------
+def serialized_key(minted_identity, version = 0) :
+    return ('signing_{0}_{1}'.format(minted_identity, version), 'decryption_{0}_{1}'.format(minted_identity, version))
+
+# -----------------------------------------------------------------
+def create_keystore(filename, shards) :
+    if shards > 0 :
+        return ShardedCapabilityKeyStore(filename, shards)
+    return CapabilityKeyStore(filename)
+
+# -----------------------------------------------------------------
+def keystore_contents(keystore) :
+    # a sharded keystore does not list the service keys with the minted identities
+    identities = [ i for i in keystore.minted_identities() if i.startswith('identity_') ]
+    return { i : keystore.get_serialized_key(i) for i in identities }
+
+# -----------------------------------------------------------------
+def test_snapshot_preserves_overwritten_values(tmp_path) :
+    store = ShelveStore(str(tmp_path / 'store.db'))
+    store._set_entry_('a', ('1',))
+    store._set_entry_('b', ('2',))
+
+    assert store.begin_snapshot() is False
+    entries = store.snapshot_entries()
+    assert next(entries) == ('a', ('1',))
+
+    # updates while the snapshot is read do not change its contents
+    store._set_entry_('b', ('3',))
+    store._set_entry_('c', ('4',))
+    assert list(entries) == [ ('b', ('2',)) ]
+    store.end_snapshot()
+
+    assert store._get_entry_('b') == ('3',)
+
+    # the next snapshot holds only the keys changed since the last one
+    assert store.begin_snapshot(incremental=True) is True
+    assert list(store.snapshot_entries()) == [ ('b', ('3',)), ('c', ('4',)) ]
+    store.end_snapshot()
+    store.close()
+
+# -----------------------------------------------------------------
+def test_uncommitted_snapshot_is_repeated(tmp_path) :
+    store = ShelveStore(str(tmp_path / 'store.db'))
+    store._set_entry_('a', ('1',))
+    store.begin_snapshot()
+    store.end_snapshot()
+
+    store._set_entry_('b', ('2',))
+    store.begin_snapshot(incremental=True)
+    store.end_snapshot(False)
+
+    store.begin_snapshot(incremental=True)
+    assert list(store.snapshot_entries()) == [ ('b', ('2',)) ]
+    store.end_snapshot()
+    store.close()
+
+# -----------------------------------------------------------------
+@pytest.mark.parametrize('source_shards,target_shards', [ (0, 0), (4, 4), (0, 3), (4, 0) ])
+def test_snapshot_and_restore(tmp_path, source_shards, target_shards) :
+    (tmp_path / 'source').mkdir()
+    keystore = create_keystore(str(tmp_path / 'source' / 'keystore.db'), source_shards)
+    for i in range(10) :
+        keystore.set_serialized_key('identity_{0}'.format(i), serialized_key(i))
+
+    manager = SnapshotManager(str(tmp_path / 'snapshots'), { 'capability_keys' : keystore })
+    full = manager.snapshot()
+
+    keystore.set_serialized_key('identity_0', serialized_key(0, 1))
+    keystore.set_serialized_key('identity_10', serialized_key(10))
+    incremental = manager.snapshot(incremental=True)
+    assert incremental['incremental'] is True
+    assert incremental['entries'] == 2
+
+    expected = keystore_contents(keystore)
+    keystore.close()
+
+    (tmp_path / 'target').mkdir()
+    target = create_keystore(str(tmp_path / 'target' / 'keystore.db'), target_shards)
+    try :
+        count = restore_snapshots([ full['file'], incremental['file'] ], { 'capability_keys' : target })
+        assert count == full['entries'] + incremental['entries']
+        assert keystore_contents(target) == expected
+    finally :
+        target.close()
+
+# -----------------------------------------------------------------
+def test_restore_requires_the_base_snapshot(tmp_path) :
+    store = ShelveStore(str(tmp_path / 'store.db'))
+    store._set_entry_('a', ('1',))
+
+    manager = SnapshotManager(str(tmp_path / 'snapshots'), { 'store' : store })
+    manager.snapshot()
+    store._set_entry_('a', ('2',))
+    incremental = manager.snapshot(incremental=True)
+
+    target = ShelveStore(str(tmp_path / 'target.db'))
+    try :
+        with pytest.raises(ValueError) :
+            restore_snapshots([ incremental['file'] ], { 'store' : target })
+    finally :
+        target.close()
+        store.close()
@@ -53,14 +53,18 @@ bool ww::inference::token_object::do_inference(
     const std::string encoded_encryption_key(msg.get_string("encryption_key"));
     const std::string encoded_state_hash(msg.get_string("state_hash"));
     const std::string image_key(msg.get_string("image_key"));
+    const char* model_name_value = msg.get_string("model_name");
+    const std::string model_name(model_name_value != NULL ? model_name_value : "");
 
-    ww::value::Structure params(INFERENCE_PARAM_SCHEMA);
+    ww::value::Structure params(INFERENCE_OPERATION_SCHEMA);
     ASSERT_SUCCESS(rsp, params.set_string("encryption_key", encoded_encryption_key.c_str()),
                    "unexpected error: failed to store parameter");
     ASSERT_SUCCESS(rsp, params.set_string("state_hash", encoded_state_hash.c_str()),
                    "unexpected error: failed to store parameter");
     ASSERT_SUCCESS(rsp, params.set_string("image_key", image_key.c_str()),
                    "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("model_name", model_name.c_str()),
+                   "unexpected error: failed to store parameter");
 
     ww::value::Object result;
     ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("do_inference", params, result),
@@ -70,3 +74,94 @@ bool ww::inference::token_object::do_inference(
     // how the nonce is created this may need to change.
     return rsp.value(result, false);
 }
+
+// -----------------------------------------------------------------
+// do_batch_inference
+//
+// This generates a capability that authorizes inference over a list
+// of images stored in the same state
+// -----------------------------------------------------------------
+bool ww::inference::token_object::do_batch_inference(
+    const Message& msg,
+    const Environment& env,
+    Response& rsp)
+{
+    ASSERT_SENDER_IS_OWNER(env, rsp);
+    ASSERT_INITIALIZED(rsp);
+
+    ASSERT_SUCCESS(rsp, msg.validate_schema(BATCH_INFERENCE_PARAM_SCHEMA),
+                   "invalid request, missing required parameters");
+
+    const std::string encoded_encryption_key(msg.get_string("encryption_key"));
+    const std::string encoded_state_hash(msg.get_string("state_hash"));
+    const char* model_name_value = msg.get_string("model_name");
+    const std::string model_name(model_name_value != NULL ? model_name_value : "");
+
+    ww::value::Array image_keys;
+    ASSERT_SUCCESS(rsp, msg.get_value("image_keys", image_keys),
+                   "invalid request, malformed parameter image_keys");
+
+    const size_t count = image_keys.get_count();
+    ASSERT_SUCCESS(rsp, 0 < count && count <= MAX_BATCH_INFERENCE_IMAGES,
+                   "invalid request, wrong number of image keys");
+
+    ww::value::Structure params(BATCH_INFERENCE_OPERATION_SCHEMA);
+    ASSERT_SUCCESS(rsp, params.set_string("encryption_key", encoded_encryption_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("state_hash", encoded_state_hash.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_value("image_keys", image_keys),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("model_name", model_name.c_str()),
+                   "unexpected error: failed to store parameter");
+
+    ww::value::Object result;
+    ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("do_batch_inference", params, result),
+                   "unexpected error: failed to generate capability");
+
+    // this assumes that generating the capability does not change state, depending on
+    // how the nonce is created this may need to change.
+    return rsp.value(result, false);
+}
+
+// -----------------------------------------------------------------
+// do_video_inference
+//
+// This generates a capability that authorizes inference over the
+// frames of a video clip
+// -----------------------------------------------------------------
+bool ww::inference::token_object::do_video_inference(
+    const Message& msg,
+    const Environment& env,
+    Response& rsp)
+{
+    ASSERT_SENDER_IS_OWNER(env, rsp);
+    ASSERT_INITIALIZED(rsp);
+
+    ASSERT_SUCCESS(rsp, msg.validate_schema(VIDEO_INFERENCE_PARAM_SCHEMA),
+                   "invalid request, missing required parameters");
+
+    const std::string encoded_encryption_key(msg.get_string("encryption_key"));
+    const std::string encoded_state_hash(msg.get_string("state_hash"));
+    const std::string video_key(msg.get_string("video_key"));
+    const char* model_name_value = msg.get_string("model_name");
+    const std::string model_name(model_name_value != NULL ? model_name_value : "");
+
+    ww::value::Structure params(VIDEO_INFERENCE_OPERATION_SCHEMA);
+    ASSERT_SUCCESS(rsp, params.set_string("encryption_key", encoded_encryption_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("state_hash", encoded_state_hash.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("video_key", video_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("model_name", model_name.c_str()),
+                   "unexpected error: failed to store parameter");
+
+    ww::value::Object result;
+    ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("do_video_inference", params, result),
+                   "unexpected error: failed to generate capability");
+
+    // this assumes that generating the capability does not change state, depending on
+    // how the nonce is created this may need to change.
+    return rsp.value(result, false);
+}
@@ -24,6 +24,8 @@
         SCHEMA_KW(message,"")                   \
     "}"
 
+// model_name is optional in requests, the guardian uses its default
+// model when the name in the capability is empty
 #define INFERENCE_PARAM_SCHEMA                   \
     "{"                                         \
         SCHEMA_KW(encryption_key, "") ","       \
@@ -31,6 +33,47 @@
         SCHEMA_KW(image_key, "")                \
     "}"
 
+#define INFERENCE_OPERATION_SCHEMA              \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        SCHEMA_KW(image_key, "") ","            \
+        SCHEMA_KW(model_name, "")               \
+    "}"
+
+#define BATCH_INFERENCE_PARAM_SCHEMA            \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        "\"image_keys\": []"                    \
+    "}"
+
+#define BATCH_INFERENCE_OPERATION_SCHEMA        \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        "\"image_keys\": []" ","                \
+        SCHEMA_KW(model_name, "")               \
+    "}"
+
+#define VIDEO_INFERENCE_PARAM_SCHEMA            \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        SCHEMA_KW(video_key, "")                \
+    "}"
+
+#define VIDEO_INFERENCE_OPERATION_SCHEMA        \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        SCHEMA_KW(video_key, "") ","            \
+        SCHEMA_KW(model_name, "")               \
+    "}"
+
+// maximum number of images covered by a batch inference capability
+#define MAX_BATCH_INFERENCE_IMAGES 64
+
 namespace ww
 {
 namespace inference
@@ -39,6 +82,8 @@ namespace token_object
 {
     // methods
     bool do_inference(const Message& msg, const Environment& env, Response& rsp);
+    bool do_batch_inference(const Message& msg, const Environment& env, Response& rsp);
+    bool do_video_inference(const Message& msg, const Environment& env, Response& rsp);
 }; // token_object
 }; // inference
 }; // ww
@@ -13,6 +13,16 @@
 # limitations under the License.
 
 __all__ = [
+    'backend',
+    'batcher',
+    'image_store',
+    'kv_cache',
+    'openvino_backend',
+    'ovms_pool',
     'ovms_predict',
+    'preprocess',
+    'result_cache',
+    'tensor_codec',
+    'timing',
     'utility',
     ]
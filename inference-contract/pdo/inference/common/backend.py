@@ -0,0 +1,85 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the InferenceBackend base class for the components that
+run a model on a preprocessed input tensor. The backend used by the
+inference operation is selected with the Backend setting in the [Model]
+section of the guardian configuration; backends are imported when they
+are selected so their dependencies are only required when used.
+"""
+
+import importlib
+from abc import ABCMeta, abstractmethod
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'InferenceBackend', 'inference_backends_map', 'create_inference_backend' ]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class InferenceBackend(object) :
+
+    __metaclass__ = ABCMeta
+
+    # -----------------------------------------------------------------
+    def __init__(self, config, *args, **kwargs) :
+        pass
+
+    # -----------------------------------------------------------------
+    @abstractmethod
+    def predict_future(self, batch) :
+        """Start inference on a batched input tensor; return a
+        concurrent.futures.Future for the batched output tensor"""
+        raise NotImplementedError("Must override predict_future")
+
+    # -----------------------------------------------------------------
+    def predict(self, batch) :
+        """Run inference on a batched input tensor and return the output tensor"""
+        return self.predict_future(batch).result()
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        """Release the resources held by the backend (channels, compiled
+        models, threads); called when the handlers are reloaded"""
+        pass
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        """Return a dictionary of backend specific counters"""
+        return {}
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+inference_backends_map = {
+    'ovms' : 'pdo.inference.common.ovms_predict.OVMSBackend',
+    'openvino' : 'pdo.inference.common.openvino_backend.OpenVINOBackend',
+}
+
+# -----------------------------------------------------------------
+def create_inference_backend(config) :
+    """Create the backend named by [Model] Backend (default ovms)
+
+    :param config dict: guardian configuration
+    """
+    backend_name = config['Model'].get('Backend', 'ovms')
+    try :
+        (module_name, class_name) = inference_backends_map[backend_name].rsplit('.', 1)
+    except KeyError :
+        raise ValueError('unknown inference backend {}'.format(backend_name))
+
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    logger.info('using %s inference backend', backend_name)
+    return backend_class(config)
@@ -0,0 +1,225 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the MicroBatcher class that combines preprocessed inputs
+from concurrent requests into a single batched predict call. Callers block
+in submit until the batch that contains their input has been processed;
+the output of the batched call is split along the leading (batch) dimension
+and each caller receives the rows that correspond to its own input.
+
+Batches are pipelined: the predict function returns a future, so while
+one batch is in flight the worker collects the next one, up to a bound
+on the number of outstanding predicts.
+"""
+
+import functools
+import queue
+import threading
+import time
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class _PendingInput(object) :
+    def __init__(self, tensor) :
+        self.tensor = tensor
+        self.rows = tensor.shape[0]
+        self.done = threading.Event()
+        self.output = None
+        self.exception = None
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class MicroBatcher(object) :
+    """Collect inputs from concurrent callers into batches
+
+    A batch is sent when it holds max_batch_size rows or when the oldest
+    input in the batch has waited max_batch_delay seconds. The worker
+    thread is started on demand and exits after it has been idle for
+    idle_timeout seconds so a batcher that is no longer used (for example,
+    after the capability handlers are reloaded) does not hold a thread.
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, predict, max_batch_size, max_batch_delay, max_outstanding = 1, idle_timeout = 60.0, split_output = None) :
+        """
+        :param predict callable: function that maps a batched input array to a future for the batched output
+        :param max_batch_size int: maximum number of rows in a batch
+        :param max_batch_delay float: maximum time in seconds to wait for a batch to fill
+        :param max_outstanding int: maximum number of batches in flight at the same time
+        :param idle_timeout float: time in seconds before an idle worker thread exits
+        :param split_output callable: function that maps a batched output and the number of
+            rows of each input to a list of outputs, by default the output is split on axis 0
+        """
+        if max_batch_size < 1 :
+            raise ValueError('max_batch_size must be at least 1')
+
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max(0.0, max_batch_delay)
+        self.idle_timeout = idle_timeout
+        self.split_output = split_output or self.__split_rows__
+
+        self._outstanding = threading.BoundedSemaphore(max(1, max_outstanding))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._carry = None
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __split_rows__(output, rows) :
+        offsets = np.cumsum(rows)[:-1]
+        return np.split(output, offsets, axis=0)
+
+    # -----------------------------------------------------------------
+    def submit(self, tensor) :
+        """Add an input to the next batch and wait for its output
+
+        :param tensor ndarray: input whose leading dimension is the batch dimension
+        :returns ndarray: the rows of the batched output that correspond to the input
+        """
+        return self.submit_all([tensor])[0]
+
+    # -----------------------------------------------------------------
+    def submit_all(self, tensors) :
+        """Queue several inputs at once and wait for all of their outputs,
+        so that the batches holding them are pipelined; inputs should not
+        have more than max_batch_size rows
+
+        :param tensors list: inputs whose leading dimension is the batch dimension
+        :returns list: the output rows for each input
+        """
+        pending_inputs = [ _PendingInput(tensor) for tensor in tensors ]
+        with self._lock :
+            for pending in pending_inputs :
+                self._queue.put(pending)
+            if self._worker is None :
+                self._worker = threading.Thread(target=self._run_, name='inference-batcher', daemon=True)
+                self._worker.start()
+
+        for pending in pending_inputs :
+            pending.done.wait()
+        for pending in pending_inputs :
+            if pending.exception is not None :
+                raise pending.exception
+
+        return [ pending.output for pending in pending_inputs ]
+
+    # -----------------------------------------------------------------
+    def _next_input_(self, timeout) :
+        if self._carry is not None :
+            (pending, self._carry) = (self._carry, None)
+            return pending
+
+        return self._queue.get(timeout=timeout)
+
+    # -----------------------------------------------------------------
+    def _collect_batch_(self) :
+        """Wait for the first input then gather more until the batch is
+        full or the delay expires; returns None if the worker is idle
+        """
+        try :
+            first = self._next_input_(self.idle_timeout)
+        except queue.Empty :
+            return None
+
+        batch = [first]
+        rows = first.rows
+        deadline = time.monotonic() + self.max_batch_delay
+        while rows < self.max_batch_size :
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 :
+                break
+            try :
+                pending = self._next_input_(remaining)
+            except queue.Empty :
+                break
+
+            # an input that would overflow the batch starts the next one
+            if rows + pending.rows > self.max_batch_size :
+                self._carry = pending
+                break
+
+            batch.append(pending)
+            rows += pending.rows
+
+        return batch
+
+    # -----------------------------------------------------------------
+    def _process_batch_(self, batch) :
+        """Start the predict for a batch; blocks while the maximum number
+        of batches are already in flight
+        """
+        self._outstanding.acquire()
+        try :
+            if len(batch) == 1 :
+                future = self.predict(batch[0].tensor)
+            else :
+                future = self.predict(np.concatenate([p.tensor for p in batch], axis=0))
+        except Exception as e :
+            self._outstanding.release()
+            self._complete_batch_(batch, None, e)
+            return
+
+        future.add_done_callback(functools.partial(self._predict_done_, batch))
+
+    # -----------------------------------------------------------------
+    def _predict_done_(self, batch, future) :
+        self._outstanding.release()
+        try :
+            output = future.result()
+        except Exception as e :
+            self._complete_batch_(batch, None, e)
+        else :
+            self._complete_batch_(batch, output, None)
+
+    # -----------------------------------------------------------------
+    def _complete_batch_(self, batch, output, exception) :
+        try :
+            if exception is not None :
+                logger.warning('batched predict of %d inputs failed; %s', len(batch), exception)
+                for pending in batch :
+                    pending.exception = exception
+            elif len(batch) == 1 :
+                batch[0].output = output
+            else :
+                outputs = self.split_output(output, [p.rows for p in batch])
+                for (pending, rows) in zip(batch, outputs) :
+                    pending.output = rows
+        except Exception as e :
+            for pending in batch :
+                pending.exception = e
+        finally :
+            for pending in batch :
+                pending.done.set()
+
+    # -----------------------------------------------------------------
+    def _run_(self) :
+        while True :
+            batch = self._collect_batch_()
+            if batch is None :
+                with self._lock :
+                    if self._queue.empty() :
+                        self._worker = None
+                        return
+                continue
+
+            logger.debug('send batch of %d inputs', len(batch))
+            self._process_batch_(batch)
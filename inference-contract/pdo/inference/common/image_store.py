@@ -0,0 +1,87 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines how inference clients store images (and video clips) in
+a key value store and how the guardian reads them back. Values are passed
+to the store as bytes, so the image is never expanded into a sequence of
+Python integers.
+
+An image no larger than the chunk size is stored as the value of its key.
+A larger image is read from the file and stored one chunk at a time under
+the keys <key>_0 ... <key>_<N-1>, and the value of the image key is a
+marker that holds the number of chunks. Only one chunk of the image is in
+client memory at a time.
+"""
+
+import os
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'read_image', 'store_image_file' ]
+
+# default size of the chunks of large images
+__default_chunk_size__ = 1024 * 1024
+
+# prefix of the value of the image key for an image stored in chunks,
+# followed by the number of chunks; JPEG and PNG images cannot start
+# with it
+__chunk_marker__ = b'__chunked__:'
+
+# -----------------------------------------------------------------
+def __chunk_key__(key, chunk_number) :
+    return '{0}_{1}'.format(key, chunk_number)
+
+# -----------------------------------------------------------------
+def store_image_file(kv, key, image_file, chunk_size = __default_chunk_size__) :
+    """Store the contents of an image file under a key, the store must
+    be open (inside a with block)
+
+    :param kv KeyValueStore: store to write
+    :param key str: key for the image
+    :param image_file str: name of the image file
+    :param chunk_size int: images larger than this are stored in chunks of this size
+    :returns int: the number of chunks, 0 if the image is stored as one value
+    """
+    chunk_size = chunk_size or __default_chunk_size__
+    size = os.path.getsize(image_file)
+
+    with open(image_file, 'rb') as fp :
+        if size <= chunk_size :
+            _ = kv.set(key, fp.read(), input_encoding='str', output_encoding='raw')
+            return 0
+
+        chunks = (size + chunk_size - 1) // chunk_size
+        for chunk_number in range(chunks) :
+            chunk = fp.read(chunk_size)
+            _ = kv.set(__chunk_key__(key, chunk_number), chunk, input_encoding='str', output_encoding='raw')
+
+    _ = kv.set(key, __chunk_marker__ + str(chunks).encode('ascii'), input_encoding='str', output_encoding='raw')
+    return chunks
+
+# -----------------------------------------------------------------
+def read_image(get_value, key) :
+    """Read an image written by store_image_file
+
+    :param get_value function: returns the raw value of a key in the store
+    :param key str: key for the image
+    :returns bytes: the encoded image
+    """
+    value = bytes(get_value(key))
+    if not value.startswith(__chunk_marker__) :
+        return value
+
+    chunks = int(value[len(__chunk_marker__):])
+    return b''.join(bytes(get_value(__chunk_key__(key, chunk_number))) for chunk_number in range(chunks))
@@ -0,0 +1,181 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the KeyValueHandleCache class, a bounded LRU cache of
+opened key value stores used to read the inputs of inference requests.
+Requests that refer to the same uploaded state (several images in one
+store, or the same image submitted again) reuse the opened store rather
+than opening it for every read.
+
+Handles are keyed by the state hash together with a hash of the
+encryption key, so the key itself is not kept in the cache index and a
+request can only reach a handle if it holds the same key. The stores are
+only read, so the state hash of a cached handle does not change. Reads
+from a handle are serialized by a per-handle lock; a handle is closed
+when it is evicted, once any read in progress has finished.
+"""
+
+from collections import OrderedDict
+import hashlib
+import threading
+
+from pdo.common.key_value import KeyValueStore
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'KeyValueHandleCache' ]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class _KeyValueHandle(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, encryption_key, state_hash) :
+        self.kv = KeyValueStore(encryption_key, state_hash)
+        self.lock = threading.Lock()
+        self.closed = False
+
+    # -----------------------------------------------------------------
+    def open(self) :
+        self.kv.__enter__()
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        with self.lock :
+            if self.closed :
+                return
+            self.closed = True
+            try :
+                self.kv.__exit__(None, None, None)
+            except Exception as e :
+                logger.warning('failed to close key value store; %s', e)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class KeyValueHandleCache(object) :
+
+    __shared_cache__ = None
+    __shared_lock__ = threading.Lock()
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def shared_cache(cls, config) :
+        """Return the cache shared by the inference operations of the
+        service, or None if handles are not cached; the cache is created
+        on first use and kept across handler reloads
+
+        :param config dict: service configuration, the [KeyValueCache] section is used
+        """
+        max_handles = config.get('KeyValueCache', {}).get('MaxHandles', 16)
+        if max_handles <= 0 :
+            return None
+
+        with cls.__shared_lock__ :
+            if cls.__shared_cache__ is None :
+                cls.__shared_cache__ = cls(max_handles)
+            return cls.__shared_cache__
+
+    # -----------------------------------------------------------------
+    def __init__(self, max_handles = 16) :
+        """
+        :param max_handles int: number of opened stores to keep
+        """
+        self.max_handles = max_handles
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __cache_key__(encryption_key, state_hash) :
+        return (state_hash, hashlib.sha256(encryption_key.encode('utf8')).digest())
+
+    # -----------------------------------------------------------------
+    def __acquire_handle__(self, encryption_key, state_hash) :
+        cache_key = self.__cache_key__(encryption_key, state_hash)
+        evicted = []
+
+        with self._lock :
+            handle = self._handles.get(cache_key)
+            if handle is not None :
+                self._handles.move_to_end(cache_key)
+                self.hits += 1
+                return handle
+
+            # the handle is locked until it is open so that concurrent
+            # requests for the same state wait for it rather than open
+            # the store again
+            self.misses += 1
+            handle = _KeyValueHandle(encryption_key, state_hash)
+            handle.lock.acquire()
+            self._handles[cache_key] = handle
+            while len(self._handles) > self.max_handles :
+                (_, old_handle) = self._handles.popitem(last=False)
+                evicted.append(old_handle)
+                self.evictions += 1
+
+        try :
+            handle.open()
+        except Exception :
+            handle.closed = True
+            with self._lock :
+                if self._handles.get(cache_key) is handle :
+                    del self._handles[cache_key]
+            raise
+        finally :
+            handle.lock.release()
+
+        for old_handle in evicted :
+            old_handle.close()
+
+        return handle
+
+    # -----------------------------------------------------------------
+    def get(self, encryption_key, state_hash, key, **kwargs) :
+        """Read a key from the store with the given state, keyword
+        arguments are passed to KeyValueStore.get
+        """
+        while True :
+            handle = self.__acquire_handle__(encryption_key, state_hash)
+            with handle.lock :
+                # the handle was evicted or failed to open after it was
+                # found, try again with a new handle
+                if handle.closed :
+                    continue
+                return handle.kv.get(key, **kwargs)
+
+    # -----------------------------------------------------------------
+    def clear(self) :
+        """Close every cached handle"""
+        with self._lock :
+            handles = list(self._handles.values())
+            self._handles.clear()
+
+        for handle in handles :
+            handle.close()
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        with self._lock :
+            return {
+                'handles' : len(self._handles),
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'evictions' : self.evictions,
+            }
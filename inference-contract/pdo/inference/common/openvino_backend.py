@@ -0,0 +1,192 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the OpenVINOBackend class that runs the model inside the
+guardian process with the OpenVINO runtime, avoiding the grpc hop and
+protobuf serialization of the OVMS backend. The model (OpenVINO IR or
+ONNX) is compiled for the configured device with a number of inference
+streams; requests are run on an AsyncInferQueue sized to the optimal
+number of infer requests for the compiled model. Input arrays are wrapped
+in OpenVINO tensors that share their memory, so inputs are not copied.
+
+When InputPrecision or InputLayout select uint8 or NHWC inputs for a model
+that takes float32 NCHW, the conversion is added to the compiled model
+with a PrePostProcessor and runs inside the inference request.
+"""
+
+import concurrent.futures
+import threading
+
+import numpy as np
+
+from pdo.inference.common.backend import InferenceBackend
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def __import_openvino__() :
+    import openvino
+    if hasattr(openvino, 'Core') :
+        return openvino
+
+    # releases before 2023.1 only export the api from openvino.runtime
+    import openvino.runtime
+    return openvino.runtime
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OpenVINOBackend(InferenceBackend) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        """
+        Reads ModelPath, Device (default CPU), NumStreams (default AUTO),
+        InferenceThreads (default 0, meaning the runtime decides),
+        MaxBatchSize, InputPrecision and InputLayout from the [Model]
+        section of the configuration
+        """
+        ov = __import_openvino__()
+        self.ov = ov
+
+        model_path = config['Model']['ModelPath']
+        device = config['Model'].get('Device', 'CPU')
+        num_streams = config['Model'].get('NumStreams', 'AUTO')
+        inference_threads = config['Model'].get('InferenceThreads', 0)
+        max_batch_size = config['Model'].get('MaxBatchSize', 1)
+
+        core = ov.Core()
+        model = core.read_model(model_path)
+
+        # batched requests need a model that accepts any batch size
+        if max_batch_size > 1 :
+            shape = model.input(0).get_partial_shape()
+            if shape.rank.is_static and shape[0].is_static :
+                shape[0] = ov.Dimension()
+                model.reshape({ model.input(0).get_any_name() : shape })
+
+        input_name = config['Model'].get('InputTensorName')
+        output_name = config['Model'].get('OutputTensorName')
+
+        # convert uint8 and NHWC input tensors in the model, which is
+        # expected to take float32 NCHW inputs
+        input_precision = config['Model'].get('InputPrecision', 'fp32')
+        input_layout = config['Model'].get('InputLayout', 'NCHW')
+        if input_precision != 'fp32' or input_layout != 'NCHW' :
+            from openvino.preprocess import PrePostProcessor
+
+            element_type = ov.Type.u8 if input_precision == 'u8' else ov.Type.f32
+            port = self.__find_port__(model.inputs, input_name)
+
+            ppp = PrePostProcessor(model)
+            ppp.input(port.get_any_name()).tensor().set_element_type(element_type).set_layout(ov.Layout(input_layout))
+            ppp.input(port.get_any_name()).model().set_layout(ov.Layout('NCHW'))
+            model = ppp.build()
+
+        properties = { 'NUM_STREAMS' : str(num_streams) }
+        if inference_threads :
+            properties['INFERENCE_NUM_THREADS'] = str(inference_threads)
+
+        self.compiled_model = core.compile_model(model, device, properties)
+
+        self.input_port = self.__find_port__(self.compiled_model.inputs, input_name)
+        self.output_port = self.__find_port__(self.compiled_model.outputs, output_name)
+
+        # kept for the statistics, which are also read after close
+        self.device = ', '.join(map(str, self.compiled_model.get_property('EXECUTION_DEVICES')))
+        self.streams = str(self.compiled_model.get_property('NUM_STREAMS'))
+
+        jobs = self.compiled_model.get_property('OPTIMAL_NUMBER_OF_INFER_REQUESTS')
+        self.infer_queue = ov.AsyncInferQueue(self.compiled_model, jobs)
+        self.infer_queue.set_callback(self.__complete__)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+        logger.info('compiled %s for %s with %s streams and %d infer requests',
+                    model_path, device, self.streams, jobs)
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __find_port__(ports, name) :
+        """Find a model input or output by tensor name, the first port is
+        used if the name is not set or the model does not have it
+        """
+        if name :
+            for port in ports :
+                if name in port.get_names() :
+                    return port
+            logger.warning('model has no tensor named %s, using the first one', name)
+        return ports[0]
+
+    # -----------------------------------------------------------------
+    def __complete__(self, request, userdata) :
+        (future, batch) = userdata
+        try :
+            # the output buffer belongs to the infer request and is reused
+            output = np.copy(request.get_tensor(self.output_port).data)
+        except Exception as e :
+            with self._lock :
+                self.errors += 1
+            future.set_exception(e)
+            return
+
+        future.set_result(output)
+
+    # -----------------------------------------------------------------
+    def predict_future(self, batch) :
+        """Start inference on the batch; blocks while every infer request
+        in the queue is busy
+
+        :raises RuntimeError: if the backend has been closed
+        """
+        with self._lock :
+            infer_queue = self.infer_queue
+            if infer_queue is None :
+                raise RuntimeError('openvino backend is closed')
+            self.requests += 1
+
+        batch = np.ascontiguousarray(batch, dtype=self.input_port.get_element_type().to_dtype())
+        future = concurrent.futures.Future()
+        tensor = self.ov.Tensor(batch, shared_memory=True)
+
+        # the batch is kept with the future so the shared buffer stays
+        # alive until the request completes
+        infer_queue.start_async({ self.input_port : tensor }, (future, batch))
+        return future
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        """Wait for the outstanding infer requests and release the
+        compiled model"""
+        with self._lock :
+            (infer_queue, self.infer_queue) = (self.infer_queue, None)
+            self.compiled_model = None
+
+        if infer_queue is not None :
+            infer_queue.wait_all()
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        with self._lock :
+            return {
+                'device' : self.device,
+                'streams' : self.streams,
+                'requests' : self.requests,
+                'errors' : self.errors,
+                'closed' : self.infer_queue is None,
+            }
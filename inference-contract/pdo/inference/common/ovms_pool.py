@@ -0,0 +1,223 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the OVMSChannelPool class that spreads predict requests
+across several OVMS replicas. Each endpoint has a fixed number of channels;
+a request is sent on the least loaded channel of the endpoint with the
+fewest outstanding requests. Endpoints that fail repeatedly are ejected
+for a while (passive health checking) and latency is tracked for each
+endpoint.
+"""
+
+import threading
+import time
+
+import grpc
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'OVMSChannelPool', 'OVMSEndpoint', 'OVMSChannel' ]
+
+# status codes that indicate a problem with the endpoint rather than the request
+__endpoint_failure_codes__ = frozenset([
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.UNKNOWN,
+])
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def is_endpoint_failure(exception) :
+    """Return True if the exception raised by a predict should count
+    against the health of the endpoint
+    """
+    if isinstance(exception, grpc.RpcError) and hasattr(exception, 'code') :
+        return exception.code() in __endpoint_failure_codes__
+    return False
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OVMSChannel(object) :
+    def __init__(self, endpoint, channel, stub) :
+        self.endpoint = endpoint
+        self.channel = channel
+        self.stub = stub
+        self.outstanding = 0
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OVMSEndpoint(object) :
+
+    # weight of the most recent sample in the moving average latency
+    __latency_alpha__ = 0.2
+
+    # -----------------------------------------------------------------
+    def __init__(self, address) :
+        self.address = address
+        self.channels = []
+        self.outstanding = 0
+
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+        self.requests = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_average = None
+        self.latency_max = 0.0
+
+    # -----------------------------------------------------------------
+    def available(self, now) :
+        return self.ejected_until <= now
+
+    # -----------------------------------------------------------------
+    def record(self, latency, failed) :
+        self.requests += 1
+        if failed :
+            self.errors += 1
+            return
+
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        if self.latency_average is None :
+            self.latency_average = latency
+        else :
+            alpha = self.__latency_alpha__
+            self.latency_average = alpha * latency + (1.0 - alpha) * self.latency_average
+
+    # -----------------------------------------------------------------
+    def statistics(self, now) :
+        successes = self.requests - self.errors
+        return {
+            'outstanding' : self.outstanding,
+            'requests' : self.requests,
+            'errors' : self.errors,
+            'ejected' : not self.available(now),
+            'ejections' : self.ejections,
+            'latency_mean_ms' : (self.latency_total / successes * 1000.0) if successes else None,
+            'latency_recent_ms' : (self.latency_average * 1000.0) if self.latency_average is not None else None,
+            'latency_max_ms' : self.latency_max * 1000.0,
+        }
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OVMSChannelPool(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, addresses, create_channel, create_stub,
+                 channels_per_endpoint = 1, eject_after_failures = 3, eject_seconds = 30.0) :
+        """
+        :param addresses list: host:port strings for the OVMS grpc endpoints
+        :param create_channel callable: function that opens a channel to an address
+        :param create_stub callable: function that creates a prediction service stub for a channel
+        :param channels_per_endpoint int: number of channels opened to each endpoint
+        :param eject_after_failures int: consecutive failures before an endpoint is ejected
+        :param eject_seconds float: time an ejected endpoint is excluded from balancing
+        """
+        if not addresses :
+            raise ValueError('no OVMS endpoints configured')
+
+        self.eject_after_failures = max(1, eject_after_failures)
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+        self._rotation = 0
+
+        self.endpoints = []
+        for address in addresses :
+            endpoint = OVMSEndpoint(address)
+            for i in range(max(1, channels_per_endpoint)) :
+                channel = create_channel(address)
+                endpoint.channels.append(OVMSChannel(endpoint, channel, create_stub(channel)))
+            self.endpoints.append(endpoint)
+
+    # -----------------------------------------------------------------
+    def channels(self) :
+        """Return the grpc channels of every endpoint"""
+        return [ c.channel for endpoint in self.endpoints for c in endpoint.channels ]
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        """Close the channels of the pool; grpc.aio channels must instead
+        be closed on their event loop, see OVMSPredict.close
+        """
+        for channel in self.channels() :
+            channel.close()
+
+    # -----------------------------------------------------------------
+    def _rotate_(self, items) :
+        start = self._rotation % len(items)
+        return items[start:] + items[:start]
+
+    # -----------------------------------------------------------------
+    def acquire(self) :
+        """Select the channel for the next request; the channel must be
+        returned with release when the request completes
+
+        An ejected endpoint is only used if every endpoint is ejected, in
+        which case the one whose ejection expires first is tried.
+        """
+        now = time.monotonic()
+        with self._lock :
+            # rotate the starting point so that ties (e.g. an idle pool)
+            # are spread across endpoints and channels
+            self._rotation += 1
+            endpoints = self._rotate_(self.endpoints)
+
+            candidates = [e for e in endpoints if e.available(now)]
+            if candidates :
+                endpoint = min(candidates, key=lambda e : e.outstanding)
+            else :
+                endpoint = min(endpoints, key=lambda e : e.ejected_until)
+
+            channel = min(self._rotate_(endpoint.channels), key=lambda c : c.outstanding)
+            channel.outstanding += 1
+            endpoint.outstanding += 1
+
+        return channel
+
+    # -----------------------------------------------------------------
+    def release(self, channel, latency, exception = None) :
+        """Record the outcome of a request sent on a channel
+
+        :param channel OVMSChannel: channel returned by acquire
+        :param latency float: time in seconds the request took
+        :param exception Exception: the error raised by the request, if any
+        """
+        failed = exception is not None and is_endpoint_failure(exception)
+        endpoint = channel.endpoint
+        with self._lock :
+            channel.outstanding -= 1
+            endpoint.outstanding -= 1
+            endpoint.record(latency, failed)
+
+            if not failed :
+                endpoint.consecutive_failures = 0
+                return
+
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.eject_after_failures :
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                endpoint.ejections += 1
+                logger.warning('eject OVMS endpoint %s for %s seconds; %s', endpoint.address, self.eject_seconds, exception.code())
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        now = time.monotonic()
+        with self._lock :
+            return { e.address : e.statistics(now) for e in self.endpoints }
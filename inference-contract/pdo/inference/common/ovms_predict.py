@@ -22,14 +22,16 @@ implements custom model/use-case specific operations for input pre-processing, i
 output postprocessing, result packaging etc.
 """
 
-import grpc
-from tensorflow import make_tensor_proto, make_ndarray
-from tensorflow_serving.apis import predict_pb2
-from tensorflow_serving.apis import prediction_service_pb2_grpc
+import asyncio
+import concurrent.futures
+import threading
+import time
 
-import logging
-logger = logging.getLogger(__name__)
+import grpc
 
+from pdo.inference.common.backend import InferenceBackend
+from pdo.inference.common.ovms_pool import OVMSChannelPool
+from pdo.inference.common.tensor_codec import tensor_codec_map
 
 import logging
 logger = logging.getLogger(__name__)
@@ -38,16 +40,63 @@ logger = logging.getLogger(__name__)
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 class OVMSPredict(object) :
 
+    # -----------------------------------------------------------------
+    tensor_codec = None
+
+    # deadline in seconds for a single predict call
+    predict_timeout = 10.0
+
     # -----------------------------------------------------------------
     def __init__(self) :
 
         self.stub = None
+        self.channel_pool = None
+        self.aio_loop = None
+        self.aio_thread = None
+
+    def set_tensor_codec(self, codec_name = 'numpy') :
+        """
+            codec_name: 'numpy' to build tensors without tensorflow, 'tensorflow' for make_tensor_proto
+        """
+        self.tensor_codec = tensor_codec_map[codec_name]()
+        (self.predict_pb2, self.prediction_service_pb2_grpc) = self.tensor_codec.serving_apis()
+
+    def create_channel_to_ovms(self, grpc_address, grpc_port, use_aio = False) :
+        """
+            grpc_address, grpc_port: address of the OVMS grpc endpoint
+            use_aio: issue predicts on a grpc.aio channel driven by a private event loop thread
+        """
+
+        self.create_channel_pool(["{}:{}".format(grpc_address, grpc_port)], use_aio=use_aio)
 
-    def create_channel_to_ovms(self, grpc_address, grpc_port) :
+    def create_channel_pool(self, endpoints, channels_per_endpoint = 1, use_aio = False, **pool_params) :
+        """
+            endpoints: list of host:port addresses of OVMS replicas serving the same model
+            channels_per_endpoint: number of channels opened to each replica
+            use_aio: issue predicts on grpc.aio channels driven by a private event loop thread
+            pool_params: health check parameters passed to OVMSChannelPool
+        """
 
-        address = "{}:{}".format(grpc_address, grpc_port)
-        self.inferenceservice_channel = grpc.insecure_channel(address)
-        self.stub = prediction_service_pb2_grpc.PredictionServiceStub(self.inferenceservice_channel)
+        if self.tensor_codec is None :
+            self.set_tensor_codec()
+
+        create_stub = self.prediction_service_pb2_grpc.PredictionServiceStub
+
+        self.aio_loop = None
+        if use_aio :
+            self.aio_loop = asyncio.new_event_loop()
+            self.aio_thread = threading.Thread(target=self.aio_loop.run_forever, name='ovms-aio', daemon=True)
+            self.aio_thread.start()
+
+            # aio channels must be created on the loop that will use them
+            async def create_aio_pool() :
+                return OVMSChannelPool(endpoints, grpc.aio.insecure_channel, create_stub, channels_per_endpoint, **pool_params)
+
+            self.channel_pool = asyncio.run_coroutine_threadsafe(create_aio_pool(), self.aio_loop).result()
+        else :
+            self.channel_pool = OVMSChannelPool(endpoints, grpc.insecure_channel, create_stub, channels_per_endpoint, **pool_params)
+
+        self.stub = self.channel_pool.endpoints[0].channels[0].stub
 
     def create_request_package_for_image_input(self, model_name, input_name, img):
         """
@@ -56,9 +105,9 @@ class OVMSPredict(object) :
             img: opencv image in Mat format
         """
 
-        request = predict_pb2.PredictRequest()
+        request = self.predict_pb2.PredictRequest()
         request.model_spec.name = model_name
-        request.inputs[input_name].CopyFrom(make_tensor_proto(img, shape=(img.shape)))
+        self.tensor_codec.encode(img, request.inputs[input_name])
 
         return request
 
@@ -68,8 +117,145 @@ class OVMSPredict(object) :
             output_name : output tensor name
         """
 
-        result = self.stub.Predict(request, 10.0) #what is this 10?? cannot find any reference.
-                                                      #same value of 10 is used by multiple examples
-        output = make_ndarray(result.outputs[output_name])
+        if self.aio_loop :
+            return self.invoke_predict_future(request, output_name).result()
+
+        channel = self.channel_pool.acquire()
+        start = time.monotonic()
+        try :
+            result = channel.stub.Predict(request, self.predict_timeout)
+        except Exception as e :
+            self.channel_pool.release(channel, time.monotonic() - start, e)
+            raise
+        self.channel_pool.release(channel, time.monotonic() - start)
+
+        output = self.tensor_codec.decode(result.outputs[output_name])
 
         return output
+
+    def invoke_predict_future(self, request, output_name):
+        """
+            Start a predict without blocking the caller; returns a concurrent.futures.Future
+            whose result is the decoded output tensor. Many predicts may be outstanding on
+            the channel at the same time.
+        """
+
+        if self.aio_loop :
+            return asyncio.run_coroutine_threadsafe(self.invoke_predict_async(request, output_name), self.aio_loop)
+
+        future = concurrent.futures.Future()
+        channel = self.channel_pool.acquire()
+        start = time.monotonic()
+
+        def complete(call) :
+            try :
+                result = call.result()
+            except Exception as e :
+                self.channel_pool.release(channel, time.monotonic() - start, e)
+                future.set_exception(e)
+                return
+
+            self.channel_pool.release(channel, time.monotonic() - start)
+            try :
+                future.set_result(self.tensor_codec.decode(result.outputs[output_name]))
+            except Exception as e :
+                future.set_exception(e)
+
+        try :
+            call = channel.stub.Predict.future(request, self.predict_timeout)
+        except Exception as e :
+            self.channel_pool.release(channel, time.monotonic() - start, e)
+            raise
+
+        call.add_done_callback(complete)
+        return future
+
+    async def invoke_predict_async(self, request, output_name):
+        """
+            Coroutine variant for callers running on the aio event loop, requires a
+            channel created with use_aio
+        """
+
+        channel = self.channel_pool.acquire()
+        start = time.monotonic()
+        try :
+            result = await channel.stub.Predict(request, timeout=self.predict_timeout)
+        except Exception as e :
+            self.channel_pool.release(channel, time.monotonic() - start, e)
+            raise
+        self.channel_pool.release(channel, time.monotonic() - start)
+
+        return self.tensor_codec.decode(result.outputs[output_name])
+
+    def close(self):
+        """
+            Close the grpc channels and stop the aio event loop thread, predicts that
+            are still outstanding fail
+        """
+
+        if self.aio_loop :
+            async def close_aio_channels() :
+                await asyncio.gather(*[ channel.close() for channel in self.channel_pool.channels() ], return_exceptions=True)
+
+            try :
+                asyncio.run_coroutine_threadsafe(close_aio_channels(), self.aio_loop).result(timeout=10.0)
+            except Exception as e :
+                logger.warning('failed to close OVMS channels; %s', e)
+
+            self.aio_loop.call_soon_threadsafe(self.aio_loop.stop)
+            self.aio_thread.join(timeout=10.0)
+            if not self.aio_loop.is_running() :
+                self.aio_loop.close()
+            self.aio_loop = None
+            self.aio_thread = None
+        elif self.channel_pool :
+            self.channel_pool.close()
+
+        self.channel_pool = None
+        self.stub = None
+
+    def statistics(self):
+        """
+            Request and latency counters for each OVMS endpoint
+        """
+
+        return { 'endpoints' : self.channel_pool.statistics() }
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OVMSBackend(OVMSPredict, InferenceBackend) :
+    """Inference backend that sends predict requests to OVMS"""
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        super().__init__()
+
+        self.model_name = config['Model']['Name']
+        self.input_tensor_name = config['Model']['InputTensorName']
+        self.output_tensor_name = config['Model']['OutputTensorName']
+
+        self.set_tensor_codec(config['Model'].get('TensorCodec', 'numpy'))
+        self.predict_timeout = config['Model'].get('PredictTimeout', 10.0)
+
+        endpoints = config['Model'].get('OpenVINOModelServerEndpoints')
+        if not endpoints :
+            grpc_address = config['Model']['OpenVINOModelServerAddress']
+            grpc_port = config['Model']['OpenVINOModelServerPort']
+            endpoints = ["{}:{}".format(grpc_address, grpc_port)]
+
+        self.create_channel_pool(
+            endpoints,
+            channels_per_endpoint = config['Model'].get('ChannelsPerEndpoint', 1),
+            use_aio = config['Model'].get('UseAsyncClient', False),
+            eject_after_failures = config['Model'].get('EjectAfterFailures', 3),
+            eject_seconds = config['Model'].get('EjectSeconds', 30.0))
+
+    # -----------------------------------------------------------------
+    def predict(self, batch) :
+        request = self.create_request_package_for_image_input(self.model_name, self.input_tensor_name, batch)
+        return self.invoke_predict(request, self.output_tensor_name)
+
+    # -----------------------------------------------------------------
+    def predict_future(self, batch) :
+        request = self.create_request_package_for_image_input(self.model_name, self.input_tensor_name, batch)
+        return self.invoke_predict_future(request, self.output_tensor_name)
@@ -0,0 +1,331 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the PreprocessEngine class that converts an encoded
+image into the input tensor expected by image models (float32 NCHW by
+default, or uint8 and/or NHWC for models that accept them) with as few
+intermediate arrays as possible:
+
+  * the center crop is taken as a view of the decoded image before any
+    resizing, so at most one resize is done and only on the cropped region
+  * colour order, HWC to CHW and the float32 conversion are combined by
+    copying each source channel directly into its plane of the output;
+    for NHWC output the image is copied as is, with no transpose, and a
+    uint8 tensor is a quarter of the size of a float32 one
+  * output tensors come from a per-thread BufferPool and are returned to
+    it with release once inference on them has completed
+
+The JPEG and PNG headers are read before decoding so that images over the
+configured byte or pixel limits are rejected without decoding them (other
+formats are rejected when there is a pixel limit), and,
+when reduced decoding is enabled, large JPEG images are decoded at 1/2,
+1/4 or 1/8 scale (scaling in the DCT domain) as long as the reduced image
+still covers the crop size.
+"""
+
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'BufferPool', 'ImageRejected', 'PreprocessEngine', 'image_dimensions', 'input_precisions' ]
+
+# names accepted for the InputPrecision setting
+input_precisions = {
+    'fp32' : np.float32,
+    'u8' : np.uint8,
+}
+
+# -----------------------------------------------------------------
+class ImageRejected(ValueError) :
+    pass
+
+# JPEG start of frame markers, these carry the image dimensions
+__jpeg_sof_markers__ = frozenset([
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+])
+
+# JPEG markers that are not followed by a segment length
+__jpeg_standalone_markers__ = frozenset([ 0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8 ])
+
+__png_signature__ = b'\x89PNG\r\n\x1a\n'
+
+# reduced decode flags, largest reduction first
+__reduced_decode_flags__ = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def __jpeg_dimensions__(data) :
+    offset = 2
+    length = len(data)
+    while offset + 1 < length :
+        if data[offset] != 0xFF :
+            return None
+
+        # skip fill bytes
+        while offset + 1 < length and data[offset + 1] == 0xFF :
+            offset += 1
+        if offset + 1 >= length :
+            return None
+
+        marker = data[offset + 1]
+        offset += 2
+        if marker in __jpeg_standalone_markers__ :
+            continue
+
+        # the image data starts without a frame header
+        if marker in (0xD9, 0xDA) or offset + 2 > length :
+            return None
+
+        (segment_length,) = struct.unpack_from('>H', data, offset)
+        if marker in __jpeg_sof_markers__ :
+            if offset + 7 > length :
+                return None
+            (height, width) = struct.unpack_from('>HH', data, offset + 3)
+            return (width, height)
+
+        offset += segment_length
+
+    return None
+
+# -----------------------------------------------------------------
+def image_dimensions(image_bytes) :
+    """Read the format and dimensions from a JPEG or PNG header without
+    decoding the image
+
+    :returns tuple: (format, width, height) or None if the header is not recognized
+    """
+    data = memoryview(image_bytes).cast('B')
+    if data[:2] == b'\xff\xd8' :
+        dimensions = __jpeg_dimensions__(data)
+        if dimensions :
+            return ('jpeg',) + dimensions
+    elif len(data) >= 24 and data[:8] == __png_signature__ and data[12:16] == b'IHDR' :
+        (width, height) = struct.unpack_from('>II', data, 16)
+        return ('png', width, height)
+
+    return None
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class BufferPool(object) :
+    """Per-thread free lists of numpy arrays keyed by shape and dtype
+
+    Buffers are returned to the free list of the thread that releases
+    them; each free list keeps at most max_free buffers so a thread that
+    releases more than it acquires does not grow without bound.
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, max_free = 4) :
+        self.max_free = max_free
+        self._local = threading.local()
+
+    # -----------------------------------------------------------------
+    def __free_lists__(self) :
+        try :
+            return self._local.free
+        except AttributeError :
+            self._local.free = dict()
+            return self._local.free
+
+    # -----------------------------------------------------------------
+    def acquire(self, shape, dtype = np.float32) :
+        key = (tuple(shape), np.dtype(dtype))
+        free = self.__free_lists__().get(key)
+        if free :
+            return free.pop()
+        return np.empty(key[0], dtype=key[1])
+
+    # -----------------------------------------------------------------
+    def release(self, buffer) :
+        key = (buffer.shape, buffer.dtype)
+        free = self.__free_lists__().setdefault(key, [])
+        if len(free) < self.max_free :
+            free.append(buffer)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class PreprocessEngine(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, size, rgb_image = False, buffer_pool = None,
+                 reduced_decode = False, max_image_pixels = 0, max_image_bytes = 0,
+                 precision = 'fp32', layout = 'NCHW') :
+        """
+        :param size int: width and height of the model input
+        :param rgb_image bool: the model expects RGB rather than BGR channel order
+        :param buffer_pool BufferPool: pool for the output tensors, a private pool if None
+        :param reduced_decode bool: decode large JPEG images at a reduced scale
+        :param max_image_pixels int: reject images with more pixels, 0 for no limit
+        :param max_image_bytes int: reject encoded images larger than this, 0 for no limit
+        :param precision str: element type of the tensor, fp32 or u8
+        :param layout str: NCHW or NHWC
+        """
+        if precision not in input_precisions :
+            raise ValueError('unsupported input precision {}'.format(precision))
+        if layout not in ('NCHW', 'NHWC') :
+            raise ValueError('unsupported input layout {}'.format(layout))
+
+        self.size = size
+        self.rgb_image = bool(rgb_image)
+        self.buffer_pool = buffer_pool or BufferPool()
+        self.reduced_decode = bool(reduced_decode)
+        self.max_image_pixels = max_image_pixels
+        self.max_image_bytes = max_image_bytes
+
+        self.dtype = np.dtype(input_precisions[precision])
+        self.layout = layout
+
+        # shape of one image in the output tensor
+        if self.layout == 'NHWC' :
+            self.image_shape = (size, size, 3)
+        else :
+            self.image_shape = (3, size, size)
+
+        # source channel (of the BGR decoded image) for each output plane
+        self.channel_order = (2, 1, 0) if self.rgb_image else (0, 1, 2)
+
+    # -----------------------------------------------------------------
+    def decode_flags(self, image_bytes) :
+        """Check the image against the limits and choose the imdecode flags
+
+        :raises ImageRejected: if the image is over the byte or pixel limit
+        """
+        if self.max_image_bytes and len(image_bytes) > self.max_image_bytes :
+            raise ImageRejected('image size {} exceeds the limit of {} bytes'.format(len(image_bytes), self.max_image_bytes))
+
+        # the pixel limit cannot be checked before decoding formats whose
+        # header is not parsed (BMP, TIFF, WebP, ...) so they are rejected
+        header = image_dimensions(image_bytes)
+        if header is None :
+            if self.max_image_pixels :
+                raise ImageRejected('image format is not accepted with a pixel limit')
+            return cv2.IMREAD_COLOR
+
+        (image_format, width, height) = header
+        if self.max_image_pixels and width * height > self.max_image_pixels :
+            raise ImageRejected('image of {}x{} exceeds the limit of {} pixels'.format(width, height, self.max_image_pixels))
+
+        # libjpeg scales to ceil(dimension / scale)
+        if self.reduced_decode and image_format == 'jpeg' :
+            for (scale, flags) in __reduced_decode_flags__ :
+                if -(-width // scale) >= self.size and -(-height // scale) >= self.size :
+                    return flags
+
+        return cv2.IMREAD_COLOR
+
+    # -----------------------------------------------------------------
+    def decode(self, image_bytes) :
+        """Decode an encoded image into a BGR HWC uint8 array"""
+        flags = self.decode_flags(image_bytes)
+        img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags)
+        if img is None :
+            raise ValueError('unable to decode image')
+
+        # the header may not describe the image that was decoded
+        if self.max_image_pixels and flags == cv2.IMREAD_COLOR and img.shape[0] * img.shape[1] > self.max_image_pixels :
+            raise ImageRejected('image of {}x{} exceeds the limit of {} pixels'.format(img.shape[1], img.shape[0], self.max_image_pixels))
+        return img
+
+    # -----------------------------------------------------------------
+    def crop_resize(self, img) :
+        """Center crop to size x size, scaling up any dimension that is
+        smaller than size; equivalent to utility.CropResize but with a
+        single resize of the cropped region (a view when no resize is needed)
+        """
+        size = self.size
+        (y, x) = img.shape[:2]
+
+        # crop the dimensions that are large enough before resizing
+        if x >= size :
+            startx = x//2 - size//2
+            img = img[:, startx:startx+size]
+        if y >= size :
+            starty = y//2 - size//2
+            img = img[starty:starty+size, :]
+
+        if img.shape[0] != size or img.shape[1] != size :
+            img = cv2.resize(img, (size, size))
+
+        return img
+
+    # -----------------------------------------------------------------
+    def fill(self, destination, img) :
+        """Copy a size x size BGR HWC uint8 image into one image of the
+        output tensor, reordering channels and converting if needed
+        """
+        if self.layout == 'NHWC' :
+            if self.rgb_image :
+                img = img[:, :, ::-1]
+            np.copyto(destination, img, casting='unsafe')
+            return
+
+        for (plane, channel) in enumerate(self.channel_order) :
+            np.copyto(destination[plane], img[:, :, channel], casting='unsafe')
+
+    # -----------------------------------------------------------------
+    def to_tensor(self, img) :
+        """Convert a size x size BGR HWC uint8 image to a tensor with a
+        batch dimension of 1 from the buffer pool
+        """
+        tensor = self.buffer_pool.acquire((1,) + self.image_shape, self.dtype)
+        self.fill(tensor[0], img)
+        return tensor
+
+    # -----------------------------------------------------------------
+    def process(self, image_bytes) :
+        """Decode, crop, resize and convert an encoded image; the tensor
+        should be passed to release when it is no longer needed
+        """
+        return self.to_tensor(self.crop_resize(self.decode(image_bytes)))
+
+    # -----------------------------------------------------------------
+    def process_batch(self, list_of_bytes) :
+        """Preprocess several encoded images into one tensor with a batch
+        dimension of N from the buffer pool, each image is written in place
+        """
+        tensor = self.buffer_pool.acquire((len(list_of_bytes),) + self.image_shape, self.dtype)
+        try :
+            for (i, image_bytes) in enumerate(list_of_bytes) :
+                self.fill(tensor[i], self.crop_resize(self.decode(image_bytes)))
+        except Exception :
+            self.release(tensor)
+            raise
+        return tensor
+
+    # -----------------------------------------------------------------
+    def process_frames(self, frames) :
+        """Crop, resize and convert several decoded BGR HWC uint8 images,
+        such as video frames, into one tensor with a batch dimension of N
+        from the buffer pool
+        """
+        tensor = self.buffer_pool.acquire((len(frames),) + self.image_shape, self.dtype)
+        for (i, frame) in enumerate(frames) :
+            self.fill(tensor[i], self.crop_resize(frame))
+        return tensor
+
+    # -----------------------------------------------------------------
+    def release(self, tensor) :
+        """Return a tensor created by process to the buffer pool"""
+        self.buffer_pool.release(tensor)
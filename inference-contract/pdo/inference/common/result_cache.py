@@ -0,0 +1,267 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the ResultCache class, a content addressed cache of
+inference results. Keys are computed in the guardian from the hash of the
+image bytes and the model name, model version and scoring parameters, so
+the cache does not depend on anything the client asserts about the image.
+
+The cache has an in-memory LRU tier and an optional LMDB tier on disk that
+evicts the oldest entries once a size limit is reached. Results written to
+disk are encrypted with a key derived from the image hash and parameters,
+so the disk tier can only be read by someone who already has the image.
+"""
+
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'ResultCache', 'CacheKey' ]
+
+# lookup is the database key, secret encrypts the value on disk
+CacheKey = namedtuple('CacheKey', ['lookup', 'secret'])
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class _LMDBResultStore(object) :
+    """Disk tier of the result cache; entries are evicted in insertion
+    order once the stored keys and values exceed max_bytes
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, path, max_bytes) :
+        try :
+            import lmdb
+        except ImportError :
+            raise RuntimeError('ResultCache DiskPath requires the lmdb package (pip install pdo_inference[lmdb])')
+        import pdo.common.crypto as crypto
+
+        self.crypto = crypto
+        self.max_bytes = max_bytes
+
+        os.makedirs(path, exist_ok=True)
+
+        # leave room for the btree pages and free space in the map
+        self.env = lmdb.open(path, map_size=2 * max_bytes + (64 << 20), max_dbs=3)
+        self.results_db = self.env.open_db(b'results')
+        self.order_db = self.env.open_db(b'order')
+        self.meta_db = self.env.open_db(b'meta')
+        self.map_full_error = lmdb.MapFullError
+
+        self.evictions = 0
+
+    # -----------------------------------------------------------------
+    def __get_counter__(self, txn, name) :
+        value = txn.get(name, db=self.meta_db)
+        return struct.unpack('>Q', value)[0] if value else 0
+
+    # -----------------------------------------------------------------
+    def __set_counter__(self, txn, name, value) :
+        txn.put(name, struct.pack('>Q', value), db=self.meta_db)
+
+    # -----------------------------------------------------------------
+    def get(self, key) :
+        with self.env.begin(db=self.results_db) as txn :
+            value = txn.get(key.lookup)
+        if value is None :
+            return None
+
+        # value is sequence number, iv length, iv and cipher
+        (iv_length,) = struct.unpack_from('>H', value, 8)
+        iv = value[10:10+iv_length]
+        cipher = value[10+iv_length:]
+        message = self.crypto.SKENC_DecryptMessage(key.secret, iv, cipher)
+        return bytes(message).decode('utf8')
+
+    # -----------------------------------------------------------------
+    def put(self, key, serialized_result) :
+        iv = bytes(self.crypto.SKENC_GenerateIV())
+        cipher = bytes(self.crypto.SKENC_EncryptMessage(key.secret, iv, serialized_result.encode('utf8')))
+
+        try :
+            with self.env.begin(write=True) as txn :
+                if txn.get(key.lookup, db=self.results_db) is not None :
+                    return
+
+                sequence = self.__get_counter__(txn, b'sequence') + 1
+                sequence_key = struct.pack('>Q', sequence)
+                value = sequence_key + struct.pack('>H', len(iv)) + iv + cipher
+
+                txn.put(key.lookup, value, db=self.results_db)
+                txn.put(sequence_key, key.lookup, db=self.order_db)
+                size = self.__get_counter__(txn, b'size') + len(key.lookup) + len(value)
+
+                # drop the oldest entries until the cache fits
+                cursor = txn.cursor(db=self.order_db)
+                while size > self.max_bytes and cursor.first() :
+                    old_lookup = cursor.value()
+                    old_value = txn.get(old_lookup, db=self.results_db)
+                    if old_value is not None :
+                        size -= len(old_lookup) + len(old_value)
+                        txn.delete(old_lookup, db=self.results_db)
+                    cursor.delete()
+                    self.evictions += 1
+
+                self.__set_counter__(txn, b'sequence', sequence)
+                self.__set_counter__(txn, b'size', max(0, size))
+
+        except self.map_full_error :
+            logger.warning('result cache database is full, result not cached')
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        with self.env.begin() as txn :
+            return {
+                'entries' : txn.stat(self.results_db)['entries'],
+                'bytes' : self.__get_counter__(txn, b'size'),
+                'evictions' : self.evictions,
+            }
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ResultCache(object) :
+
+    __shared_cache__ = None
+    __shared_settings__ = None
+    __shared_lock__ = threading.Lock()
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def shared_cache(cls, config) :
+        """Return the cache shared by the inference operations of the
+        service, or None if the cache is not enabled; the cache is created
+        on first use and kept across handler reloads, changes to its
+        settings on a reload are logged and ignored
+
+        :param config dict: service configuration, the [ResultCache] section is used
+        """
+        cache_config = config.get('ResultCache', {})
+        if not cache_config.get('Enabled', False) :
+            return None
+
+        settings = dict(
+            memory_entries = cache_config.get('MemoryEntries', 1024),
+            disk_path = cache_config.get('DiskPath'),
+            disk_max_bytes = cache_config.get('DiskMaxBytes', 1 << 30))
+
+        with cls.__shared_lock__ :
+            if cls.__shared_cache__ is None :
+                cls.__shared_cache__ = cls(**settings)
+                cls.__shared_settings__ = settings
+            elif settings != cls.__shared_settings__ :
+                logger.warning('ResultCache settings changed, the new settings are ignored until restart')
+            return cls.__shared_cache__
+
+    # -----------------------------------------------------------------
+    def __init__(self, memory_entries = 1024, disk_path = None, disk_max_bytes = 1 << 30) :
+        """
+        :param memory_entries int: number of results kept in memory
+        :param disk_path str: directory for the LMDB tier, no disk tier if None
+        :param disk_max_bytes int: size of the disk tier before old entries are evicted
+        """
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.disk = _LMDBResultStore(disk_path, disk_max_bytes) if disk_path else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def make_key(image_bytes, context) :
+        """Compute the key for an image
+
+        :param image_bytes bytes: the encoded image
+        :param context dict: model name, version and every parameter that affects the result
+        """
+        image_digest = hashlib.sha256(image_bytes).digest()
+        serialized_context = json.dumps(context, sort_keys=True).encode('utf8')
+
+        lookup = hashlib.sha256(b'lookup:' + image_digest + serialized_context).digest()
+        secret = hashlib.sha256(b'secret:' + image_digest + serialized_context).digest()
+        return CacheKey(lookup, secret)
+
+    # -----------------------------------------------------------------
+    def get(self, key) :
+        """Return a copy of the cached result for the key or None"""
+        with self._lock :
+            serialized_result = self._memory.get(key.lookup)
+            if serialized_result is not None :
+                self._memory.move_to_end(key.lookup)
+                self.memory_hits += 1
+                return json.loads(serialized_result)
+
+        if self.disk :
+            try :
+                serialized_result = self.disk.get(key)
+            except Exception as e :
+                logger.warning('failed to read cached result; %s', e)
+                serialized_result = None
+
+            if serialized_result is not None :
+                with self._lock :
+                    self.disk_hits += 1
+                self.__put_memory__(key, serialized_result)
+                return json.loads(serialized_result)
+
+        with self._lock :
+            self.misses += 1
+        return None
+
+    # -----------------------------------------------------------------
+    def __put_memory__(self, key, serialized_result) :
+        with self._lock :
+            self._memory[key.lookup] = serialized_result
+            self._memory.move_to_end(key.lookup)
+            while len(self._memory) > self.memory_entries :
+                self._memory.popitem(last=False)
+
+    # -----------------------------------------------------------------
+    def put(self, key, result) :
+        """Add a result, it must be serializable as JSON"""
+        serialized_result = json.dumps(result)
+        self.__put_memory__(key, serialized_result)
+
+        if self.disk :
+            try :
+                self.disk.put(key, serialized_result)
+            except Exception as e :
+                logger.warning('failed to write cached result; %s', e)
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        with self._lock :
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            result = {
+                'memory_entries' : len(self._memory),
+                'memory_hits' : self.memory_hits,
+                'disk_hits' : self.disk_hits,
+                'misses' : self.misses,
+                'hit_rate' : (self.memory_hits + self.disk_hits) / lookups if lookups else None,
+            }
+
+        if self.disk :
+            result['disk'] = self.disk.statistics()
+
+        return result
@@ -0,0 +1,165 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the codecs that convert between numpy arrays and the
+TensorProto messages carried in OVMS predict requests and responses.
+
+The numpy codec fills in the TensorProto directly (dtype, shape and the
+raw tensor_content buffer) and decodes responses with np.frombuffer, so
+TensorFlow is never imported on the request path. The tensorflow codec
+uses make_tensor_proto/make_ndarray and is kept as a fallback; it needs
+the tensorflow extra of the package.
+
+The serving API protos are taken from ovmsclient when it is installed
+since its copy of the protos does not depend on TensorFlow; otherwise the
+tensorflow_serving protos (which import TensorFlow) are used.
+"""
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'NumpyTensorCodec', 'TensorflowTensorCodec', 'tensor_codec_map' ]
+
+# TensorFlow DataType enum values (tensorflow/core/framework/types.proto)
+# and the repeated field used when a tensor does not use tensor_content
+__numpy_to_tensor_type__ = {
+    np.dtype(np.float32) : (1, 'float_val'),
+    np.dtype(np.float64) : (2, 'double_val'),
+    np.dtype(np.int32) : (3, 'int_val'),
+    np.dtype(np.uint8) : (4, 'int_val'),
+    np.dtype(np.int16) : (5, 'int_val'),
+    np.dtype(np.int8) : (6, 'int_val'),
+    np.dtype(np.int64) : (9, 'int64_val'),
+    np.dtype(np.bool_) : (10, 'bool_val'),
+    np.dtype(np.uint16) : (17, 'int_val'),
+    np.dtype(np.float16) : (19, 'half_val'),
+    np.dtype(np.uint32) : (22, 'uint32_val'),
+    np.dtype(np.uint64) : (23, 'uint64_val'),
+}
+
+__tensor_type_to_numpy__ = { v[0] : (k, v[1]) for (k, v) in __numpy_to_tensor_type__.items() }
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def import_serving_apis(require_tensorflow = False) :
+    """Import the predict and prediction service protos
+
+    :param require_tensorflow bool: use the tensorflow_serving protos even if ovmsclient is installed
+    :returns tuple: the predict_pb2 and prediction_service_pb2_grpc modules
+    """
+    if not require_tensorflow :
+        try :
+            from ovmsclient.tfs_compat.protos.tensorflow_serving.apis import predict_pb2
+            from ovmsclient.tfs_compat.protos.tensorflow_serving.apis import prediction_service_pb2_grpc
+            return (predict_pb2, prediction_service_pb2_grpc)
+        except ImportError :
+            logger.debug('ovmsclient protos not available, using tensorflow_serving')
+
+    from tensorflow_serving.apis import predict_pb2
+    from tensorflow_serving.apis import prediction_service_pb2_grpc
+    return (predict_pb2, prediction_service_pb2_grpc)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class NumpyTensorCodec(object) :
+
+    # -----------------------------------------------------------------
+    def serving_apis(self) :
+        return import_serving_apis(require_tensorflow=False)
+
+    # -----------------------------------------------------------------
+    def encode(self, array, tensor_proto) :
+        """Fill in a TensorProto from a numpy array
+
+        :param array ndarray: the tensor data
+        :param tensor_proto TensorProto: the message to fill in, e.g. request.inputs[name]
+        """
+        array = np.asarray(array)
+
+        # tensor_content is the little endian, row major image of the array
+        if array.dtype.byteorder == '>' :
+            array = array.astype(array.dtype.newbyteorder('<'))
+
+        try :
+            (dtype, _) = __numpy_to_tensor_type__[array.dtype]
+        except KeyError :
+            raise ValueError('unsupported tensor dtype {}'.format(array.dtype))
+
+        tensor_proto.dtype = dtype
+        tensor_proto.tensor_shape.Clear()
+        for size in array.shape :
+            tensor_proto.tensor_shape.dim.add().size = size
+
+        tensor_proto.tensor_content = np.ascontiguousarray(array).tobytes()
+
+    # -----------------------------------------------------------------
+    def decode(self, tensor_proto) :
+        """Create a numpy array from a TensorProto
+
+        The array returned for a tensor_content response is a read-only
+        view of the response buffer.
+
+        :param tensor_proto TensorProto: the tensor, e.g. response.outputs[name]
+        """
+        try :
+            (dtype, field) = __tensor_type_to_numpy__[tensor_proto.dtype]
+        except KeyError :
+            raise ValueError('unsupported tensor type {}'.format(tensor_proto.dtype))
+
+        shape = tuple(d.size for d in tensor_proto.tensor_shape.dim)
+        if tensor_proto.tensor_content :
+            return np.frombuffer(tensor_proto.tensor_content, dtype=dtype.newbyteorder('<')).reshape(shape)
+
+        values = getattr(tensor_proto, field)
+        if dtype == np.float16 :
+            array = np.array(values, dtype=np.uint16).view(np.float16)
+        else :
+            array = np.array(values, dtype=dtype)
+
+        # a single value is broadcast to the whole tensor
+        count = int(np.prod(shape))
+        if array.size == 1 and count > 1 :
+            array = np.full(count, array[0], dtype=dtype)
+        return array.reshape(shape)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class TensorflowTensorCodec(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self) :
+        import tensorflow
+        self.tensorflow = tensorflow
+
+    # -----------------------------------------------------------------
+    def serving_apis(self) :
+        return import_serving_apis(require_tensorflow=True)
+
+    # -----------------------------------------------------------------
+    def encode(self, array, tensor_proto) :
+        tensor_proto.CopyFrom(self.tensorflow.make_tensor_proto(array, shape=(array.shape)))
+
+    # -----------------------------------------------------------------
+    def decode(self, tensor_proto) :
+        return self.tensorflow.make_ndarray(tensor_proto)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+tensor_codec_map = {
+    'numpy' : NumpyTensorCodec,
+    'tensorflow' : TensorflowTensorCodec,
+}
@@ -0,0 +1,228 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the classes used to find where the time of an inference
+request goes:
+
+  * StageTimer records the duration of each named stage of one request
+  * StageHistograms aggregates the stage durations of many requests into
+    fixed, logarithmically spaced histogram buckets
+  * SamplingProfiler samples the stack of the request thread for 1 in N
+    requests and writes the samples as folded stacks, the input format of
+    flamegraph.pl and speedscope
+"""
+
+import collections
+import contextlib
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'SamplingProfiler', 'StageHistograms', 'StageTimer' ]
+
+# histogram bucket upper bounds in milliseconds, the last bucket is unbounded
+__bucket_bounds__ = [ 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000 ]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StageTimer(object) :
+    """Durations in seconds of the stages of a single request; a stage
+    that is entered more than once accumulates its durations
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self) :
+        self.timings = dict()
+
+    # -----------------------------------------------------------------
+    @contextlib.contextmanager
+    def stage(self, name) :
+        start = time.perf_counter()
+        try :
+            yield
+        finally :
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    # -----------------------------------------------------------------
+    def milliseconds(self) :
+        return { name : round(seconds * 1000.0, 3) for (name, seconds) in self.timings.items() }
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class _Histogram(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self) :
+        self.counts = [0] * (len(__bucket_bounds__) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    # -----------------------------------------------------------------
+    def record(self, milliseconds) :
+        bucket = 0
+        while bucket < len(__bucket_bounds__) and milliseconds > __bucket_bounds__[bucket] :
+            bucket += 1
+
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    # -----------------------------------------------------------------
+    def percentile(self, fraction) :
+        """Upper bound of the bucket that holds the percentile, limited
+        to the largest duration seen
+        """
+        threshold = fraction * self.count
+        cumulative = 0
+        for (bucket, count) in enumerate(self.counts[:-1]) :
+            cumulative += count
+            if cumulative >= threshold :
+                return min(__bucket_bounds__[bucket], self.max)
+        return self.max
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        bounds = [ str(b) for b in __bucket_bounds__ ] + [ 'inf' ]
+        return {
+            'count' : self.count,
+            'mean_ms' : self.total / self.count if self.count else None,
+            'max_ms' : self.max,
+            'p50_ms' : self.percentile(0.50),
+            'p90_ms' : self.percentile(0.90),
+            'p99_ms' : self.percentile(0.99),
+            'buckets_ms' : { bound : count for (bound, count) in zip(bounds, self.counts) if count },
+        }
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StageHistograms(object) :
+    """Histograms of stage durations, one per stage name; percentiles are
+    reported as the upper bound of the bucket that contains them
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self) :
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------------------
+    def record(self, timer) :
+        """Add the stages of a completed request
+
+        :param timer StageTimer: timings of the request
+        """
+        with self._lock :
+            for (name, seconds) in timer.timings.items() :
+                histogram = self._histograms.get(name)
+                if histogram is None :
+                    histogram = self._histograms[name] = _Histogram()
+                histogram.record(seconds * 1000.0)
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        with self._lock :
+            return { name : histogram.statistics() for (name, histogram) in self._histograms.items() }
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class SamplingProfiler(object) :
+    """Sample the stack of the thread that handles 1 in sample_every
+    requests; only the request thread is sampled, so time spent in the
+    batcher or the grpc threads shows up as the request thread waiting
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, sample_every, output_directory = None, interval = 0.001) :
+        """
+        :param sample_every int: profile one request in this many, 0 to disable
+        :param output_directory str: where the folded stack files are written
+        :param interval float: seconds between stack samples
+        """
+        self.sample_every = sample_every
+        self.output_directory = output_directory or tempfile.gettempdir()
+        self.interval = interval
+        self._requests = itertools.count()
+
+        if self.sample_every > 0 :
+            os.makedirs(self.output_directory, exist_ok=True)
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __fold__(frame) :
+        names = []
+        while frame is not None :
+            module = frame.f_globals.get('__name__', os.path.basename(frame.f_code.co_filename))
+            names.append('{0}:{1}'.format(module, frame.f_code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    # -----------------------------------------------------------------
+    def __write__(self, label, request, stacks) :
+        # the request finished before the first sample
+        if not stacks :
+            return
+
+        filename = '{0}-{1}-{2}.folded'.format(label, time.strftime('%Y%m%d%H%M%S'), request)
+        path = os.path.join(self.output_directory, filename)
+        try :
+            with open(path, 'w') as f :
+                for (stack, count) in stacks.most_common() :
+                    f.write('{0} {1}\n'.format(stack, count))
+            logger.info('wrote profile of request %d to %s', request, path)
+        except OSError as e :
+            logger.warning('failed to write profile to %s; %s', path, e)
+
+    # -----------------------------------------------------------------
+    @contextlib.contextmanager
+    def profile(self, label) :
+        """Profile the enclosed block if this request is sampled
+
+        :param label str: prefix for the name of the profile file
+        """
+        if self.sample_every <= 0 :
+            yield
+            return
+
+        request = next(self._requests)
+        if request % self.sample_every != 0 :
+            yield
+            return
+
+        thread_id = threading.get_ident()
+        stacks = collections.Counter()
+        stop = threading.Event()
+
+        def sample() :
+            while not stop.wait(self.interval) :
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None :
+                    stacks[self.__fold__(frame)] += 1
+
+        sampler = threading.Thread(target=sample, name='profiler', daemon=True)
+        sampler.start()
+        try :
+            yield
+        finally :
+            stop.set()
+            sampler.join()
+            self.__write__(label, request, stacks)
@@ -12,10 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-__all__ = [ 'image_classification', 'image_classes', 'model_scoring_script_base']
+__all__ = [ 'image_classification', 'image_classes', 'model_scoring_script_base', 'object_detection']
 
 from pdo.inference.model_scoring_scripts.image_classification import ImageClassification
+from pdo.inference.model_scoring_scripts.object_detection import ObjectDetection
 
 model_scoring_scripts_map = {
-    'ImageClassification': ImageClassification
+    'ImageClassification': ImageClassification,
+    'ObjectDetection': ObjectDetection,
 }
\ No newline at end of file
@@ -21,10 +21,9 @@ https://github.com/openvinotoolkit/model_server/tree/main/demos/image_classifica
 """
 
 
-import cv2
 import numpy as np
 
-from pdo.inference.common.utility import CropResize
+from pdo.inference.common.preprocess import PreprocessEngine
 from pdo.contracts.guardian.common.utility import ValidateJSON
 
 from pdo.inference.model_scoring_scripts.model_scoring_script_base import ModelScoringScriptBase
@@ -33,6 +32,14 @@ from pdo.inference.model_scoring_scripts.image_classes import imagenet_classes
 import logging
 logger = logging.getLogger(__name__)
 
+# class names indexed by position in the model output, by number of
+# outputs; some models have an additional background class at index 0
+__imagenet_labels__ = [ imagenet_classes[i] for i in range(len(imagenet_classes)) ]
+__label_tables__ = {
+    len(__imagenet_labels__) : np.array(__imagenet_labels__, dtype=object),
+    len(__imagenet_labels__) + 1 : np.array([ 'background' ] + __imagenet_labels__, dtype=object),
+}
+
 
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
@@ -45,6 +52,8 @@ class ImageClassification(ModelScoringScriptBase) :
         "properties" : {
             "size" : { "type" : "integer" },
             "rgb_image" : { "type" : "integer" },
+            "top_k" : { "type" : "integer", "minimum" : 1 },
+            "softmax" : { "type" : "boolean" },
         }
     }
 
@@ -53,9 +62,22 @@ class ImageClassification(ModelScoringScriptBase) :
 
         super().__init__()
 
+        # decode limits and reduced scale decoding of large JPEG images
+        self.decode_options = dict()
+        self.decode_options['reduced_decode'] = config['Model'].get('ReducedDecode', False)
+        self.decode_options['max_image_pixels'] = config['Model'].get('MaxImagePixels', 0)
+        self.decode_options['max_image_bytes'] = config['Model'].get('MaxImageBytes', 0)
+
+        # element type and layout of the tensor sent to the model
+        self.input_options = dict()
+        self.input_options['precision'] = config['Model'].get('InputPrecision', 'fp32')
+        self.input_options['layout'] = config['Model'].get('InputLayout', 'NCHW')
+
         params = dict()
         params['size'] = config['Model']['InputImageCropSize']
         params['rgb_image'] = config['Model']['InputImageIsRGB']
+        params['top_k'] = config['Model'].get('TopK', 1)
+        params['softmax'] = config['Model'].get('Softmax', False)
         self.set_misc_params(params)
 
     # -----------------------------------------------------------------
@@ -68,29 +90,57 @@ class ImageClassification(ModelScoringScriptBase) :
             return False
 
         self.misc_params = misc_params
+        self.preprocess_engine = PreprocessEngine(
+            misc_params['size'], misc_params['rgb_image'], **self.decode_options, **self.input_options)
         return True
 
+    # -----------------------------------------------------------------
+    def cache_parameters(self,
+        **extra_params):
+        """ decoding and input options change the model input so they are part of the cache key"""
+
+        return dict(self.misc_params, **self.decode_options, **self.input_options)
+
     # -----------------------------------------------------------------
     def preprocess_image(self,
         image_bytes,
         **extra_params):
-        """ image in bytes format. return cv2 image Mat format"""
+        """ image in bytes format. return tensor of shape (1,3,size,size), or (1,size,size,3) for NHWC,
+        with the configured precision"""
 
-        img = np.frombuffer(image_bytes, dtype=np.uint8)
-        img = cv2.imdecode(img, cv2.IMREAD_COLOR)
+        # decode, crop, resize, reorder channels and switch from HWC to
+        # CHW (unless the layout is NHWC) in a single pass into a pooled buffer
+        timer = extra_params.get('timer')
+        if timer is None :
+            return self.preprocess_engine.process(image_bytes)
 
-        size = self.misc_params['size']
-        rgb_image = self.misc_params['rgb_image']
+        with timer.stage('preprocess.decode') :
+            img = self.preprocess_engine.decode(image_bytes)
+        return self.preprocess_engine.to_tensor(self.preprocess_engine.crop_resize(img))
 
-        img = CropResize(img, size, size)
-        img = img.astype('float32')
-        #convert to RGB instead of BGR if required by model
-        if rgb_image:
-            img = img[:, :, [2, 1, 0]]
-        # switch from HWC to CHW and reshape to 1,3,size,size for model blob input requirements
-        img = img.transpose(2,0,1).reshape(1,3,size,size)
+    # -----------------------------------------------------------------
+    def release_image(self,
+        img,
+        **extra_params):
+        """ return the preprocessed image buffer to the pool once inference is complete"""
 
-        return img
+        self.preprocess_engine.release(img)
+
+    # -----------------------------------------------------------------
+    def preprocess_batch(self,
+        list_of_bytes,
+        **extra_params):
+        """ list of encoded images. return tensor of shape (N,3,size,size), or (N,size,size,3) for NHWC"""
+
+        return self.preprocess_engine.process_batch(list_of_bytes)
+
+    # -----------------------------------------------------------------
+    def preprocess_frames(self,
+        frames,
+        **extra_params):
+        """ list of decoded BGR images. return tensor of shape (N,3,size,size), or (N,size,size,3) for NHWC"""
+
+        return self.preprocess_engine.process_frames(frames)
 
     # -----------------------------------------------------------------
     def postprocess_inference_output(self,
@@ -100,14 +150,53 @@ class ImageClassification(ModelScoringScriptBase) :
         """ return result dict that should be part of dict returned back to the caller of the inference App.
         Specifically, returns the the classification label for the image"""
 
-        result = {}
-
-        nu = np.array(output)
-        offset = 0
-        if nu.shape[1] == 1001:
-            offset = 1
-        ma = np.argmax(nu) - offset
-        classification_label = imagenet_classes[int(ma)]
-        result['image_class'] = classification_label
+        return self.postprocess_batch(output)[0]
 
-        return result
+    # -----------------------------------------------------------------
+    def postprocess_batch(self,
+        batch_output,
+        batch_images=None,
+        **extra_params):
+        """ return a result dict per image with the classification label and, if top_k
+        is more than 1, the top_k labels and scores; with softmax the scores are probabilities"""
+
+        scores = np.asarray(batch_output)
+        scores = scores.reshape(scores.shape[0], -1)
+
+        labels = __label_tables__.get(scores.shape[1])
+        if labels is None :
+            raise ValueError('model output has {} classes, expected 1000 or 1001'.format(scores.shape[1]))
+
+        top_k = min(self.misc_params.get('top_k', 1), scores.shape[1])
+        if top_k == 1 :
+            indices = np.argmax(scores, axis=1)[:, None]
+        else :
+            # the top_k of each row in any order, then sorted by score
+            indices = np.argpartition(scores, -top_k, axis=1)[:, -top_k:]
+            order = np.argsort(-np.take_along_axis(scores, indices, axis=1), axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+
+        top_scores = np.take_along_axis(scores, indices, axis=1).astype(np.float64)
+        if self.misc_params.get('softmax', False) :
+            # normalize with the log of the sum over the row, only the
+            # top_k scores are converted to probabilities
+            row_max = top_scores[:, :1]
+            log_sum = np.log(np.exp(scores - row_max).sum(axis=1, keepdims=True))
+            top_scores = np.exp(top_scores - row_max - log_sum)
+
+        top_labels = labels[indices]
+
+        results = []
+        for (image_labels, image_scores) in zip(top_labels.tolist(), top_scores.tolist()) :
+            result = {}
+            result['image_class'] = image_labels[0]
+            if top_k > 1 :
+                result['top_k'] = [
+                    { 'image_class' : label, 'score' : score }
+                    for (label, score) in zip(image_labels, image_scores)
+                ]
+            elif self.misc_params.get('softmax', False) :
+                result['score'] = image_scores[0]
+            results.append(result)
+
+        return results
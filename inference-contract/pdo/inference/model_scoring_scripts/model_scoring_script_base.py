@@ -16,13 +16,15 @@
 """
 This module specifies the InferenceAppCustomOptions meta class containing API definitions that be be defined by 
 model-specific . These must be overridden by child class
-(see FaceDetection or ImageClassification). The purpose of having these as abstractmethods
+(see ObjectDetection or ImageClassification). The purpose of having these as abstractmethods
 is to fix the APIs. 
 """
 
 import logging
 from abc import ABCMeta, abstractmethod
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 class ModelScoringScriptBase(object):
@@ -34,8 +36,11 @@ class ModelScoringScriptBase(object):
 
 # -----------------------------------------------------------------
 # Following APIs are provided by the InferenceAppCustomOptions. These must be overridden by child class
-# (see FaceDetection or ImageClassification). The purpose of having these as abstractmethods
+# (see ObjectDetection or ImageClassification). The purpose of having these as abstractmethods
 # is to fix the APIs. 
+#
+# The inference operation passes a StageTimer (pdo.inference.common.timing) as the timer
+# extra parameter; scripts may use it to time sub-stages, e.g. timer.stage('preprocess.decode').
 
 # -----------------------------------------------------------------
     @abstractmethod
@@ -50,8 +55,62 @@ class ModelScoringScriptBase(object):
         raise NotImplementedError("Must override preprocess_image")
 
 
+# -----------------------------------------------------------------
+    def cache_parameters(self, **extra_params):
+        """ return a JSON serializable dict of every parameter that affects the result, used in result cache keys"""
+        return getattr(self, 'misc_params', {})
+
+# -----------------------------------------------------------------
+    def release_image(self, image, **extra_params):
+        """ called with the output of preprocess_image once inference and postprocessing are complete"""
+        pass
+
 # -----------------------------------------------------------------
     @abstractmethod
     def postprocess_inference_output(self, image, inference_output, **extra_params):
         """ return result dict that should be part of dict returned back to the caller of the inference App"""
         raise NotImplementedError("Must override postprocess_inference_output")
+
+# -----------------------------------------------------------------
+# The batch APIs below have default implementations that loop over the
+# single image APIs; scripts override them to vectorize across the batch.
+
+# -----------------------------------------------------------------
+    def preprocess_batch(self, list_of_bytes, **extra_params):
+        """ list of encoded images. return a single array with the images stacked on the leading dimension"""
+        images = [self.preprocess_image(image_bytes, **extra_params) for image_bytes in list_of_bytes]
+        try:
+            return np.concatenate(images, axis=0)
+        finally:
+            for image in images:
+                self.release_image(image)
+
+# -----------------------------------------------------------------
+    def preprocess_frames(self, frames, **extra_params):
+        """ list of decoded BGR images (cv2 Mat format), e.g. video frames. return a single array
+        with the images stacked on the leading dimension; the default encodes each frame again"""
+        import cv2
+        return self.preprocess_batch([cv2.imencode('.bmp', frame)[1].tobytes() for frame in frames], **extra_params)
+
+# -----------------------------------------------------------------
+    def split_batch_output(self, batch_output, rows):
+        """ batched inference output and the number of images in each part. return a list with
+        the output for each part, used when requests share a batched predict; by default the
+        output is split on the leading dimension"""
+        return np.split(batch_output, np.cumsum(rows)[:-1], axis=0)
+
+# -----------------------------------------------------------------
+    def join_batch_outputs(self, outputs, rows):
+        """ inference outputs for consecutive parts of a batch and the number of images in each
+        part. return the output for the whole batch; by default the outputs are concatenated on
+        the leading dimension"""
+        return np.concatenate(outputs, axis=0)
+
+# -----------------------------------------------------------------
+    def postprocess_batch(self, batch_output, batch_images=None, **extra_params):
+        """ batched inference output (and optionally the batched input). return a list with a result dict per image"""
+        results = []
+        for i in range(len(batch_output)):
+            image = batch_images[i:i+1] if batch_images is not None else None
+            results.append(self.postprocess_inference_output(image, batch_output[i:i+1], **extra_params))
+        return results
@@ -0,0 +1,295 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the ObjectDetection class, the scoring script for object
+detection models. Images are preprocessed as for ImageClassification (a
+center crop of InputImageCropSize); two output formats are supported:
+
+  * ssd: the DetectionOutput layer of the Open Model Zoo SSD models, rows of
+    (image_id, label, confidence, xmin, ymin, xmax, ymax) with coordinates
+    normalized to the model input, shape (1, 1, N, 7) or (B, 1, N, 7)
+  * yolo: the raw head of YOLOv8 style models, shape (B, 4 + classes, N) or
+    (B, N, 4 + classes), with boxes as (cx, cy, w, h) in input pixels and a
+    score per class
+
+The postprocessing works on arrays for the whole batch with no Python loop
+over candidate boxes: the highest scoring MaxCandidates boxes of each image
+are selected with argpartition, filtered by confidence and passed through
+a class aware Fast NMS (Bolya et al., YOLACT), which suppresses a box if
+any higher scoring box of the same class overlaps it by more than the IoU
+threshold. Unlike sequential NMS, a box that is itself suppressed can still
+suppress others, so Fast NMS may remove slightly more boxes.
+
+Boxes are returned as [xmin, ymin, xmax, ymax] normalized to the cropped
+model input.
+
+An SSD output that holds the rows of every image in one (1, 1, N, 7) array
+is not batch major, so the script splits and joins the outputs of batched
+predicts by image_id rather than on the leading dimension.
+"""
+
+import numpy as np
+
+from pdo.contracts.guardian.common.utility import ValidateJSON
+
+from pdo.inference.model_scoring_scripts.image_classification import ImageClassification
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+def fast_nms(boxes, scores, labels, valid, iou_threshold) :
+    """Class aware Fast NMS over a batch of candidate boxes
+
+    :param boxes ndarray: (B, M, 4) boxes as xmin, ymin, xmax, ymax
+    :param scores ndarray: (B, M) scores, sorted in descending order for each image
+    :param labels ndarray: (B, M) class of each box
+    :param valid ndarray: (B, M) boxes that take part in suppression
+    :param iou_threshold float: boxes that overlap a higher scoring box by more are suppressed
+    :returns ndarray: (B, M) boxes that are kept
+    """
+    (x1, y1, x2, y2) = (boxes[..., 0], boxes[..., 1], boxes[..., 2], boxes[..., 3])
+    area = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    # pairwise intersection over union, (B, M, M)
+    width = np.clip(np.minimum(x2[:, :, None], x2[:, None, :]) - np.maximum(x1[:, :, None], x1[:, None, :]), 0, None)
+    height = np.clip(np.minimum(y2[:, :, None], y2[:, None, :]) - np.maximum(y1[:, :, None], y1[:, None, :]), 0, None)
+    intersection = width * height
+    union = area[:, :, None] + area[:, None, :] - intersection
+    iou = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+    # only higher scoring (earlier), valid boxes of the same class suppress
+    iou *= (labels[:, :, None] == labels[:, None, :]) & valid[:, :, None]
+    iou = np.triu(iou, k=1)
+
+    return valid & (iou.max(axis=1) <= iou_threshold)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ObjectDetection(ImageClassification) :
+    # -----------------------------------------------------------------
+
+    # these are parameters NOT signed over by the TO
+    __misc_params_schema__ = {
+        "type" : "object",
+        "properties" : {
+            "size" : { "type" : "integer" },
+            "rgb_image" : { "type" : "integer" },
+            "output_format" : { "type" : "string", "enum" : [ "ssd", "yolo" ] },
+            "confidence_threshold" : { "type" : "number", "minimum" : 0, "maximum" : 1 },
+            "iou_threshold" : { "type" : "number", "minimum" : 0, "maximum" : 1 },
+            "max_candidates" : { "type" : "integer", "minimum" : 1 },
+            "max_detections" : { "type" : "integer", "minimum" : 1 },
+        }
+    }
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+
+        super().__init__(config)
+
+        # optional class names, one per line in the order of the class indices
+        self.labels = None
+        label_file = config['Model'].get('LabelFile')
+        if label_file :
+            with open(label_file, 'r') as f :
+                self.labels = np.array([ line.strip() for line in f ], dtype=object)
+
+        params = dict()
+        params['size'] = config['Model']['InputImageCropSize']
+        params['rgb_image'] = config['Model']['InputImageIsRGB']
+        params['output_format'] = config['Model'].get('DetectionOutputFormat', 'ssd')
+        params['confidence_threshold'] = config['Model'].get('ConfidenceThreshold', 0.5)
+        params['iou_threshold'] = config['Model'].get('IoUThreshold', 0.5)
+        params['max_candidates'] = config['Model'].get('MaxCandidates', 300)
+        params['max_detections'] = config['Model'].get('MaxDetections', 100)
+        if not self.set_misc_params(params) :
+            raise ValueError('invalid object detection parameters')
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __decode_ssd__(output, batch_size) :
+        """Dense (B, N) arrays from DetectionOutput rows, rows are assigned
+        to images by their image_id; padding rows have an image_id of -1
+        """
+        output = np.asarray(output, dtype=np.float32)
+        if output.shape[0] == batch_size and batch_size > 1 :
+            rows = output.reshape(batch_size, -1, 7)
+            rows = np.where(rows[..., :1] < 0, 0.0, rows)
+        else :
+            rows = output.reshape(-1, 7)
+            image_ids = rows[:, 0].astype(np.int64)
+            rows = rows[(image_ids >= 0) & (image_ids < batch_size)]
+            image_ids = rows[:, 0].astype(np.int64)
+
+            # scatter the rows of each image into a dense, zero padded array
+            order = np.argsort(image_ids, kind='stable')
+            (rows, image_ids) = (rows[order], image_ids[order])
+            counts = np.bincount(image_ids, minlength=batch_size)
+            positions = np.arange(len(image_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+            dense = np.zeros((batch_size, max(int(counts.max(initial=0)), 1), 7), dtype=np.float32)
+            dense[image_ids, positions] = rows
+            rows = dense
+
+        return (rows[..., 3:7], rows[..., 2], rows[..., 1].astype(np.int64))
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __ssd_rows__(output, batch_size) :
+        """DetectionOutput rows of an output for batch_size images, as an
+        (N, 7) array with the image_id of each row; rows of a batch major
+        output are given the image_id of their position in the batch
+        """
+        output = np.asarray(output, dtype=np.float32)
+        if output.shape[0] == batch_size and batch_size > 1 :
+            rows = output.reshape(batch_size, -1, 7).copy()
+            positions = np.arange(batch_size, dtype=np.float32)[:, None]
+            rows[..., 0] = np.where(rows[..., 0] < 0, -1.0, positions)
+            return rows.reshape(-1, 7)
+
+        rows = output.reshape(-1, 7)
+        image_ids = rows[:, 0]
+        return rows[(image_ids >= 0) & (image_ids < batch_size)]
+
+    # -----------------------------------------------------------------
+    def split_batch_output(self, batch_output, rows) :
+        """DetectionOutput rows are not batch major, the rows for each part
+        are selected by image_id and numbered from 0 within the part
+        """
+        if self.misc_params['output_format'] != 'ssd' :
+            return super().split_batch_output(batch_output, rows)
+
+        detections = self.__ssd_rows__(batch_output, int(sum(rows)))
+        image_ids = detections[:, 0]
+
+        outputs = []
+        start = 0
+        for count in rows :
+            part = detections[(image_ids >= start) & (image_ids < start + count)].copy()
+            part[:, 0] -= start
+            if len(part) == 0 :
+                # a single padding row keeps the (1, 1, N, 7) shape
+                part = np.full((1, 7), -1.0, dtype=np.float32)
+            outputs.append(part.reshape(1, 1, -1, 7))
+            start += count
+
+        return outputs
+
+    # -----------------------------------------------------------------
+    def join_batch_outputs(self, outputs, rows) :
+        """The DetectionOutput rows of the parts are combined into one
+        (1, 1, N, 7) output with the image_id offset by the start of the part
+        """
+        if self.misc_params['output_format'] != 'ssd' :
+            return super().join_batch_outputs(outputs, rows)
+
+        parts = []
+        start = 0
+        for (output, count) in zip(outputs, rows) :
+            part = self.__ssd_rows__(output, count).copy()
+            part[:, 0] += start
+            parts.append(part)
+            start += count
+
+        return np.concatenate(parts, axis=0).reshape(1, 1, -1, 7)
+
+    # -----------------------------------------------------------------
+    def __decode_yolo__(self, output, batch_size) :
+        """Boxes, best class score and class from a YOLOv8 style head"""
+        output = np.asarray(output, dtype=np.float32).reshape(batch_size, output.shape[-2], output.shape[-1])
+
+        # the channel axis (4 + classes) is the shorter one
+        if output.shape[1] < output.shape[2] :
+            output = output.transpose(0, 2, 1)
+
+        size = float(self.misc_params['size'])
+        (cx, cy, w, h) = (output[..., 0], output[..., 1], output[..., 2], output[..., 3])
+        boxes = np.stack([ cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2 ], axis=-1) / size
+
+        class_scores = output[..., 4:]
+        labels = class_scores.argmax(axis=-1)
+        scores = np.take_along_axis(class_scores, labels[..., None], axis=-1)[..., 0]
+        return (boxes, scores, labels)
+
+    # -----------------------------------------------------------------
+    def detect(self, batch_output, batch_size) :
+        """Select the detections of every image in a batch
+
+        :returns tuple: (B, K) arrays of boxes (with a trailing axis of 4),
+            scores and labels, sorted by score, and a (B, K) mask of the
+            detections that are kept
+        """
+        params = self.misc_params
+        if params['output_format'] == 'yolo' :
+            (boxes, scores, labels) = self.__decode_yolo__(np.asarray(batch_output), batch_size)
+        else :
+            (boxes, scores, labels) = self.__decode_ssd__(batch_output, batch_size)
+
+        # the highest scoring candidates of each image in descending order
+        candidates = min(params['max_candidates'], scores.shape[1])
+        if candidates < scores.shape[1] :
+            top = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+        else :
+            top = np.broadcast_to(np.arange(candidates), scores.shape)
+        order = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+        scores = np.take_along_axis(scores, order, axis=1)
+        labels = np.take_along_axis(labels, order, axis=1)
+        boxes = np.clip(np.take_along_axis(boxes, order[..., None], axis=1), 0.0, 1.0)
+
+        valid = scores >= params['confidence_threshold']
+        keep = fast_nms(boxes, scores, labels, valid, params['iou_threshold'])
+        keep &= np.cumsum(keep, axis=1) <= params['max_detections']
+
+        return (boxes, scores, labels, keep)
+
+    # -----------------------------------------------------------------
+    def postprocess_inference_output(self,
+        img,
+        output,
+        **extra_params):
+        """ return result dict that should be part of dict returned back to the caller of the inference App.
+        Specifically, returns the detections in the image"""
+
+        return self.postprocess_batch(output, img)[0]
+
+    # -----------------------------------------------------------------
+    def postprocess_batch(self,
+        batch_output,
+        batch_images=None,
+        **extra_params):
+        """ return a result dict per image with a list of detections, each with the class,
+        score and box of the detected object"""
+
+        batch_size = len(batch_images) if batch_images is not None else np.asarray(batch_output).shape[0]
+        (boxes, scores, labels, keep) = self.detect(batch_output, batch_size)
+
+        results = []
+        for i in range(batch_size) :
+            kept = np.flatnonzero(keep[i])
+            image_labels = labels[i, kept]
+            names = self.labels[np.clip(image_labels, 0, len(self.labels) - 1)] if self.labels is not None else None
+
+            detections = []
+            for (j, (label, score, box)) in enumerate(zip(image_labels.tolist(), scores[i, kept].tolist(), boxes[i, kept].tolist())) :
+                detection = { 'label' : label, 'score' : score, 'box' : box }
+                if names is not None :
+                    detection['image_class'] = names[j]
+                detections.append(detection)
+
+            results.append({ 'detections' : detections })
+
+        return results
@@ -13,10 +13,14 @@
 # limitations under the License.
 
 
-__all__ = [ 'inference']
+__all__ = [ 'batch_inference', 'inference', 'model_registry', 'video_inference' ]
 
 from pdo.inference.operations.inference import InferenceOperation
+from pdo.inference.operations.batch_inference import BatchInferenceOperation
+from pdo.inference.operations.video_inference import VideoInferenceOperation
 
 capability_handler_map = {
     'do_inference' : InferenceOperation,
+    'do_batch_inference' : BatchInferenceOperation,
+    'do_video_inference' : VideoInferenceOperation,
 }
@@ -0,0 +1,108 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the BatchInferenceOperation class, the handler for
+capabilities that authorize inference over several images stored in one
+key value state. The images are read together, looked up in the result
+cache, and the remaining images are preprocessed into a single tensor
+that is run through the model's micro-batcher; the result is a map from
+each image key to the result for that image.
+"""
+
+import threading
+
+from pdo.inference.operations.inference import InferenceOperation
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class BatchInferenceOperation(InferenceOperation) :
+    # -----------------------------------------------------------------
+    __schema__ = {
+        "type" : "object",
+        "properties" : {
+            "encryption_key" : { "type" : "string" },
+            "state_hash" : { "type" : "string" },
+            "image_keys" : {
+                "type" : "array",
+                "items" : { "type" : "string" },
+                "minItems" : 1,
+            },
+            "model_name" : { "type" : "string" },
+        },
+        "required" : [ "encryption_key", "state_hash", "image_keys" ],
+    }
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        super().__init__(config)
+
+        self.max_images = config['Model'].get('MaxImagesPerRequest', 64)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.images = 0
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        # the model statistics are reported by the do_inference operation
+        with self._lock :
+            return { 'requests' : self.requests, 'images' : self.images }
+
+    # -----------------------------------------------------------------
+    def __process__(self, model, params, timer) :
+        encryption_key = params['encryption_key']
+        state_hash = params['state_hash']
+
+        # a key that is listed more than once is processed once
+        image_keys = list(dict.fromkeys(params['image_keys']))
+        if len(image_keys) > self.max_images :
+            logger.warning('batch of %d images exceeds the limit of %d', len(image_keys), self.max_images)
+            return None
+
+        with self._lock :
+            self.requests += 1
+            self.images += len(image_keys)
+
+        images = self.__read_inputs__(encryption_key, state_hash, image_keys, timer)
+        results = [ None ] * len(images)
+
+        # the same image with the same model and parameters has the same result
+        if self.result_cache :
+            with timer.stage('cache_lookup') :
+                cache_keys = [ self.result_cache.make_key(image_bytes, model.cache_context) for image_bytes in images ]
+                results = [ self.result_cache.get(cache_key) for cache_key in cache_keys ]
+
+            hits = sum(1 for result in results if result is not None)
+            if hits :
+                model.record_cache_hit(hits)
+
+        missing = [ i for (i, result) in enumerate(results) if result is None ]
+        if missing :
+            batch_results = model.run_batch([ images[i] for i in missing ], timer)
+            for (index, result) in zip(missing, batch_results) :
+                results[index] = result
+
+            # images that could not be processed have an error result
+            if self.result_cache :
+                with timer.stage('cache_store') :
+                    for index in missing :
+                        if results[index] is not None and 'error' not in results[index] :
+                            self.result_cache.put(cache_keys[index], results[index])
+
+        return { 'results' : dict(zip(image_keys, results)) }
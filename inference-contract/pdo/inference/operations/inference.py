@@ -21,8 +21,11 @@ handling contract method invocation requests.
 from pdo.contracts.guardian.common.utility import ValidateJSON
 from pdo.common.key_value import KeyValueStore
 
-from pdo.inference.model_scoring_scripts import model_scoring_scripts_map
-from pdo.inference.common.ovms_predict import OVMSPredict
+from pdo.inference.operations.model_registry import ModelRegistry
+from pdo.inference.common.image_store import read_image
+from pdo.inference.common.kv_cache import KeyValueHandleCache
+from pdo.inference.common.result_cache import ResultCache
+from pdo.inference.common.timing import StageTimer
 
 import logging
 logger = logging.getLogger(__name__)
@@ -30,7 +33,7 @@ logger = logging.getLogger(__name__)
 
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
-class InferenceOperation(OVMSPredict) :
+class InferenceOperation(object) :
     # -----------------------------------------------------------------
     __schema__ = {
         "type" : "object",
@@ -38,49 +41,112 @@ class InferenceOperation(OVMSPredict) :
             "encryption_key" : { "type" : "string" },
             "state_hash" : { "type" : "string" },
             "image_key" : { "type" : "string" },
+            "model_name" : { "type" : "string" },
         }
     }
 
 
     # -----------------------------------------------------------------
     def __init__(self, config) :
-        # Model Parameters to be used during inference
-        self.model_name = config['Model']['Name']
-        self.input_tensor_name = config['Model']['InputTensorName']
-        self.output_tensor_name = config['Model']['OutputTensorName']
+        # Create every configured model, requests are routed by the
+        # optional model_name parameter; the models are shared with the
+        # other operations created from the same configuration
+        self.models = ModelRegistry.shared_registry(config)
 
-        # Init Model Scoring Scoring Script
-        scoring_script_name = config['Model']['ScoringScriptModule']
-        scoring_scripts_handler = model_scoring_scripts_map[scoring_script_name]
-        self.model_scorer = scoring_scripts_handler(config)
+        # Results are cached by image hash together with everything that
+        # determines the result, see InferenceModel.cache_context
+        self.result_cache = ResultCache.shared_cache(config)
 
-        # Create the Channel to the OpenVINO Model Server backend
-        grpc_address = config['Model']['OpenVINOModelServerAddress']
-        grpc_port = config['Model']['OpenVINOModelServerPort']
-        self.create_channel_to_ovms(grpc_address, grpc_port)
+        # Opened key value stores are kept for requests that read from
+        # the same state
+        self.kv_cache = KeyValueHandleCache.shared_cache(config)
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        result = { 'models' : self.models.statistics() }
+        if self.result_cache :
+            result['result_cache'] = self.result_cache.statistics()
+        if self.kv_cache :
+            result['kv_cache'] = self.kv_cache.statistics()
+        return result
+
+    # -----------------------------------------------------------------
+    def ready(self) :
+        """The operation is ready once its models have been warmed up"""
+        return self.models.ready()
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        """Release the models when the handlers are replaced; the result
+        and key value caches are kept across reloads"""
+        self.models.close()
 
     # -----------------------------------------------------------------
     def __call__(self, params) :
         if not ValidateJSON(params, self.__schema__) :
             return None
 
+        # an empty or missing model name selects the default model
+        model_name = params.get('model_name', '')
+        try :
+            model = self.models.get_model(model_name)
+        except KeyError :
+            logger.warning('unknown model %s', model_name)
+            return None
+
+        timer = StageTimer()
+        with model.profiler.profile(model.name) :
+            with timer.stage('total') :
+                result = self.__process__(model, params, timer)
+
+        model.record_timings(timer)
+
+        # timings are added after the result is cached so that cached
+        # results do not carry the timings of the request that stored them
+        if model.report_timings and result is not None :
+            result = dict(result, _timings=timer.milliseconds())
+
+        return result
+
+    # -----------------------------------------------------------------
+    def __read_inputs__(self, encryption_key, state_hash, keys, timer) :
+        """Read the values of several keys from the store with the given state"""
+        if self.kv_cache :
+            get_value = lambda key : self.kv_cache.get(encryption_key, state_hash, key, output_encoding='raw')
+            with timer.stage('kv_read') :
+                return [ read_image(get_value, key) for key in keys ]
+
+        with timer.stage('kv_open') :
+            kv = KeyValueStore(encryption_key, state_hash)
+
+        get_value = lambda key : kv.get(key, output_encoding='raw')
+        with timer.stage('kv_read') :
+            with kv :
+                return [ read_image(get_value, key) for key in keys ]
+
+    # -----------------------------------------------------------------
+    def __process__(self, model, params, timer) :
         encryption_key = params['encryption_key']
         state_hash = params['state_hash']
         image_key = params['image_key']
 
-        # load the input image from local storage
-        kv = KeyValueStore(encryption_key, state_hash)
-        with kv :
-            image_bytes = kv.get(image_key,output_encoding='raw')
+        # load the input image from local storage, the blocks of the
+        # store were pushed to the storage service before the request
+        [image_bytes] = self.__read_inputs__(encryption_key, state_hash, [image_key], timer)
 
-        # pre-process the image input using the scoring script
-        img = self.model_scorer.preprocess_image(bytes(image_bytes))
+        # the same image with the same model and parameters has the same result
+        if self.result_cache :
+            with timer.stage('cache_lookup') :
+                cache_key = self.result_cache.make_key(image_bytes, model.cache_context)
+                result = self.result_cache.get(cache_key)
+            if result is not None :
+                model.record_cache_hit()
+                return result
 
-        #Create the inference request package
-        request = self.create_request_package_for_image_input(self.model_name, self.input_tensor_name, img)
+        result = model(image_bytes, timer)
 
-        # do inference using the OVMS backend
-        output = self.invoke_predict(request, self.output_tensor_name)
+        if self.result_cache and result is not None :
+            with timer.stage('cache_store') :
+                self.result_cache.put(cache_key, result)
 
-        # post-process the output using the scoring script
-        return self.model_scorer.postprocess_inference_output(img, output)
+        return result
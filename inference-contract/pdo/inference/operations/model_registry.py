@@ -0,0 +1,531 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the ModelRegistry class that holds the models served by
+an inference guardian. Models are listed in the [[Models]] array of the
+guardian configuration; the settings in the [Model] section are defaults
+for every entry, so settings shared by all models (the OVMS endpoints,
+for example) only need to be given once. A configuration without a
+[[Models]] array serves the single model described by [Model].
+
+Each InferenceModel has its own scoring script, backend (and so its own
+OVMS channels), batcher, concurrency limit, request counters and
+histograms of the time spent in each stage of a request.
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from pdo.contracts.guardian.common.capability_handlers import OperationBusy
+from pdo.inference.model_scoring_scripts import model_scoring_scripts_map
+from pdo.inference.common.backend import create_inference_backend
+from pdo.inference.common.batcher import MicroBatcher
+from pdo.inference.common.timing import SamplingProfiler, StageHistograms, StageTimer
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [ 'InferenceModel', 'ModelBusy', 'ModelRegistry' ]
+
+# -----------------------------------------------------------------
+class ModelBusy(OperationBusy) :
+    pass
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class InferenceModel(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        """
+        :param config dict: guardian configuration, the [Model] section
+            describes this model
+        """
+        model_config = config['Model']
+        self.name = model_config['Name']
+
+        # Init Model Scoring Scoring Script
+        self.scoring_script_name = model_config['ScoringScriptModule']
+        scoring_scripts_handler = model_scoring_scripts_map[self.scoring_script_name]
+        self.model_scorer = scoring_scripts_handler(config)
+
+        # Create the backend that runs the model, OVMS unless configured otherwise
+        self.backend = create_inference_backend(config)
+
+        # Combine concurrent requests into batched predict calls, the
+        # model must accept a variable batch dimension
+        max_batch_size = model_config.get('MaxBatchSize', 1)
+        max_batch_delay = model_config.get('MaxBatchDelayMs', 5) / 1000.0
+        max_outstanding = model_config.get('MaxOutstandingPredicts', 4)
+        self.batcher = None
+        if max_batch_size > 1 :
+            self.batcher = MicroBatcher(self.backend.predict_future, max_batch_size, max_batch_delay, max_outstanding,
+                                        split_output=self.model_scorer.split_batch_output)
+
+        # Bound the number of requests for this model that are processed
+        # at once so one model cannot occupy every guardian thread
+        self.max_concurrency = model_config.get('MaxConcurrency', 0)
+        self.concurrency_timeout = model_config.get('ConcurrencyTimeout', 30.0)
+        self._concurrency = threading.BoundedSemaphore(self.max_concurrency) if self.max_concurrency > 0 else None
+
+        # the model version must be changed in the configuration whenever
+        # a different model is deployed under the same name
+        self.cache_context = {
+            'model' : self.name,
+            'version' : model_config.get('Version', ''),
+            'scoring_script' : self.scoring_script_name,
+            'parameters' : self.model_scorer.cache_parameters(),
+        }
+
+        # Stage durations are always aggregated; ReportTimings also adds
+        # them to each result and ProfileEvery samples the stack of 1 in N
+        # requests into a folded stack file
+        self.report_timings = model_config.get('ReportTimings', False)
+        self.stage_histograms = StageHistograms()
+        self.profiler = SamplingProfiler(
+            model_config.get('ProfileEvery', 0),
+            model_config.get('ProfileDirectory'),
+            model_config.get('ProfileInterval', 0.001))
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.active = 0
+        self.calls = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        # Warm up the backend (channel connection, model loading in OVMS)
+        # and the scoring script before the handlers are reported ready;
+        # a model that fails warmup is not ready and warmup is retried
+        default_batch_sizes = sorted(set([1, max_batch_size]))
+        warmup_params = (
+            model_config.get('WarmupRequests', 1),
+            model_config.get('WarmupBatchSizes', default_batch_sizes),
+            model_config.get('WarmupImage'))
+
+        self.warmup_latency = dict()
+        self.warmup_error = None
+        self._closed = threading.Event()
+        if not self.warmup(*warmup_params) :
+            retry_seconds = model_config.get('WarmupRetrySeconds', 30)
+            thread = threading.Thread(
+                target=self.__retry_warmup__, args=(retry_seconds, warmup_params),
+                name='warmup-{}'.format(self.name), daemon=True)
+            thread.start()
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __warmup_image__(image_file = None) :
+        """Return the encoded image used for warmup, a JPEG of random
+        pixels if no image file is configured
+        """
+        if image_file :
+            with open(os.path.expanduser(image_file), 'rb') as f :
+                return f.read()
+
+        import cv2
+
+        pixels = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        (_, encoded) = cv2.imencode('.jpg', pixels)
+        return encoded.tobytes()
+
+    # -----------------------------------------------------------------
+    def warmup(self, requests, batch_sizes, image_file = None) :
+        """Send requests synthetic predicts at each batch size, recording
+        the latency of the first and the last; warmup stops at the first
+        failure, which is recorded in warmup_error and the model is not
+        reported ready until a later warmup succeeds
+
+        :param requests int: number of predicts at each batch size, 0 to skip warmup
+        :param batch_sizes list: batch sizes to warm up
+        :param image_file str: encoded image to use instead of a synthetic one
+        :returns bool: True if warmup succeeded or was skipped
+        """
+        if requests <= 0 :
+            return True
+
+        try :
+            image_bytes = self.__warmup_image__(image_file)
+            for batch_size in batch_sizes :
+                latencies = []
+                for _ in range(requests) :
+                    start = time.perf_counter()
+                    batch = self.model_scorer.preprocess_batch([image_bytes] * batch_size)
+                    try :
+                        output = self.backend.predict(batch)
+                        self.model_scorer.postprocess_batch(output, batch)
+                    finally :
+                        self.model_scorer.release_image(batch)
+                    latencies.append(time.perf_counter() - start)
+
+                self.warmup_latency[batch_size] = { 'first' : latencies[0], 'last' : latencies[-1] }
+                logger.info('warmed up model %s at batch size %d, first %.3f seconds, last %.3f seconds',
+                            self.name, batch_size, latencies[0], latencies[-1])
+        except Exception as e :
+            logger.warning('failed to warm up model %s; %s', self.name, e)
+            self.warmup_error = str(e)
+            return False
+
+        self.warmup_error = None
+        return True
+
+    # -----------------------------------------------------------------
+    def __retry_warmup__(self, retry_seconds, warmup_params) :
+        """Repeat warmup until it succeeds or the model is closed, the
+        model server may become available after the guardian starts
+        """
+        while not self._closed.wait(retry_seconds) :
+            if self.warmup(*warmup_params) :
+                logger.info('model %s is ready', self.name)
+                return
+
+    # -----------------------------------------------------------------
+    @property
+    def ready(self) :
+        return self.warmup_error is None
+
+    # -----------------------------------------------------------------
+    def infer(self, image_bytes, timer = None) :
+        """Preprocess, run and postprocess an encoded image
+
+        :param timer StageTimer: records the stages, scoring scripts may
+            add sub-stages such as preprocess.decode
+        """
+        timer = timer or StageTimer()
+
+        # pre-process the image input using the scoring script
+        with timer.stage('preprocess') :
+            img = self.model_scorer.preprocess_image(image_bytes, timer=timer)
+
+        try :
+            # do inference using the configured backend, with the batcher
+            # this includes the time waiting for the batch to fill
+            with timer.stage('predict') :
+                if self.batcher :
+                    output = self.batcher.submit(img)
+                else :
+                    output = self.backend.predict(img)
+
+            # post-process the output using the scoring script
+            with timer.stage('postprocess') :
+                return self.model_scorer.postprocess_inference_output(img, output, timer=timer)
+        finally :
+            self.model_scorer.release_image(img)
+
+    # -----------------------------------------------------------------
+    def __preprocess_batch__(self, list_of_bytes, timer) :
+        """Preprocess the images that can be preprocessed into one tensor
+
+        :returns tuple: the tensor (None if no image could be used), the
+            indices of the images in the tensor and a map from the index of
+            each rejected image to the reason
+        """
+        try :
+            return (self.model_scorer.preprocess_batch(list_of_bytes, timer=timer), list(range(len(list_of_bytes))), {})
+        except ValueError :
+            pass
+
+        # find the images that cannot be preprocessed and batch the rest
+        errors = dict()
+        for (index, image_bytes) in enumerate(list_of_bytes) :
+            try :
+                self.model_scorer.release_image(self.model_scorer.preprocess_image(image_bytes))
+            except ValueError as e :
+                errors[index] = str(e)
+
+        indices = [ i for i in range(len(list_of_bytes)) if i not in errors ]
+        if not indices :
+            return (None, indices, errors)
+
+        tensor = self.model_scorer.preprocess_batch([ list_of_bytes[i] for i in indices ], timer=timer)
+        return (tensor, indices, errors)
+
+    # -----------------------------------------------------------------
+    def __predict_batch__(self, batch) :
+        """Run a batch of any size; through the batcher the batch is split
+        into chunks of at most MaxBatchSize images that are pipelined,
+        otherwise each image is sent in its own concurrent predict; the
+        scoring script joins the outputs of the chunks
+        """
+        if self.batcher :
+            step = self.batcher.max_batch_size
+            chunks = [ batch[i:i+step] for i in range(0, len(batch), step) ]
+            outputs = self.batcher.submit_all(chunks)
+        else :
+            chunks = [ batch[i:i+1] for i in range(len(batch)) ]
+            futures = [ self.backend.predict_future(chunk) for chunk in chunks ]
+            outputs = [ future.result() for future in futures ]
+
+        if len(outputs) == 1 :
+            return outputs[0]
+        return self.model_scorer.join_batch_outputs(outputs, [ len(chunk) for chunk in chunks ])
+
+    # -----------------------------------------------------------------
+    def infer_batch(self, list_of_bytes, timer = None) :
+        """Preprocess, run and postprocess several encoded images
+
+        :returns list: a result per image, an image that could not be
+            preprocessed has a result with an error message
+        """
+        timer = timer or StageTimer()
+
+        with timer.stage('preprocess') :
+            (batch, indices, errors) = self.__preprocess_batch__(list_of_bytes, timer)
+
+        results = [ { 'error' : errors[i] } if i in errors else None for i in range(len(list_of_bytes)) ]
+        if batch is None :
+            return results
+
+        for (index, result) in zip(indices, self.__run_tensor__(batch, timer)) :
+            results[index] = result
+        return results
+
+    # -----------------------------------------------------------------
+    def __run_tensor__(self, batch, timer) :
+        """Run and postprocess a preprocessed batch, the batch is released"""
+        try :
+            with timer.stage('predict') :
+                output = self.__predict_batch__(batch)
+
+            with timer.stage('postprocess') :
+                return self.model_scorer.postprocess_batch(output, batch, timer=timer)
+        finally :
+            self.model_scorer.release_image(batch)
+
+    # -----------------------------------------------------------------
+    def infer_frames(self, frames, timer = None) :
+        """Preprocess, run and postprocess several decoded BGR images
+
+        :returns list: a result per frame
+        """
+        timer = timer or StageTimer()
+
+        with timer.stage('preprocess') :
+            batch = self.model_scorer.preprocess_frames(frames, timer=timer)
+
+        return self.__run_tensor__(batch, timer)
+
+    # -----------------------------------------------------------------
+    def record_timings(self, timer) :
+        self.stage_histograms.record(timer)
+
+    # -----------------------------------------------------------------
+    def record_cache_hit(self, count = 1) :
+        with self._lock :
+            self.requests += count
+            self.cache_hits += count
+
+    # -----------------------------------------------------------------
+    @contextlib.contextmanager
+    def __admit__(self, timer, images) :
+        """Hold one of the concurrency slots of the model for a request
+        and count it; a batch request holds a single slot
+
+        :raises ModelBusy: if no slot became free within the timeout
+        """
+        if self._concurrency :
+            with timer.stage('concurrency_wait') :
+                acquired = self._concurrency.acquire(timeout=self.concurrency_timeout)
+            if not acquired :
+                with self._lock :
+                    self.rejected += 1
+                raise ModelBusy('model {} is busy'.format(self.name))
+
+        with self._lock :
+            self.requests += images
+            self.active += 1
+
+        start = time.perf_counter()
+        try :
+            yield
+        except Exception :
+            with self._lock :
+                self.errors += 1
+            raise
+        finally :
+            latency = time.perf_counter() - start
+            with self._lock :
+                self.active -= 1
+                self.calls += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+            if self._concurrency :
+                self._concurrency.release()
+
+    # -----------------------------------------------------------------
+    def __call__(self, image_bytes, timer = None) :
+        """Run inference on an encoded image within the concurrency limit
+        of the model
+
+        :raises ModelBusy: if no slot became free within the timeout
+        """
+        timer = timer or StageTimer()
+        with self.__admit__(timer, 1) :
+            return self.infer(image_bytes, timer)
+
+    # -----------------------------------------------------------------
+    def run_batch(self, list_of_bytes, timer = None) :
+        """Run inference on several encoded images within the concurrency
+        limit of the model
+
+        :raises ModelBusy: if no slot became free within the timeout
+        """
+        timer = timer or StageTimer()
+        with self.__admit__(timer, len(list_of_bytes)) :
+            return self.infer_batch(list_of_bytes, timer)
+
+    # -----------------------------------------------------------------
+    def run_frames(self, frames, timer = None) :
+        """Run inference on several decoded images within the concurrency
+        limit of the model
+
+        :raises ModelBusy: if no slot became free within the timeout
+        """
+        timer = timer or StageTimer()
+        with self.__admit__(timer, len(frames)) :
+            return self.infer_frames(frames, timer)
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        """Release the backend of the model, requests must have completed"""
+        self._closed.set()
+        self.backend.close()
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        with self._lock :
+            result = {
+                'requests' : self.requests,
+                'cache_hits' : self.cache_hits,
+                'errors' : self.errors,
+                'rejected' : self.rejected,
+                'active' : self.active,
+                'max_concurrency' : self.max_concurrency,
+                'mean_latency' : self.total_latency / self.calls if self.calls > 0 else None,
+                'max_latency' : self.max_latency,
+                'warmup_latency' : self.warmup_latency,
+                'ready' : self.ready,
+            }
+            if self.warmup_error is not None :
+                result['warmup_error'] = self.warmup_error
+
+        result['stages'] = self.stage_histograms.statistics()
+        result['backend'] = self.backend.statistics()
+        return result
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ModelRegistry(object) :
+
+    __shared_registry__ = None
+    __shared_lock__ = threading.Lock()
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def shared_registry(cls, config) :
+        """Return the registry for a configuration; the operations created
+        from the same configuration share its models, a reload with new
+        configuration creates new models
+
+        :param config dict: guardian configuration
+        """
+        with cls.__shared_lock__ :
+            if cls.__shared_registry__ is None or cls.__shared_registry__[0] is not config \
+               or cls.__shared_registry__[1].closed :
+                cls.__shared_registry__ = (config, cls(config))
+            return cls.__shared_registry__[1]
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def model_configurations(config) :
+        """Return one configuration per model, each with the [Model]
+        section replaced by the [Model] defaults merged with a [[Models]] entry
+        """
+        defaults = config.get('Model', {})
+        models = config.get('Models')
+        if not models :
+            return [ config ]
+
+        result = []
+        for model in models :
+            model_config = dict(config)
+            model_config['Model'] = dict(defaults, **model)
+            result.append(model_config)
+        return result
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        """The first model in the configuration is the default model
+
+        :param config dict: guardian configuration
+        """
+        self._models = dict()
+        self.default_model = None
+        self.closed = False
+        self._lock = threading.Lock()
+
+        for model_config in self.model_configurations(config) :
+            name = model_config['Model']['Name']
+            if name in self._models :
+                raise ValueError('duplicate model name {}'.format(name))
+
+            self._models[name] = InferenceModel(model_config)
+            if self.default_model is None :
+                self.default_model = name
+
+        logger.info('serving models %s, default %s', ', '.join(self._models), self.default_model)
+
+    # -----------------------------------------------------------------
+    def get_model(self, name = None) :
+        """Return the named model, or the default model if name is empty
+
+        :raises KeyError: if there is no model with the name
+        """
+        return self._models[name or self.default_model]
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        """Close every model; the operations created from the same
+        configuration share the registry, so only the first call closes
+        """
+        with self._lock :
+            if self.closed :
+                return
+            self.closed = True
+
+        for (name, model) in self._models.items() :
+            try :
+                model.close()
+            except Exception as e :
+                logger.warning('failed to close model %s; %s', name, e)
+
+    # -----------------------------------------------------------------
+    def ready(self) :
+        """True once every model has been warmed up"""
+        return all(model.ready for model in self._models.values())
+
+    # -----------------------------------------------------------------
+    def names(self) :
+        return list(self._models)
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        return { name : model.statistics() for (name, model) in self._models.items() }
@@ -0,0 +1,186 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the VideoInferenceOperation class, the handler for
+capabilities that authorize inference over the frames of a video clip
+stored in a key value state. The clip is written to a temporary file and
+decoded as a stream with cv2.VideoCapture; frames are sampled at the
+configured rate (the frames in between are skipped without decoding them
+into images) and run through the model in fixed size batches, so no more
+than one batch of decoded frames is held in memory.
+
+The result has the number of sampled frames, the count of each label over
+the sampled frames with the most frequent label, and, if enabled, the
+result of each sampled frame with its index and time in the clip.
+"""
+
+import collections
+import math
+import tempfile
+import threading
+
+import cv2
+
+from pdo.inference.operations.inference import InferenceOperation
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class VideoInferenceOperation(InferenceOperation) :
+    # -----------------------------------------------------------------
+    __schema__ = {
+        "type" : "object",
+        "properties" : {
+            "encryption_key" : { "type" : "string" },
+            "state_hash" : { "type" : "string" },
+            "video_key" : { "type" : "string" },
+            "model_name" : { "type" : "string" },
+        },
+        "required" : [ "encryption_key", "state_hash", "video_key" ],
+    }
+
+    # -----------------------------------------------------------------
+    def __init__(self, config) :
+        super().__init__(config)
+
+        video_config = config.get('Video', {})
+        self.sample_rate = float(video_config.get('SampleRate', 1.0))
+        self.batch_size = video_config.get('BatchSize', 8)
+        self.max_frames = video_config.get('MaxFrames', 300)
+        self.frame_results = video_config.get('FrameResults', True)
+
+        if self.sample_rate <= 0 or self.batch_size <= 0 :
+            raise ValueError('video sample rate and batch size must be positive')
+
+        # the sampling settings change the result so they are part of the cache key
+        self.sampling = {
+            'sample_rate' : self.sample_rate,
+            'max_frames' : self.max_frames,
+            'frame_results' : self.frame_results,
+        }
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.frames = 0
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        # the model statistics are reported by the do_inference operation
+        with self._lock :
+            return { 'requests' : self.requests, 'frames' : self.frames }
+
+    # -----------------------------------------------------------------
+    def __sample_frames__(self, model, capture, timer) :
+        """Decode the sampled frames of the clip and run them through the
+        model one batch at a time
+
+        :returns tuple: frames per second of the clip, list of (frame index, result)
+        """
+        # a clip without a frame rate has every frame sampled
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        if not fps or math.isnan(fps) or fps <= 0 :
+            fps = self.sample_rate
+        step = max(1, int(round(fps / self.sample_rate)))
+
+        results = []
+        frames = []
+        indices = []
+        index = 0
+        while len(results) + len(frames) < self.max_frames :
+            # grab advances the stream without converting the frame to an image
+            with timer.stage('video_decode') :
+                if index % step :
+                    (success, frame) = (capture.grab(), None)
+                else :
+                    (success, frame) = capture.read()
+            if not success :
+                break
+
+            if frame is not None :
+                frames.append(frame)
+                indices.append(index)
+                if len(frames) == self.batch_size :
+                    results.extend(zip(indices, model.run_frames(frames, timer)))
+                    (frames, indices) = ([], [])
+
+            index += 1
+
+        if frames :
+            results.extend(zip(indices, model.run_frames(frames, timer)))
+
+        return (fps, results)
+
+    # -----------------------------------------------------------------
+    def __process__(self, model, params, timer) :
+        encryption_key = params['encryption_key']
+        state_hash = params['state_hash']
+        video_key = params['video_key']
+
+        [video_bytes] = self.__read_inputs__(encryption_key, state_hash, [video_key], timer)
+
+        # the same clip with the same model and sampling has the same result
+        if self.result_cache :
+            with timer.stage('cache_lookup') :
+                cache_key = self.result_cache.make_key(video_bytes, dict(model.cache_context, video=self.sampling))
+                result = self.result_cache.get(cache_key)
+            if result is not None :
+                model.record_cache_hit()
+                return result
+
+        # VideoCapture reads from a file, the encoded clip is not kept in
+        # memory while the frames are processed
+        with tempfile.NamedTemporaryFile(prefix='video-') as video_file :
+            with timer.stage('video_write') :
+                video_file.write(video_bytes)
+                video_file.flush()
+            del video_bytes
+
+            capture = cv2.VideoCapture(video_file.name)
+            try :
+                if not capture.isOpened() :
+                    logger.warning('unable to open video %s', video_key)
+                    return None
+                (fps, frame_results) = self.__sample_frames__(model, capture, timer)
+            finally :
+                capture.release()
+
+        if not frame_results :
+            logger.warning('no frames decoded from video %s', video_key)
+            return None
+
+        with self._lock :
+            self.requests += 1
+            self.frames += len(frame_results)
+
+        result = { 'frames_sampled' : len(frame_results) }
+
+        labels = collections.Counter(r['image_class'] for (_, r) in frame_results if 'image_class' in r)
+        if labels :
+            result['labels'] = dict(labels.most_common())
+            result['image_class'] = labels.most_common(1)[0][0]
+
+        if self.frame_results :
+            result['frames'] = [
+                dict(r, frame=index, time=round(index / fps, 3)) for (index, r) in frame_results
+            ]
+
+        if self.result_cache :
+            with timer.stage('cache_store') :
+                self.result_cache.put(cache_key, result)
+
+        return result
@@ -12,13 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import json
 import logging
+import os
+import threading
 
 from pdo.contract import invocation_request
 from pdo.common.key_value import KeyValueStore
 import pdo.common.utility as putils
-import pdo.common.crypto as crypto
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
@@ -30,6 +32,8 @@ import pdo.exchange.plugins.token_object as token_object
 
 from pdo.contracts.guardian.common.guardian_service import GuardianServiceClient
 
+from pdo.inference.common.image_store import store_image_file
+
 __all__ = [
     'op_initialize',
     'op_get_verifying_key',
@@ -42,10 +46,15 @@ __all__ = [
     'op_escrow',
     'op_release',
     'op_claim',
-    'op_do_inference'
+    'op_do_inference',
+    'op_do_batch_inference',
+    'op_do_video_inference',
     'cmd_mint_tokens',
     'cmd_transfer_assets',
     'cmd_do_inference',
+    'cmd_do_batch_inference',
+    'cmd_do_video_inference',
+    'cmd_do_inference_batch',
     'do_inference_token',
     'do_inference_token_contract',
     'load_commands',
@@ -70,6 +79,62 @@ cmd_transfer_assets = token_object.cmd_transfer_assets
 
 logger = logging.getLogger(__name__)
 
+# contract invocations from concurrent inference requests are serialized,
+# including the update and commit of the contract state by the builder;
+# the rest of each request (block upload and guardian call) runs in parallel
+__contract_lock__ = threading.Lock()
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+def process_inference_capability(kv, capability, url, service_client = None) :
+    """Push the blocks of the key value store to the storage service of the
+    guardian and send it the capability; this does not use the contract so
+    it may run in parallel with other requests
+    """
+    service_client = service_client or GuardianServiceClient(url)
+
+    # push the KV store blocks to the storage service associated with the guardian
+    kv.sync_to_block_store(service_client)
+
+    return service_client.process_capability(**capability)
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_create_inference_capability(pcontract.contract_op_base) :
+    """op_create_inference_capability stores an image and has the contract
+    create the capability for the guardian to run inference on it
+
+    Returns the key value store with the image and the capability.
+    """
+
+    name = "create_inference_capability"
+    help = "create a capability for inference on an image"
+
+    @classmethod
+    def invoke(cls, state, session_params, image, search_path, model_name='', chunk_size=0, **kwargs) :
+        session_params['commit'] = False
+
+        # the image is passed to the store as bytes, large images in chunks
+        image_file = putils.find_file_in_path(image, search_path)
+        kv = KeyValueStore()
+        with kv :
+            store_image_file(kv, "__image__", image_file, chunk_size)
+
+        # send the request to the contract to create a capability for the guardian
+        params = {}
+        params['image_key'] = "__image__"
+        params['encryption_key'] = kv.encryption_key
+        params['state_hash'] = kv.hash_identity
+        if model_name :
+            params['model_name'] = model_name
+
+        message = invocation_request('do_inference', **params)
+        capability = pcontract_cmd.send_to_contract(state,  message, **session_params)
+        capability = json.loads(capability)
+
+        cls.log_invocation(message, capability)
+        return (kv, capability)
+
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
 class op_do_inference(pcontract.contract_op_base) :
@@ -93,33 +158,295 @@ class op_do_inference(pcontract.contract_op_base) :
             help='Directories to search for the data file',
             nargs='+', type=str, default=['.', './data'])
 
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Images larger than this many bytes are stored in chunks of this size, 1MiB if 0',
+            type=int, default=0)
+
         subparser.add_argument(
             '-u', '--url',
             help='URL for the guardian service',
             type=str, required=True)
 
     @classmethod
-    def invoke(cls, state, session_params, image, search_path, url, **kwargs) :
+    def invoke(cls, state, session_params, image, search_path, url, model_name='', chunk_size=0, service_client=None, **kwargs) :
+        (kv, capability) = op_create_inference_capability.invoke(
+            state, session_params, image, search_path, model_name=model_name, chunk_size=chunk_size)
+
+        # send the capability to the guardian, this returns a dictionary
+        return process_inference_capability(kv, capability, url, service_client)
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_do_inference(pcommand.contract_command_base) :
+    """cmd_inference implements the full end-to-end inference of an image using a openvino model
+
+    The specific inference operation depends on the model and the model script.
+    """
+    name = "do_inference"
+    help = "inference using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--image',
+            help='Filename of the image to use as inference input',
+            type=str, required=True)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data file',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Images larger than this many bytes are stored in chunks of this size, 1MiB if 0',
+            type=int, default=0)
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str)
+
+    @classmethod
+    def invoke(cls, state, context, image, search_path, url=None, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        if url is None :
+            guardian_context = context.get_context('data_guardian_context')
+            url = guardian_context['url']
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        result = pcontract.invoke_contract_op(
+            op_do_inference,
+            state, context, session,
+            image,
+            search_path,
+            url,
+            **kwargs)
+
+        cls.display(result)
+
+        return result
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_create_batch_inference_capability(pcontract.contract_op_base) :
+    """op_create_batch_inference_capability stores several images in one key
+    value store and has the contract create the capability for the guardian
+    to run inference on them
+
+    Returns the key value store, the capability and a map from the key of
+    each image to the name of the image file.
+    """
+
+    name = "create_batch_inference_capability"
+    help = "create a capability for inference on several images"
+
+    @classmethod
+    def invoke(cls, state, session_params, image, search_path, model_name='', chunk_size=0, **kwargs) :
         session_params['commit'] = False
 
-        image_file = putils.find_file_in_path(image, search_path)
-        with open(image_file, 'rb') as bf :
-            image_bytes = bf.read()
+        # store every image in the same key value store, one key per image
+        image_keys = dict()
+        kv = KeyValueStore()
+        with kv :
+            for (index, image_name) in enumerate(image) :
+                image_file = putils.find_file_in_path(image_name, search_path)
+                image_key = "__image_{0}__".format(index)
+                image_keys[image_key] = image_name
+                store_image_file(kv, image_key, image_file, chunk_size)
+
+        # send the request to the contract to create a capability for the guardian
+        params = {}
+        params['image_keys'] = list(image_keys)
+        params['encryption_key'] = kv.encryption_key
+        params['state_hash'] = kv.hash_identity
+        if model_name :
+            params['model_name'] = model_name
+
+        message = invocation_request('do_batch_inference', **params)
+        capability = pcontract_cmd.send_to_contract(state,  message, **session_params)
+        capability = json.loads(capability)
+
+        cls.log_invocation(message, capability)
+        return (kv, capability, image_keys)
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_do_batch_inference(pcontract.contract_op_base) :
+    """op_do_batch_inference runs inference on several images with a single capability
+
+    The images are stored in one key value store and the guardian returns the
+    result for each image, keyed by the name of the image file.
+    """
 
-        image_key = crypto.string_to_byte_array("__image__")
-        image_bytes = crypto.string_to_byte_array(image_bytes)
+    name = "do_batch_inference"
+    help = "inference on several images using openvino model"
 
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--image',
+            help='Filenames of the images to use as inference input',
+            nargs='+', type=str, required=True)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data files',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Images larger than this many bytes are stored in chunks of this size, 1MiB if 0',
+            type=int, default=0)
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str, required=True)
+
+    @classmethod
+    def invoke(cls, state, session_params, image, search_path, url, model_name='', chunk_size=0, service_client=None, **kwargs) :
+        (kv, capability, image_keys) = op_create_batch_inference_capability.invoke(
+            state, session_params, image, search_path, model_name=model_name, chunk_size=chunk_size)
+
+        # send the capability to the guardian and map the results back to the image names
+        result = process_inference_capability(kv, capability, url, service_client)
+        return { image_keys[key] : value for (key, value) in result['results'].items() }
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_do_batch_inference(pcommand.contract_command_base) :
+    """cmd_do_batch_inference runs inference on several images with a single capability
+    """
+    name = "do_batch_inference"
+    help = "inference on several images using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--image',
+            help='Filenames of the images to use as inference input',
+            nargs='+', type=str, required=True)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data files',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Images larger than this many bytes are stored in chunks of this size, 1MiB if 0',
+            type=int, default=0)
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str)
+
+    @classmethod
+    def invoke(cls, state, context, image, search_path, url=None, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        if url is None :
+            guardian_context = context.get_context('data_guardian_context')
+            url = guardian_context['url']
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        result = pcontract.invoke_contract_op(
+            op_do_batch_inference,
+            state, context, session,
+            image,
+            search_path,
+            url,
+            **kwargs)
+
+        cls.display(result)
+
+        return result
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_do_video_inference(pcontract.contract_op_base) :
+    """op_do_video_inference runs inference on the sampled frames of a video clip
+
+    The guardian returns the count of each label over the sampled frames and,
+    if it is configured to, the result for each sampled frame.
+    """
+
+    name = "do_video_inference"
+    help = "inference on the frames of a video using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--video',
+            help='Filename of the video clip to use as inference input',
+            type=str, required=True)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data file',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Videos larger than this many bytes are stored in chunks of this size, 1MiB if 0',
+            type=int, default=0)
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str, required=True)
+
+    @classmethod
+    def invoke(cls, state, session_params, video, search_path, url, model_name='', chunk_size=0, service_client=None, **kwargs) :
+        session_params['commit'] = False
+
+        video_file = putils.find_file_in_path(video, search_path)
         kv = KeyValueStore()
         with kv :
-            _ = kv.set(image_key, image_bytes, input_encoding='raw', output_encoding='raw')
+            store_image_file(kv, "__video__", video_file, chunk_size)
 
         # send the request to the contract to create a capability for the guardian
         params = {}
-        params['image_key'] = "__image__"
+        params['video_key'] = "__video__"
         params['encryption_key'] = kv.encryption_key
         params['state_hash'] = kv.hash_identity
+        if model_name :
+            params['model_name'] = model_name
 
-        message = invocation_request('do_inference', **params)
+        message = invocation_request('do_video_inference', **params)
         capability = pcontract_cmd.send_to_contract(state,  message, **session_params)
 
         capability = json.loads(capability)
@@ -127,7 +454,7 @@ class op_do_inference(pcontract.contract_op_base) :
         cls.log_invocation(message, capability)
 
         # process the capability that was created
-        service_client = GuardianServiceClient(url)
+        service_client = service_client or GuardianServiceClient(url)
 
         # push the KV store blocks to the storage service associated with the guardian
         kv.sync_to_block_store(service_client)
@@ -138,19 +465,17 @@ class op_do_inference(pcontract.contract_op_base) :
 
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
-class cmd_do_inference(pcommand.contract_command_base) :
-    """cmd_inference implements the full end-to-end inference of an image using a openvino model
-
-    The specific inference operation depends on the model and the model script.
+class cmd_do_video_inference(pcommand.contract_command_base) :
+    """cmd_do_video_inference runs inference on the sampled frames of a video clip
     """
-    name = "do_inference"
-    help = "inference using openvino model"
+    name = "do_video_inference"
+    help = "inference on the frames of a video using openvino model"
 
     @classmethod
     def add_arguments(cls, subparser) :
         subparser.add_argument(
-            '--image',
-            help='Filename of the image to use as inference input',
+            '--video',
+            help='Filename of the video clip to use as inference input',
             type=str, required=True)
 
         subparser.add_argument(
@@ -158,13 +483,23 @@ class cmd_do_inference(pcommand.contract_command_base) :
             help='Directories to search for the data file',
             nargs='+', type=str, default=['.', './data'])
 
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Videos larger than this many bytes are stored in chunks of this size, 1MiB if 0',
+            type=int, default=0)
+
         subparser.add_argument(
             '-u', '--url',
             help='URL for the guardian service',
             type=str)
 
     @classmethod
-    def invoke(cls, state, context, image, search_path, url=None, **kwargs) :
+    def invoke(cls, state, context, video, search_path, url=None, **kwargs) :
         save_file = pcontract_cmd.get_contract_from_context(state, context)
         if not save_file :
             raise ValueError("token has not been created")
@@ -175,9 +510,9 @@ class cmd_do_inference(pcommand.contract_command_base) :
 
         session = pbuilder.SessionParameters(save_file=save_file)
         result = pcontract.invoke_contract_op(
-            op_do_inference,
+            op_do_video_inference,
             state, context, session,
-            image,
+            video,
             search_path,
             url,
             **kwargs)
@@ -186,6 +521,202 @@ class cmd_do_inference(pcommand.contract_command_base) :
 
         return result
 
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_do_inference_batch(pcommand.contract_command_base) :
+    """cmd_do_inference_batch runs inference on every image in a directory
+
+    Images are read from the directory as they are needed and processed by
+    a bounded number of concurrent requests; each request invokes the
+    contract to create its capability (invocations are serialized), then
+    uploads its blocks and calls the guardian, so these steps overlap
+    across requests. Results are appended
+    to a JSON lines file, one line per image, and images that already have
+    a result in the file are skipped so an interrupted run can be resumed.
+    """
+    name = "do_inference_batch"
+    help = "inference on every image in a directory using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--dir',
+            help='Directory that contains the images',
+            dest='directory', type=str, required=True)
+
+        subparser.add_argument(
+            '--output',
+            help='JSON lines file for the results, appended to when resuming',
+            type=str, required=True)
+
+        subparser.add_argument(
+            '--extensions',
+            help='Extensions of the files to process',
+            nargs='+', type=str, default=['jpg', 'jpeg', 'png'])
+
+        subparser.add_argument(
+            '--concurrency',
+            help='Number of requests in progress at once',
+            type=int, default=4)
+
+        subparser.add_argument(
+            '--images-per-request',
+            help='Number of images covered by each capability, more than 1 uses do_batch_inference',
+            type=int, default=1)
+
+        subparser.add_argument(
+            '--model-name',
+            help='Name of the model to use, the default model of the guardian if not set',
+            type=str, default='')
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str)
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __image_record__(image, result) :
+        """Return the output record for an image, a missing result or a
+        result that reports an error is written as an error so that the
+        image is retried when the run is resumed
+        """
+        if result is None :
+            return { 'image' : image, 'error' : 'no result for image' }
+        if isinstance(result, dict) and 'error' in result :
+            return { 'image' : image, 'error' : result['error'] }
+        return { 'image' : image, 'result' : result }
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __completed_images__(output) :
+        """Return the images with a result in the output file, lines with
+        errors and a line cut short by an interruption are ignored
+        """
+        completed = set()
+        if not os.path.exists(output) :
+            return completed
+
+        with open(output, 'r') as f :
+            for line in f :
+                try :
+                    record = json.loads(line)
+                except ValueError :
+                    continue
+                result = record.get('result')
+                if 'error' in record or result is None :
+                    continue
+                if isinstance(result, dict) and 'error' in result :
+                    continue
+                completed.add(record['image'])
+
+        # end a line cut short by an interruption so the next record
+        # starts on its own line
+        with open(output, 'rb') as f :
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0 :
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n' :
+                    with open(output, 'a') as af :
+                        af.write('\n')
+
+        return completed
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __image_groups__(directory, extensions, completed, group_size) :
+        """Generate lists of at most group_size image names from the
+        directory, without listing the whole directory first
+        """
+        suffixes = tuple('.' + e.lower().lstrip('.') for e in extensions)
+
+        group = []
+        with os.scandir(directory) as entries :
+            for entry in entries :
+                if not entry.is_file() or not entry.name.lower().endswith(suffixes) :
+                    continue
+                if entry.name in completed :
+                    continue
+
+                group.append(entry.name)
+                if len(group) == group_size :
+                    yield group
+                    group = []
+
+        if group :
+            yield group
+
+    @classmethod
+    def invoke(cls, state, context, directory, output, extensions=['jpg', 'jpeg', 'png'], concurrency=4,
+               images_per_request=1, model_name='', url=None, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        if url is None :
+            guardian_context = context.get_context('data_guardian_context')
+            url = guardian_context['url']
+
+        if concurrency < 1 or images_per_request < 1 :
+            raise ValueError("concurrency and images per request must be at least 1")
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        service_client = GuardianServiceClient(url)
+
+        completed = cls.__completed_images__(output)
+        if completed :
+            logger.info('resuming, %d images already have results', len(completed))
+
+        output_lock = threading.Lock()
+        counts = { 'completed' : 0, 'failed' : 0, 'skipped' : len(completed) }
+
+        def process_group(output_file, images) :
+            try :
+                if images_per_request == 1 :
+                    with __contract_lock__ :
+                        (kv, capability) = pcontract.invoke_contract_op(
+                            op_create_inference_capability,
+                            state, context, session,
+                            images[0], [directory],
+                            model_name=model_name)
+                    result = process_inference_capability(kv, capability, url, service_client)
+                    records = [ cls.__image_record__(images[0], result) ]
+                else :
+                    with __contract_lock__ :
+                        (kv, capability, image_keys) = pcontract.invoke_contract_op(
+                            op_create_batch_inference_capability,
+                            state, context, session,
+                            images, [directory],
+                            model_name=model_name)
+                    result = process_inference_capability(kv, capability, url, service_client)
+                    results = { image_keys[key] : value for (key, value) in result['results'].items() }
+                    records = [ cls.__image_record__(image, results.get(image)) for image in images ]
+            except Exception as e :
+                logger.warning('inference failed for %s; %s', ', '.join(images), e)
+                records = [ { 'image' : image, 'error' : str(e) } for image in images ]
+
+            with output_lock :
+                for record in records :
+                    output_file.write(json.dumps(record) + '\n')
+                    counts['failed' if 'error' in record else 'completed'] += 1
+                output_file.flush()
+
+        # bound the requests waiting for a worker so that images are read
+        # from the directory only as fast as they are processed
+        pending = threading.BoundedSemaphore(2 * concurrency)
+
+        with open(output, 'a') as output_file, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor :
+            for images in cls.__image_groups__(directory, extensions, completed, images_per_request) :
+                pending.acquire()
+                future = executor.submit(process_group, output_file, images)
+                future.add_done_callback(lambda f : pending.release())
+
+        cls.display('{0} images completed, {1} failed, {2} skipped'.format(
+            counts['completed'], counts['failed'], counts['skipped']))
+
+        return counts
+
 ## -----------------------------------------------------------------
 ## Create the generic, shell independent version of the aggregate command
 ## -----------------------------------------------------------------
@@ -202,6 +733,8 @@ __operations__ = [
     op_release,
     op_claim,
     op_do_inference,
+    op_do_batch_inference,
+    op_do_video_inference,
 ]
 
 do_inference_token_contract = pcontract.create_shell_command('inference_token_contract', __operations__)
@@ -210,6 +743,9 @@ __commands__ = [
     cmd_mint_tokens,
     cmd_transfer_assets,
     cmd_do_inference,
+    cmd_do_batch_inference,
+    cmd_do_video_inference,
+    cmd_do_inference_batch,
 ]
 
 do_inference_token = pcommand.create_shell_command('inference_token', __commands__)
@@ -0,0 +1,288 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmarks for the inference request path. Run with
+
+    python -m pdo.inference.scripts.benchmark <benchmark> [options]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def __time_operation__(operation, iterations) :
+    """Run the operation and return the per iteration times in microseconds"""
+    operation()
+    samples = np.empty(iterations)
+    for i in range(iterations) :
+        start = time.perf_counter()
+        operation()
+        samples[i] = (time.perf_counter() - start) * 1.0e6
+    return samples
+
+# -----------------------------------------------------------------
+def __report__(name, samples) :
+    print('{0:<32} mean {1:10.1f} us  p50 {2:10.1f} us  p99 {3:10.1f} us'.format(
+        name, samples.mean(), np.percentile(samples, 50), np.percentile(samples, 99)))
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def benchmark_tensor_codec(options) :
+    """Serialization of an input tensor to a PredictRequest and decoding
+    of the corresponding output with each available codec
+    """
+    from pdo.inference.common.tensor_codec import tensor_codec_map
+
+    shape = tuple(options.shape)
+    tensor = (np.random.random_sample(shape) * 255).astype(options.dtype)
+
+    for codec_name in options.codec :
+        try :
+            codec = tensor_codec_map[codec_name]()
+            (predict_pb2, _) = codec.serving_apis()
+        except ImportError as e :
+            print('{0:<32} not available; {1}'.format(codec_name, e))
+            continue
+
+        def encode() :
+            request = predict_pb2.PredictRequest()
+            request.model_spec.name = 'benchmark'
+            codec.encode(tensor, request.inputs['input'])
+            return request.SerializeToString()
+
+        request_bytes = encode()
+        response = predict_pb2.PredictResponse()
+        codec.encode(tensor, response.outputs['output'])
+        response_bytes = response.SerializeToString()
+
+        def decode() :
+            response = predict_pb2.PredictResponse()
+            response.ParseFromString(response_bytes)
+            return codec.decode(response.outputs['output'])
+
+        assert np.array_equal(decode(), tensor)
+
+        print('{0} codec, {1} shape {2}, {3} request bytes'.format(codec_name, options.dtype, shape, len(request_bytes)))
+        __report__('  encode + serialize', __time_operation__(encode, options.iterations))
+        __report__('  parse + decode', __time_operation__(decode, options.iterations))
+
+# -----------------------------------------------------------------
+def __peak_allocation__(operation) :
+    """Return the peak memory in bytes traced by tracemalloc (numpy
+    buffers are traced, OpenCV allocations are not) during the operation
+    """
+    tracemalloc.start()
+    try :
+        tracemalloc.reset_peak()
+        (start, _) = tracemalloc.get_traced_memory()
+        operation()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally :
+        tracemalloc.stop()
+    return peak - start
+
+# -----------------------------------------------------------------
+def __legacy_preprocess__(image_bytes, size, rgb_image) :
+    """The ImageClassification preprocessing before PreprocessEngine"""
+    import cv2
+    from pdo.inference.common.utility import CropResize
+
+    img = np.frombuffer(image_bytes, dtype=np.uint8)
+    img = cv2.imdecode(img, cv2.IMREAD_COLOR)
+    img = CropResize(img, size, size)
+    img = img.astype('float32')
+    if rgb_image:
+        img = img[:, :, [2, 1, 0]]
+    img = img.transpose(2,0,1).reshape(1,3,size,size)
+    return img
+
+# -----------------------------------------------------------------
+def __benchmark_images__(options) :
+    """Encoded test images: the files given on the command line, or the
+    zebra_wiki.jpg sample and a 12MP image made from it
+    """
+    import cv2
+
+    if options.image :
+        return [ (os.path.basename(f), open(f, 'rb').read()) for f in options.image ]
+
+    sample = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data', 'zebra_wiki.jpg')
+    sample_bytes = open(sample, 'rb').read()
+
+    img = cv2.imdecode(np.frombuffer(sample_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    (_, large) = cv2.imencode('.jpg', cv2.resize(img, (4000, 3000), interpolation=cv2.INTER_CUBIC))
+
+    return [ ('zebra_wiki.jpg', sample_bytes), ('12MP (4000x3000)', large.tobytes()) ]
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def benchmark_preprocess(options) :
+    """Throughput and numpy allocations of the image classification
+    preprocessing before and after PreprocessEngine; reduced decode
+    changes the field of view of the crop so its output is not compared
+    """
+    from pdo.inference.common.preprocess import PreprocessEngine
+
+    size = options.size
+    rgb_image = options.rgb
+    engine = PreprocessEngine(size, rgb_image)
+    reduced_engine = PreprocessEngine(size, rgb_image, reduced_decode=True)
+
+    def engine_preprocess(engine, image_bytes) :
+        tensor = engine.process(image_bytes)
+        engine.release(tensor)
+        return tensor
+
+    for (name, image_bytes) in __benchmark_images__(options) :
+        difference = np.abs(__legacy_preprocess__(image_bytes, size, rgb_image) - engine.process(image_bytes)).max()
+        print('{0}, {1} bytes, max difference {2}'.format(name, len(image_bytes), difference))
+
+        operations = [
+            ('legacy', lambda : __legacy_preprocess__(image_bytes, size, rgb_image)),
+            ('engine', lambda : engine_preprocess(engine, image_bytes)),
+            ('engine, reduced decode', lambda : engine_preprocess(reduced_engine, image_bytes)),
+        ]
+        for (label, operation) in operations :
+            samples = __time_operation__(operation, options.iterations)
+            peak = __peak_allocation__(operation)
+            __report__('  {0}'.format(label), samples)
+            print('{0:<32} {1:10.1f} images/s  peak numpy allocation {2:10.1f} KiB'.format(
+                '', 1.0e6 / samples.mean(), peak / 1024.0))
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def __upload_store__() :
+    """A KeyValueStore if the PDO client libraries are installed, or a
+    store that discards the values so that only the client side cost of
+    preparing them is measured
+    """
+    try :
+        from pdo.common.key_value import KeyValueStore
+        return (KeyValueStore(), 'KeyValueStore')
+    except Exception :
+        pass
+
+    class DiscardStore(object) :
+        def __enter__(self) : return self
+        def __exit__(self, *args) : pass
+        def set(self, key, value, **kwargs) : return True
+
+    return (DiscardStore(), 'values only, PDO client not available')
+
+# -----------------------------------------------------------------
+def __legacy_upload__(kv, image_file, chunk_size) :
+    """The op_do_inference upload before image_store"""
+    try :
+        from pdo.common.crypto import string_to_byte_array
+    except ImportError :
+        string_to_byte_array = tuple
+
+    with open(image_file, 'rb') as bf :
+        image_bytes = bf.read()
+
+    image_key = string_to_byte_array(b'__image__')
+    image_bytes = string_to_byte_array(image_bytes)
+    with kv :
+        _ = kv.set(image_key, image_bytes, input_encoding='raw', output_encoding='raw')
+
+# -----------------------------------------------------------------
+def __chunked_upload__(kv, image_file, chunk_size) :
+    from pdo.inference.common.image_store import store_image_file
+    with kv :
+        store_image_file(kv, '__image__', image_file, chunk_size)
+
+# -----------------------------------------------------------------
+def __upload_worker__(upload, image_file, chunk_size, results) :
+    """Run one upload in a fresh process and report the growth of the
+    peak resident set size (ru_maxrss is in KiB on Linux)
+    """
+    import resource
+
+    (kv, store_name) = __upload_store__()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    upload(kv, image_file, chunk_size)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((store_name, peak - baseline))
+
+# -----------------------------------------------------------------
+def benchmark_upload(options) :
+    """Peak resident memory of storing an image in a key value store
+    with the original and the chunked upload; each upload runs in a new
+    process so that the peaks do not hide each other
+    """
+    import multiprocessing
+    import tempfile
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory :
+        image_file = options.image
+        if image_file is None :
+            image_file = os.path.join(directory, 'upload.bin')
+            with open(image_file, 'wb') as fp :
+                fp.write(os.urandom(options.size * 1024 * 1024))
+
+        print('{0} bytes, chunk size {1}'.format(os.path.getsize(image_file), options.chunk_size))
+        for (label, upload) in [ ('legacy', __legacy_upload__), ('chunked', __chunked_upload__) ] :
+            results = context.Queue()
+            worker = context.Process(target=__upload_worker__, args=(upload, image_file, options.chunk_size, results))
+            worker.start()
+            (store_name, growth) = results.get()
+            worker.join()
+            print('{0:<32} peak RSS growth {1:10.1f} MiB  ({2})'.format('  ' + label, growth / 1024.0, store_name))
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def Main() :
+    parser = argparse.ArgumentParser(description='benchmarks for the inference request path')
+    parser.add_argument('--iterations', help='number of timed iterations', type=int, default=1000)
+
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    codec_parser = subparsers.add_parser('tensor_codec', help='tensor serialization')
+    codec_parser.add_argument('--shape', help='input tensor shape', type=int, nargs='+', default=[1, 3, 224, 224])
+    codec_parser.add_argument('--codec', help='codecs to compare', nargs='+', default=['numpy', 'tensorflow'])
+    codec_parser.add_argument('--dtype', help='input tensor element type', choices=['float32', 'uint8'], default='float32')
+    codec_parser.set_defaults(command=benchmark_tensor_codec)
+
+    preprocess_parser = subparsers.add_parser('preprocess', help='image classification preprocessing')
+    preprocess_parser.add_argument('--image', help='encoded images to use instead of the samples', nargs='+')
+    preprocess_parser.add_argument('--size', help='model input size', type=int, default=224)
+    preprocess_parser.add_argument('--rgb', help='convert to RGB channel order', action='store_true')
+    preprocess_parser.set_defaults(command=benchmark_preprocess)
+
+    upload_parser = subparsers.add_parser('upload', help='storing an image for an inference request')
+    upload_parser.add_argument('--image', help='file to upload instead of random data')
+    upload_parser.add_argument('--size', help='size of the random data in MiB', type=int, default=20)
+    upload_parser.add_argument('--chunk-size', help='size of the chunks in bytes', type=int, default=1024 * 1024)
+    upload_parser.set_defaults(command=benchmark_upload)
+
+    options = parser.parse_args()
+    options.command(options)
+    sys.exit(0)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+if __name__ == '__main__' :
+    Main()
@@ -0,0 +1,131 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A stand-in for the OpenVINO model server's grpc prediction service so the
+guardian can be exercised without OVMS. The stub accepts any input tensor
+and returns a classification style output of shape (batch, classes); the
+class for each input is derived from the input data so results are
+repeatable. Latency and failures can be injected to exercise batching,
+load balancing and endpoint ejection. Run with
+
+    python -m pdo.inference.scripts.stub_ovms --port 9000
+"""
+
+import argparse
+import random
+import sys
+import time
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+from pdo.inference.common.tensor_codec import NumpyTensorCodec
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StubPredictionService(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, predict_pb2, output_name, classes, latency, fail_rate) :
+        self.predict_pb2 = predict_pb2
+        self.output_name = output_name
+        self.classes = classes
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.codec = NumpyTensorCodec()
+
+    # -----------------------------------------------------------------
+    def Predict(self, request, context) :
+        if self.fail_rate and random.random() < self.fail_rate :
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'injected failure')
+
+        if len(request.inputs) != 1 :
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'expected a single input tensor')
+
+        tensor = self.codec.decode(next(iter(request.inputs.values())))
+        batch = tensor.reshape(tensor.shape[0], -1) if tensor.ndim > 1 else tensor.reshape(1, -1)
+
+        labels = np.abs(batch.astype(np.float64).sum(axis=1)).astype(np.int64) % self.classes
+        output = np.zeros((batch.shape[0], self.classes), dtype=np.float32)
+        output[np.arange(batch.shape[0]), labels] = 1.0
+
+        if self.latency :
+            time.sleep(self.latency)
+
+        response = self.predict_pb2.PredictResponse()
+        response.model_spec.name = request.model_spec.name
+        self.codec.encode(output, response.outputs[self.output_name])
+        return response
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def StartStubServer(host, port, output_name = '1463', classes = 1000, latency = 0.0, fail_rate = 0.0, workers = 16) :
+    """Start the stub server and return the grpc server and the bound port"""
+    (predict_pb2, prediction_service_pb2_grpc) = NumpyTensorCodec().serving_apis()
+
+    service = StubPredictionService(predict_pb2, output_name, classes, latency, fail_rate)
+    handler = grpc.method_handlers_generic_handler('tensorflow.serving.PredictionService', {
+        'Predict' : grpc.unary_unary_rpc_method_handler(
+            service.Predict,
+            request_deserializer=predict_pb2.PredictRequest.FromString,
+            response_serializer=predict_pb2.PredictResponse.SerializeToString),
+    })
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    server.add_generic_rpc_handlers((handler,))
+    bound_port = server.add_insecure_port('{}:{}'.format(host, port))
+    server.start()
+    return (server, bound_port)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def Main() :
+    parser = argparse.ArgumentParser(description='stub OVMS grpc prediction server')
+    parser.add_argument('--host', help='interface to listen on', default='localhost')
+    parser.add_argument('--port', help='port to listen on', type=int, default=9000)
+    parser.add_argument('--output-name', help='name of the output tensor', default='1463')
+    parser.add_argument('--classes', help='number of classes in the output', type=int, default=1000)
+    parser.add_argument('--latency-ms', help='time to spend on each predict', type=float, default=0.0)
+    parser.add_argument('--fail-rate', help='fraction of predicts that fail with UNAVAILABLE', type=float, default=0.0)
+    parser.add_argument('--workers', help='number of server threads', type=int, default=16)
+    parser.add_argument('--loglevel', help='Logging level', default='INFO')
+
+    options = parser.parse_args()
+    logging.basicConfig(level=options.loglevel.upper())
+
+    (server, port) = StartStubServer(
+        options.host, options.port,
+        output_name=options.output_name,
+        classes=options.classes,
+        latency=options.latency_ms / 1000.0,
+        fail_rate=options.fail_rate,
+        workers=options.workers)
+
+    logger.info('stub OVMS listening on %s:%s', options.host, port)
+    try :
+        server.wait_for_termination()
+    except KeyboardInterrupt :
+        server.stop(0)
+
+    sys.exit(0)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+if __name__ == '__main__' :
+    Main()
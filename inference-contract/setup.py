@@ -80,12 +80,18 @@ setup(
     install_requires = [
         'numpy==1.24.4',
         'opencv-python>=4.6.0',
-        'tensorflow-serving-api==2.11.0',
+        'ovmsclient>=2022.3',
         'pdo-client>=' + pdo_client_version,
         'pdo-common-library>=' + pdo_client_version,
         'pdo-contracts>=' + pdo_contracts_version,
         'pdo-exchange>=' + pdo_contracts_version,
     ],
+    # the tensorflow codec uses the tensorflow_serving protos, which import
+    # TensorFlow; the default numpy codec only needs ovmsclient
+    extras_require = {
+        'tensorflow' : [ 'tensorflow-serving-api==2.11.0' ],
+        'lmdb' : [ 'lmdb' ],
+    },
     entry_points = {
         'console_scripts' : [
            'inference_token=pdo.inference.scripts.scripts:inference_token',
@@ -0,0 +1,143 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for combining, splitting and carrying inputs in the micro-batcher.
+Run with
+
+    python -m pytest test/test_batcher.py
+"""
+
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from pdo.inference.common.batcher import MicroBatcher
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class RecordingPredict(object) :
+    """Doubles the batch and records the number of rows of each batch
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, exception = None) :
+        self.exception = exception
+        self.batches = []
+
+    # -----------------------------------------------------------------
+    def __call__(self, batch) :
+        self.batches.append(batch.shape[0])
+        future = concurrent.futures.Future()
+        if self.exception is not None :
+            future.set_exception(self.exception)
+        else :
+            future.set_result(batch * 2)
+        return future
+
+# -----------------------------------------------------------------
+def inputs(*rows) :
+    start = 0
+    tensors = []
+    for count in rows :
+        tensors.append(np.arange(start, start + count, dtype=np.float32).reshape(count, 1))
+        start += count
+    return tensors
+
+# -----------------------------------------------------------------
+def test_split_and_carry() :
+    predict = RecordingPredict()
+    batcher = MicroBatcher(predict, max_batch_size=4, max_batch_delay=0.05)
+
+    tensors = inputs(2, 1, 3, 1)
+    outputs = batcher.submit_all(tensors)
+
+    # the third input would overflow the first batch so it starts the next one
+    assert predict.batches == [ 3, 4 ]
+    for (tensor, output) in zip(tensors, outputs) :
+        assert np.array_equal(output, tensor * 2)
+
+# -----------------------------------------------------------------
+def test_concurrent_submit() :
+    predict = RecordingPredict()
+    batcher = MicroBatcher(predict, max_batch_size=8, max_batch_delay=0.2)
+
+    tensors = inputs(*([1] * 6))
+    outputs = [ None ] * len(tensors)
+    def submit(index) :
+        outputs[index] = batcher.submit(tensors[index])
+
+    threads = [ threading.Thread(target=submit, args=(i,)) for i in range(len(tensors)) ]
+    for thread in threads :
+        thread.start()
+    for thread in threads :
+        thread.join()
+
+    assert sum(predict.batches) == len(tensors)
+    assert len(predict.batches) < len(tensors)
+    for (tensor, output) in zip(tensors, outputs) :
+        assert np.array_equal(output, tensor * 2)
+
+# -----------------------------------------------------------------
+def test_custom_split_output() :
+    # the model returns one flat array of scores for the whole batch
+    def predict(batch) :
+        future = concurrent.futures.Future()
+        future.set_result((batch * 2).reshape(-1))
+        return future
+
+    split_output = lambda output, rows : np.split(output, np.cumsum(rows)[:-1])
+    batcher = MicroBatcher(predict, max_batch_size=4, max_batch_delay=0.05, split_output=split_output)
+
+    outputs = batcher.submit_all(inputs(1, 3))
+    assert [ o.tolist() for o in outputs ] == [ [ 0.0 ], [ 2.0, 4.0, 6.0 ] ]
+
+# -----------------------------------------------------------------
+def test_predict_failure() :
+    batcher = MicroBatcher(RecordingPredict(RuntimeError('predict failed')), max_batch_size=4, max_batch_delay=0.05)
+    with pytest.raises(RuntimeError) :
+        batcher.submit_all(inputs(1, 1))
+
+    def raise_now(batch) :
+        raise ValueError('bad batch')
+
+    # an exception from starting the predict is also returned to every caller
+    batcher = MicroBatcher(raise_now, max_batch_size=4, max_batch_delay=0.05)
+    with pytest.raises(ValueError) :
+        batcher.submit(inputs(1)[0])
+
+    # and the batcher continues to accept inputs
+    batcher.predict = RecordingPredict()
+    assert np.array_equal(batcher.submit(inputs(1)[0]), [ [ 0.0 ] ])
+
+# -----------------------------------------------------------------
+def test_idle_worker_exits() :
+    batcher = MicroBatcher(RecordingPredict(), max_batch_size=2, max_batch_delay=0.0, idle_timeout=0.05)
+    batcher.submit(inputs(1)[0])
+
+    deadline = time.monotonic() + 5
+    while batcher._worker is not None and time.monotonic() < deadline :
+        time.sleep(0.01)
+    assert batcher._worker is None
+
+    # a new input starts another worker
+    assert np.array_equal(batcher.submit(inputs(2)[0]), [ [ 0.0 ], [ 2.0 ] ])
+
+# -----------------------------------------------------------------
+def test_invalid_batch_size() :
+    with pytest.raises(ValueError) :
+        MicroBatcher(RecordingPredict(), max_batch_size=0, max_batch_delay=0.0)
@@ -0,0 +1,109 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the models of the inference guardian with a stub backend that
+can be made to fail. Run with
+
+    python -m pytest test/test_model_registry.py
+"""
+
+import concurrent.futures
+import time
+
+import numpy as np
+import pytest
+
+import pdo.inference.operations.model_registry as model_registry
+from pdo.inference.operations.model_registry import ModelRegistry
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StubClassificationBackend(object) :
+    """Returns 1000 class scores per image, the first failures predicts
+    raise as if the model server were not available
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, failures = 0) :
+        self.failures = failures
+        self.closed = False
+
+    # -----------------------------------------------------------------
+    def predict_future(self, batch) :
+        future = concurrent.futures.Future()
+        if self.failures > 0 :
+            self.failures -= 1
+            future.set_exception(RuntimeError('model server unavailable'))
+        else :
+            future.set_result(np.zeros((len(batch), 1000), dtype=np.float32))
+        return future
+
+    # -----------------------------------------------------------------
+    def predict(self, batch) :
+        return self.predict_future(batch).result()
+
+    # -----------------------------------------------------------------
+    def close(self) :
+        self.closed = True
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        return {}
+
+# -----------------------------------------------------------------
+def create_registry(monkeypatch, failures, **model_settings) :
+    backend = StubClassificationBackend(failures)
+    monkeypatch.setattr(model_registry, 'create_inference_backend', lambda config : backend)
+
+    model = dict(Name='stub', ScoringScriptModule='ImageClassification',
+                 InputImageCropSize=32, InputImageIsRGB=True, **model_settings)
+    return (ModelRegistry({ 'Model' : model }), backend)
+
+# -----------------------------------------------------------------
+def test_warmup(monkeypatch) :
+    (registry, backend) = create_registry(monkeypatch, 0)
+    model = registry.get_model()
+
+    assert registry.ready()
+    assert model.statistics()['ready'] is True
+    assert 1 in model.warmup_latency
+
+    registry.close()
+    assert backend.closed
+
+# -----------------------------------------------------------------
+def test_failed_warmup_is_not_ready(monkeypatch) :
+    (registry, backend) = create_registry(monkeypatch, 1, WarmupRetrySeconds=0.05)
+    model = registry.get_model()
+
+    assert not registry.ready()
+    statistics = model.statistics()
+    assert statistics['ready'] is False
+    assert 'unavailable' in statistics['warmup_error']
+
+    # warmup is retried in the background until it succeeds
+    deadline = time.monotonic() + 5
+    while not registry.ready() and time.monotonic() < deadline :
+        time.sleep(0.01)
+
+    assert registry.ready()
+    assert 'warmup_error' not in model.statistics()
+    registry.close()
+
+# -----------------------------------------------------------------
+def test_warmup_disabled(monkeypatch) :
+    (registry, backend) = create_registry(monkeypatch, 1, WarmupRequests=0)
+    assert registry.ready()
+    registry.close()
@@ -0,0 +1,108 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for batched SSD object detection. The backend returns DetectionOutput
+rows for the whole batch in one (1, 1, N, 7) array with image ids local to
+each predict, as the Open Model Zoo SSD models do, so the results are only
+correct if the outputs of batched predicts are split and joined by image id.
+Run with
+
+    python -m pytest test/test_object_detection.py
+"""
+
+import concurrent.futures
+
+import numpy as np
+
+from pdo.inference.common.batcher import MicroBatcher
+from pdo.inference.model_scoring_scripts.object_detection import ObjectDetection
+from pdo.inference.operations.model_registry import InferenceModel
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StubSSDBackend(object) :
+    """Detects one object per image whose label is the value of the input
+    row, plus a padding row at the end of the output
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self) :
+        self.batch_sizes = []
+
+    # -----------------------------------------------------------------
+    def predict_future(self, batch) :
+        self.batch_sizes.append(len(batch))
+
+        rows = [ [ i, float(batch[i, 0]), 0.9, 0.1, 0.1, 0.5, 0.5 ] for i in range(len(batch)) ]
+        rows.append([ -1, 0, 0, 0, 0, 0, 0 ])
+
+        future = concurrent.futures.Future()
+        future.set_result(np.array(rows, dtype=np.float32).reshape(1, 1, -1, 7))
+        return future
+
+    # -----------------------------------------------------------------
+    def predict(self, batch) :
+        return self.predict_future(batch).result()
+
+# -----------------------------------------------------------------
+def create_model(max_batch_size, max_batch_delay = 0.0) :
+    config = { 'Model' : { 'InputImageCropSize' : 32, 'InputImageIsRGB' : True, 'DetectionOutputFormat' : 'ssd' } }
+
+    # the model is assembled from its parts, without a model server
+    model = InferenceModel.__new__(InferenceModel)
+    model.model_scorer = ObjectDetection(config)
+    model.backend = StubSSDBackend()
+    model.batcher = MicroBatcher(model.backend.predict_future, max_batch_size, max_batch_delay, 2,
+                                 split_output=model.model_scorer.split_batch_output)
+    return model
+
+# -----------------------------------------------------------------
+def detected_labels(results) :
+    return [ [ d['label'] for d in result['detections'] ] for result in results ]
+
+# -----------------------------------------------------------------
+def test_multiple_chunk_batch() :
+    model = create_model(3)
+    batch = np.arange(7, dtype=np.float32).reshape(7, 1)
+
+    output = model.__predict_batch__(batch)
+    results = model.model_scorer.postprocess_batch(output, batch)
+
+    assert model.backend.batch_sizes == [ 3, 3, 1 ]
+    assert detected_labels(results) == [ [ i ] for i in range(7) ]
+
+# -----------------------------------------------------------------
+def test_unbatched_predicts() :
+    model = create_model(1)
+    model.batcher = None
+    batch = np.arange(4, dtype=np.float32).reshape(4, 1)
+
+    output = model.__predict_batch__(batch)
+    results = model.model_scorer.postprocess_batch(output, batch)
+
+    assert detected_labels(results) == [ [ i ] for i in range(4) ]
+
+# -----------------------------------------------------------------
+def test_shared_predict_is_split() :
+    # inputs from separate requests are combined into one predict
+    model = create_model(4, max_batch_delay = 0.5)
+    inputs = [ np.array([[ 5.0 ]], dtype=np.float32), np.array([[ 6.0 ], [ 7.0 ]], dtype=np.float32) ]
+
+    outputs = model.batcher.submit_all(inputs)
+
+    assert model.backend.batch_sizes == [ 3 ]
+    for (tensor, output) in zip(inputs, outputs) :
+        results = model.model_scorer.postprocess_batch(output, tensor)
+        assert detected_labels(results) == [ [ int(v) ] for v in tensor[:, 0] ]
@@ -0,0 +1,66 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the in process OpenVINO backend with a small generated model;
+skipped when the OpenVINO runtime is not installed. Run with
+
+    python -m pytest test/test_openvino_backend.py
+"""
+
+import numpy as np
+import pytest
+
+ov = pytest.importorskip('openvino')
+
+from pdo.inference.common.openvino_backend import OpenVINOBackend
+
+# -----------------------------------------------------------------
+@pytest.fixture
+def backend(tmp_path) :
+    # the model returns the mean of each channel, (B, 3, 4, 4) -> (B, 3)
+    import openvino.opset8 as ops
+    parameter = ops.parameter([1, 3, 4, 4], np.float32, name='input')
+    model = ov.Model([ ops.reduce_mean(parameter, [2, 3], False) ], [ parameter ], 'channel_mean')
+
+    model_path = str(tmp_path / 'channel_mean.xml')
+    ov.save_model(model, model_path)
+
+    backend = OpenVINOBackend({ 'Model' : { 'ModelPath' : model_path, 'MaxBatchSize' : 4 } })
+    yield backend
+    backend.close()
+
+# -----------------------------------------------------------------
+def test_predict(backend) :
+    batch = np.arange(3, dtype=np.float32).reshape(1, 3, 1, 1) * np.ones((2, 3, 4, 4), dtype=np.float32)
+    output = backend.predict(batch)
+
+    assert output.shape == (2, 3)
+    assert np.allclose(output, [ [ 0, 1, 2 ], [ 0, 1, 2 ] ])
+    assert backend.statistics()['requests'] == 1
+
+# -----------------------------------------------------------------
+def test_closed_backend(backend) :
+    backend.close()
+
+    # statistics are still reported while the handlers are reloaded
+    statistics = backend.statistics()
+    assert statistics['closed'] is True
+    assert statistics['device']
+
+    with pytest.raises(RuntimeError) :
+        backend.predict_future(np.zeros((1, 3, 4, 4), dtype=np.float32))
+
+    # closing again does nothing
+    backend.close()
@@ -0,0 +1,118 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the image limits, reduced decoding and tensor layouts of the
+preprocess engine. Run with
+
+    python -m pytest test/test_preprocess.py
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from pdo.inference.common.preprocess import ImageRejected, PreprocessEngine, image_dimensions
+
+# -----------------------------------------------------------------
+def encode(image_format, width, height) :
+    # blue, green and red bands so the channel order can be checked
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:, :, 0] = 10
+    img[:, :, 1] = 20
+    img[:, :, 2] = 30
+    (success, encoded) = cv2.imencode('.' + image_format, img)
+    assert success
+    return encoded.tobytes()
+
+# -----------------------------------------------------------------
+@pytest.mark.parametrize('image_format', [ 'jpeg', 'png' ])
+def test_image_dimensions(image_format) :
+    assert image_dimensions(encode(image_format, 64, 48)) == (image_format, 64, 48)
+
+# -----------------------------------------------------------------
+def test_image_dimensions_unknown_format() :
+    assert image_dimensions(encode('bmp', 64, 48)) is None
+    assert image_dimensions(b'\xff\xd8') is None
+    assert image_dimensions(b'') is None
+
+# -----------------------------------------------------------------
+def test_byte_limit() :
+    image_bytes = encode('png', 64, 64)
+    engine = PreprocessEngine(32, max_image_bytes=len(image_bytes) - 1)
+    with pytest.raises(ImageRejected) :
+        engine.process(image_bytes)
+
+    engine = PreprocessEngine(32, max_image_bytes=len(image_bytes))
+    assert engine.process(image_bytes).shape == (1, 3, 32, 32)
+
+# -----------------------------------------------------------------
+@pytest.mark.parametrize('image_format', [ 'jpeg', 'png' ])
+def test_pixel_limit(image_format) :
+    engine = PreprocessEngine(32, max_image_pixels=64 * 64)
+    assert engine.process(encode(image_format, 64, 64)).shape == (1, 3, 32, 32)
+
+    # the image is rejected from its header, before it is decoded
+    with pytest.raises(ImageRejected) :
+        engine.decode_flags(encode(image_format, 65, 64))
+
+# -----------------------------------------------------------------
+def test_pixel_limit_rejects_unparsed_formats() :
+    image_bytes = encode('bmp', 64, 64)
+    with pytest.raises(ImageRejected) :
+        PreprocessEngine(32, max_image_pixels=1 << 20).process(image_bytes)
+
+    assert PreprocessEngine(32).process(image_bytes).shape == (1, 3, 32, 32)
+
+# -----------------------------------------------------------------
+def test_reduced_decode() :
+    engine = PreprocessEngine(32, reduced_decode=True)
+
+    # the largest reduction that still covers the crop size is used
+    assert engine.decode_flags(encode('jpeg', 256, 256)) == cv2.IMREAD_REDUCED_COLOR_8
+    assert engine.decode_flags(encode('jpeg', 255, 128)) == cv2.IMREAD_REDUCED_COLOR_4
+    assert engine.decode_flags(encode('jpeg', 48, 48)) == cv2.IMREAD_COLOR
+    assert engine.decode_flags(encode('png', 256, 256)) == cv2.IMREAD_COLOR
+
+    assert engine.decode(encode('jpeg', 256, 256)).shape == (32, 32, 3)
+
+# -----------------------------------------------------------------
+def test_layouts() :
+    image_bytes = encode('png', 40, 24)
+
+    tensor = PreprocessEngine(32, rgb_image=True).process(image_bytes)
+    assert tensor.shape == (1, 3, 32, 32)
+    assert tensor.dtype == np.float32
+    assert [ tensor[0, c, 0, 0] for c in range(3) ] == [ 30, 20, 10 ]
+
+    tensor = PreprocessEngine(32, precision='u8', layout='NHWC').process(image_bytes)
+    assert tensor.shape == (1, 32, 32, 3)
+    assert tensor.dtype == np.uint8
+    assert tensor[0, 0, 0].tolist() == [ 10, 20, 30 ]
+
+    with pytest.raises(ValueError) :
+        PreprocessEngine(32, precision='fp64')
+
+# -----------------------------------------------------------------
+def test_process_batch_releases_on_failure() :
+    engine = PreprocessEngine(32, max_image_pixels=64 * 64)
+    images = [ encode('png', 64, 64), encode('png', 128, 128) ]
+    with pytest.raises(ImageRejected) :
+        engine.process_batch(images)
+
+    # the tensor acquired for the failed batch is returned to the pool
+    free = engine.buffer_pool.__free_lists__()[((2, 3, 32, 32), np.dtype(np.float32))]
+    assert len(free) == 1
+    released = free[0]
+    assert engine.process_batch(images[:1] * 2) is released
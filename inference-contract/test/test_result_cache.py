@@ -0,0 +1,103 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the memory and disk tiers of the inference result cache; the
+disk tests are skipped when lmdb is not installed. Run with
+
+    python -m pytest test/test_result_cache.py
+"""
+
+import pytest
+
+from pdo.inference.common.result_cache import ResultCache
+
+__context__ = { 'model' : 'resnet', 'version' : 1 }
+
+# -----------------------------------------------------------------
+def make_key(index, context = __context__) :
+    return ResultCache.make_key('image {0}'.format(index).encode('utf8'), context)
+
+# -----------------------------------------------------------------
+def test_make_key() :
+    key = make_key(0)
+    assert key == make_key(0)
+    assert key.lookup != key.secret
+
+    # the parameters that affect the result are part of the key
+    assert make_key(0, dict(__context__, version=2)).lookup != key.lookup
+    assert make_key(1).lookup != key.lookup
+
+    # the order of the context does not matter
+    assert make_key(0, { 'version' : 1, 'model' : 'resnet' }) == key
+
+# -----------------------------------------------------------------
+def test_memory_lru() :
+    cache = ResultCache(memory_entries=2)
+    assert cache.get(make_key(0)) is None
+
+    cache.put(make_key(0), { 'label' : 0 })
+    cache.put(make_key(1), { 'label' : 1 })
+
+    # reading the first result makes the second the least recently used
+    result = cache.get(make_key(0))
+    assert result == { 'label' : 0 }
+    result['label'] = 'changed'
+
+    cache.put(make_key(2), { 'label' : 2 })
+    assert cache.get(make_key(1)) is None
+    assert cache.get(make_key(0)) == { 'label' : 0 }
+    assert cache.get(make_key(2)) == { 'label' : 2 }
+
+    statistics = cache.statistics()
+    assert statistics['memory_entries'] == 2
+    assert statistics['memory_hits'] == 3
+    assert statistics['misses'] == 2
+    assert 'disk' not in statistics
+
+# -----------------------------------------------------------------
+def test_disk_tier(tmp_path) :
+    pytest.importorskip('lmdb')
+
+    disk_path = str(tmp_path / 'cache')
+    cache = ResultCache(memory_entries=1, disk_path=disk_path)
+    cache.put(make_key(0), { 'label' : 0 })
+    cache.put(make_key(1), { 'label' : 1 })
+
+    # the first result was dropped from memory but is read from disk
+    assert cache.get(make_key(0)) == { 'label' : 0 }
+    statistics = cache.statistics()
+    assert statistics['disk_hits'] == 1
+    assert statistics['disk']['entries'] == 2
+
+    # values are encrypted on disk with a key derived from the image
+    with cache.disk.env.begin(db=cache.disk.results_db) as txn :
+        assert b'label' not in txn.get(make_key(1).lookup)
+
+# -----------------------------------------------------------------
+def test_disk_eviction(tmp_path) :
+    pytest.importorskip('lmdb')
+
+    cache = ResultCache(memory_entries=1, disk_path=str(tmp_path / 'cache'), disk_max_bytes=1024)
+    for index in range(50) :
+        cache.put(make_key(index), { 'label' : index, 'scores' : [ 0.5 ] * 4 })
+
+    statistics = cache.statistics()['disk']
+    assert statistics['bytes'] <= 1024
+    assert statistics['evictions'] > 0
+    assert statistics['entries'] == 50 - statistics['evictions']
+
+    # the oldest entries are evicted first
+    assert cache.disk.get(make_key(0)) is None
+    assert cache.get(make_key(49)) == { 'label' : 49, 'scores' : [ 0.5 ] * 4 }
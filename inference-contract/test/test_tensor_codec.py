@@ -0,0 +1,82 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the numpy tensor codec with the serving API protos; skipped when
+neither ovmsclient nor tensorflow_serving is installed. Run with
+
+    python -m pytest test/test_tensor_codec.py
+"""
+
+import numpy as np
+import pytest
+
+from pdo.inference.common.tensor_codec import NumpyTensorCodec
+
+# -----------------------------------------------------------------
+@pytest.fixture
+def codec() :
+    return NumpyTensorCodec()
+
+# -----------------------------------------------------------------
+@pytest.fixture
+def tensor_proto(codec) :
+    try :
+        (predict_pb2, _) = codec.serving_apis()
+    except ImportError :
+        pytest.skip('serving API protos are not installed')
+    return predict_pb2.PredictRequest().inputs['input']
+
+# -----------------------------------------------------------------
+@pytest.mark.parametrize('dtype', [ np.float32, np.float64, np.float16, np.uint8, np.int32, np.int64, np.bool_ ])
+def test_round_trip(codec, tensor_proto, dtype) :
+    array = (np.arange(24).reshape(2, 3, 4) % 7).astype(dtype)
+    codec.encode(array, tensor_proto)
+
+    assert [ d.size for d in tensor_proto.tensor_shape.dim ] == [ 2, 3, 4 ]
+    decoded = codec.decode(tensor_proto)
+    assert decoded.dtype == array.dtype
+    assert np.array_equal(decoded, array)
+
+# -----------------------------------------------------------------
+def test_round_trip_big_endian_and_strided(codec, tensor_proto) :
+    array = np.arange(12, dtype='>f4').reshape(3, 4)[:, ::2]
+    codec.encode(array, tensor_proto)
+    assert np.array_equal(codec.decode(tensor_proto), array)
+
+    # encoding again replaces the shape of the previous tensor
+    codec.encode(np.zeros((5,), dtype=np.float32), tensor_proto)
+    assert codec.decode(tensor_proto).shape == (5,)
+
+# -----------------------------------------------------------------
+def test_decode_repeated_values(codec, tensor_proto) :
+    tensor_proto.dtype = 1
+    for size in (2, 2) :
+        tensor_proto.tensor_shape.dim.add().size = size
+
+    # a single value is broadcast to the whole tensor
+    tensor_proto.float_val.append(1.5)
+    assert np.array_equal(codec.decode(tensor_proto), np.full((2, 2), 1.5, dtype=np.float32))
+
+    tensor_proto.float_val.extend([ 2.0, 3.0, 4.0 ])
+    assert np.array_equal(codec.decode(tensor_proto), [ [ 1.5, 2.0 ], [ 3.0, 4.0 ] ])
+
+# -----------------------------------------------------------------
+def test_unsupported_dtype(codec, tensor_proto) :
+    with pytest.raises(ValueError) :
+        codec.encode(np.zeros((2,), dtype=np.complex64), tensor_proto)
+
+    tensor_proto.dtype = 7      # DT_STRING
+    with pytest.raises(ValueError) :
+        codec.decode(tensor_proto)